@@ -0,0 +1,369 @@
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+from collections import OrderedDict
+from urllib.parse import urlparse, urlunparse
+
+from importlib import import_module
+
+from .proxy import LatencyProxy
+
+BUCKET = 'benchmark'
+
+# The well-known development account of Azurite
+AZURITE_ACCOUNT_NAME = 'devstoreaccount1'
+AZURITE_ACCOUNT_KEY = ('Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/'
+                       'K1SZFPTOtr/KBHBeksoGMGw==')
+AZURITE_CONNECTION_STRING = ('DefaultEndpointsProtocol=http;AccountName={account};AccountKey={key};'
+                             'BlobEndpoint=http://127.0.0.1:{port}/{account};')
+
+
+class BackendUnavailable(Exception):
+    """Raised when the stand-in of a backend cannot be started, the backend is then skipped."""
+
+
+def get_store_class(module, name):
+    """Imports a store lazily, so that the backends whose dependencies are not installed are skipped."""
+    try:
+        return getattr(import_module('dblue_stores.stores.{}'.format(module)), name)
+    except ImportError as e:
+        raise BackendUnavailable('the dependencies of the store are not installed: {}'.format(e))
+
+
+def get_free_port(host='127.0.0.1'):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise BackendUnavailable('{}:{} is not reachable'.format(host, port))
+            time.sleep(0.1)
+
+
+def get_endpoint_address(endpoint):
+    parsed = urlparse(endpoint)
+    return parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80)
+
+
+def replace_endpoint_address(endpoint, address):
+    parsed = urlparse(endpoint)
+    return urlunparse(parsed._replace(netloc='{}:{}'.format(*address)))
+
+
+class Backend(object):
+    """
+    A store running against a local stand-in of its service, and the operations benchmarked on it.
+
+    The paths of the operations are relative to the bucket, or the root, of the backend.
+
+    Args:
+        workdir: `str`. a directory for the data of the stand-ins.
+        latency: `float`. the round trip latency, in seconds, to add to the requests of the store.
+        endpoint: `str`. the endpoint of an already running stand-in, instead of starting one.
+    """
+    NAME = None
+
+    def __init__(self, workdir, latency=0, endpoint=None):
+        self.workdir = workdir
+        self.latency = latency
+        self.endpoint = endpoint
+        self.store = None
+        self._proxy = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        if self._proxy is not None:
+            self._proxy.stop()
+            self._proxy = None
+
+    def get_address(self, address):
+        """Returns the address the store should connect to, through a latency proxy if needed."""
+        if not self.latency:
+            return address
+        self._proxy = LatencyProxy(address, latency=self.latency).start()
+        return self._proxy.address
+
+    def get_url(self, path):
+        raise NotImplementedError
+
+    def upload_file(self, filename, path):
+        self.store.upload_file(filename, self.get_url(path), use_basename=False)
+
+    def download_file(self, path, filename):
+        self.store.download_file(self.get_url(path), filename, use_basename=False)
+
+    def upload_dir(self, dirname, path):
+        self.store.upload_dir(dirname, self.get_url(path), use_basename=False)
+
+    def download_dir(self, path, dirname):
+        self.store.download_dir(self.get_url(path), dirname, use_basename=False)
+
+    def ls(self, path):
+        results = self.store.ls(self.get_url(path))
+        return len(results['files']) + len(results['dirs'])
+
+    def list_recursive(self, path):
+        return sum(1 for _ in self.store.iter_metadata(self.get_url(path)))
+
+    def delete(self, path):
+        self.store.delete(self.get_url(path))
+
+
+class LocalBackend(Backend):
+    """The local store, a baseline without network, the latency is not applied."""
+    NAME = 'local'
+
+    def start(self):
+        self.root = os.path.join(self.workdir, 'local')
+        os.makedirs(self.root)
+        self.store = get_store_class('local', 'LocalStore')()
+
+    def get_url(self, path):
+        return os.path.join(self.root, path)
+
+    def upload_file(self, filename, path):
+        # The local store copies files into existing directories
+        os.makedirs(os.path.dirname(self.get_url(path)), exist_ok=True)
+        super(LocalBackend, self).upload_file(filename, path)
+
+
+class S3Backend(Backend):
+    """S3 against `--s3-endpoint`, or an in-process moto server, which requires `moto[server]`."""
+    NAME = 's3'
+
+    def __init__(self, *args, **kwargs):
+        super(S3Backend, self).__init__(*args, **kwargs)
+        self._server = None
+
+    def start(self):
+        store_class = get_store_class('s3', 'S3Store')
+        endpoint = self.endpoint
+        credentials = {}
+        if not endpoint:
+            try:
+                from moto.server import ThreadedMotoServer
+            except ImportError:
+                raise BackendUnavailable('install `moto[server]`, or pass the endpoint of an S3 server')
+
+            # The requests are not logged, which would slow down the server
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            port = get_free_port()
+            self._server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+            self._server.start()
+            endpoint = 'http://127.0.0.1:{}'.format(port)
+            credentials = {'access_key': 'benchmark', 'secret_key': 'benchmark', 'region_name': 'us-east-1'}
+
+        endpoint = replace_endpoint_address(endpoint, self.get_address(get_endpoint_address(endpoint)))
+        self.store = store_class(endpoint_url=endpoint, **credentials)
+        if not self.store.check_bucket(BUCKET):
+            self.store.client.create_bucket(Bucket=BUCKET)
+
+    def stop(self):
+        super(S3Backend, self).stop()
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def get_url(self, path):
+        return 's3://{}/{}'.format(BUCKET, path)
+
+
+class GCSBackend(Backend):
+    """
+    GCS against `--gcs-endpoint`, e.g. of fake-gcs-server,
+    or an in-process emulator, which requires `gcp-storage-emulator`.
+    """
+    NAME = 'gcs'
+
+    def __init__(self, *args, **kwargs):
+        super(GCSBackend, self).__init__(*args, **kwargs)
+        self._server = None
+
+    def start(self):
+        store_class = get_store_class('gcs', 'GCSStore')
+        from google.api_core.exceptions import Conflict
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud.storage import Client
+
+        endpoint = self.endpoint
+        if not endpoint:
+            try:
+                from gcp_storage_emulator.server import create_server
+            except ImportError:
+                raise BackendUnavailable(
+                    'install `gcp-storage-emulator`, or pass the endpoint of a GCS server')
+
+            port = get_free_port()
+            self._server = create_server('127.0.0.1', port, in_memory=True)
+            self._server.start()
+            endpoint = 'http://127.0.0.1:{}'.format(port)
+
+        endpoint = replace_endpoint_address(endpoint, self.get_address(get_endpoint_address(endpoint)))
+        try:
+            client = Client(project='benchmark',
+                            credentials=AnonymousCredentials(),
+                            client_options={'api_endpoint': endpoint})
+        except TypeError:
+            # Older clients do not have options, their connection is redirected
+            client = Client(project='benchmark', credentials=AnonymousCredentials())
+            client._connection.API_BASE_URL = endpoint  # pylint:disable=protected-access
+
+        try:
+            client.create_bucket(BUCKET)
+        except Conflict:
+            pass
+        self.store = store_class(client=client)
+
+    def stop(self):
+        super(GCSBackend, self).stop()
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def get_url(self, path):
+        return 'gs://{}/{}'.format(BUCKET, path)
+
+
+class AzureBackend(Backend):
+    """
+    Azure Storage against the connection string of `--azure-endpoint`,
+    or a local Azurite if `azurite-blob` is installed.
+    """
+    NAME = 'azure'
+
+    def __init__(self, *args, **kwargs):
+        super(AzureBackend, self).__init__(*args, **kwargs)
+        self._process = None
+
+    def start(self):
+        store_class = get_store_class('azure', 'AzureStore')
+        connection_string = self.endpoint
+        if not connection_string:
+            executable = shutil.which('azurite-blob')
+            if not executable:
+                raise BackendUnavailable('install Azurite, or pass the connection string of an Azure server')
+
+            port = get_free_port()
+            location = os.path.join(self.workdir, 'azurite')
+            os.makedirs(location)
+            command = [executable, '--silent', '--location', location,
+                       '--blobHost', '127.0.0.1', '--blobPort', str(port)]
+            self._process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wait_for_port('127.0.0.1', port)
+            connection_string = AZURITE_CONNECTION_STRING.format(
+                account=AZURITE_ACCOUNT_NAME, key=AZURITE_ACCOUNT_KEY, port=port)
+
+        values = dict(item.split('=', 1) for item in connection_string.split(';') if item)
+        self.account_name = values['AccountName']
+        if 'BlobEndpoint' in values:
+            endpoint = values['BlobEndpoint']
+            values['BlobEndpoint'] = replace_endpoint_address(
+                endpoint, self.get_address(get_endpoint_address(endpoint)))
+            connection_string = ';'.join('{}={}'.format(*item) for item in values.items())
+
+        self.store = store_class(connection_string=connection_string)
+        self.store.connection.create_container(BUCKET)
+
+    def stop(self):
+        super(AzureBackend, self).stop()
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+    def get_url(self, path):
+        return 'wasbs://{}@{}.blob.core.windows.net/{}'.format(BUCKET, self.account_name, path)
+
+
+class SFTPBackend(Backend):
+    """SFTP against an in-process paramiko server, `--sftp-endpoint` is not supported."""
+    NAME = 'sftp'
+
+    def __init__(self, *args, **kwargs):
+        super(SFTPBackend, self).__init__(*args, **kwargs)
+        self._server = None
+
+    def start(self):
+        if self.endpoint:
+            raise BackendUnavailable('the SFTP benchmarks only run against their in-process server')
+        store_class = get_store_class('sftp', 'SFTPStore')
+        from .sftp_server import SFTPServer
+
+        root = os.path.join(self.workdir, 'sftp')
+        os.makedirs(root)
+        self._server = SFTPServer(root).start()
+        host, port = self.get_address(self._server.address)
+        self.store = store_class(host=host,
+                                 port=port,
+                                 username=self._server.username,
+                                 password=self._server.password)
+
+    def stop(self):
+        if self.store is not None:
+            self.store.close()
+            # The connections of the store are pooled, they are closed before the server
+            from dblue_stores.clients.sftp import sftp_pool
+            sftp_pool.clear()
+        super(SFTPBackend, self).stop()
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def get_url(self, path):
+        return '/' + path
+
+    def upload_file(self, filename, path):
+        self.store.makedirs(os.path.dirname(self.get_url(path)))
+        self.store.upload_file(filename, self.get_url(path))
+
+    def download_file(self, path, filename):
+        self.store.download_file(self.get_url(path), filename)
+
+    def upload_dir(self, dirname, path):
+        self.store.makedirs(os.path.dirname(self.get_url(path)))
+        self.store.upload_dir(dirname, self.get_url(path))
+
+    def download_dir(self, path, dirname):
+        self.store.download_dir(self.get_url(path), dirname)
+
+    def delete(self, path):
+        # The SFTP store deletes files and empty directories, the tree is deleted bottom up
+        root = self.get_url(path)
+        dirs = set()
+        for name, _ in self.store.iter_metadata(root):
+            self.store.delete(os.path.join(root, name))
+            name = os.path.dirname(name)
+            while name:
+                dirs.add(name)
+                name = os.path.dirname(name)
+        for name in sorted(dirs, key=len, reverse=True):
+            self.store.delete(os.path.join(root, name))
+        self.store.delete(root)
+
+
+BACKENDS = OrderedDict(
+    (backend.NAME, backend) for backend in (LocalBackend, S3Backend, GCSBackend, AzureBackend, SFTPBackend))
@@ -0,0 +1,42 @@
+"""
+Compares two results of the benchmarks, the command fails if a benchmark regressed.
+
+    python -m benchmarks.compare baseline.json results.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+from .suite import compare
+
+
+def print_comparison(baseline, results, threshold=0.1):
+    """Prints the comparison of the median durations of two results, and returns the number of regressions."""
+    if baseline.get('config') != results.get('config'):
+        print('Warning: the results were produced with different configurations')
+
+    rows = compare(baseline, results, threshold=threshold)
+    print('{:<8} {:<20} {:>12} {:>12} {:>8}'.format('backend', 'benchmark', 'baseline s', 'median s', 'change'))
+    for backend, name, baseline_median, median, change, regressed in rows:
+        print('{:<8} {:<20} {:>12.3f} {:>12.3f} {:>+7.1%}{}'.format(
+            backend, name, baseline_median, median, change, '  REGRESSION' if regressed else ''))
+    return sum(1 for row in rows if row[-1])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline', help='the results to compare to')
+    parser.add_argument('results', help='the new results')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown of the median above which a benchmark regressed (default: 0.1)')
+    options = parser.parse_args(args)
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    with open(options.results) as f:
+        results = json.load(f)
+    return 1 if print_comparison(baseline, results, threshold=options.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import collections
+import socket
+import threading
+import time
+
+from dblue_stores.logger import logger
+
+BUFFER_SIZE = 64 * 1024
+
+
+class LatencyProxy(object):
+    """
+    A TCP proxy delaying the traffic to a local server, to mimic WAN conditions.
+
+    Every chunk of data is forwarded `latency / 2` seconds after it was received, in each direction,
+    so a request and its response take `latency` more seconds, while the throughput is not limited:
+    the chunks are delayed, not throttled.
+
+    Args:
+        target: `tuple`. the `(host, port)` of the server to proxy.
+        latency: `float`. the round trip latency to add, in seconds.
+        host: `str`. the host to listen on, the port is chosen by the system.
+    """
+
+    def __init__(self, target, latency=0, host='127.0.0.1'):
+        self.target = target
+        self.latency = latency
+        self._host = host
+        self._socket = None
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def address(self):
+        return self._socket.getsockname()
+
+    @property
+    def port(self):
+        return self.address[1]
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self._host, 0))
+        self._socket.listen(128)
+        self._start_thread(self._accept)
+        return self
+
+    def stop(self):
+        self._closed.set()
+        self._socket.close()
+        with self._lock:
+            sockets = list(self._sockets)
+            self._sockets.clear()
+        for sock in sockets:
+            sock.close()
+
+    @staticmethod
+    def _start_thread(target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                client, _ = self._socket.accept()
+                server = socket.create_connection(self.target)
+            except OSError:
+                if not self._closed.is_set():
+                    logger.debug('The latency proxy of %s failed to accept a connection', self.target)
+                continue
+
+            with self._lock:
+                self._sockets.update((client, server))
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # The sockets are closed once both directions are done
+            remaining = [2]
+            self._pipe(client, server, remaining)
+            self._pipe(server, client, remaining)
+
+    def _pipe(self, src, dst, remaining):
+        # The chunks are read and written by two threads, so that the reads are not delayed
+        pending = collections.deque()
+        condition = threading.Condition()
+        self._start_thread(self._read, src, pending, condition)
+        self._start_thread(self._write, src, dst, pending, condition, remaining)
+
+    def _read(self, src, pending, condition):
+        while True:
+            try:
+                data = src.recv(BUFFER_SIZE)
+            except OSError:
+                data = b''
+            with condition:
+                pending.append((time.monotonic() + self.latency / 2., data))
+                condition.notify()
+            if not data:
+                return
+
+    def _write(self, src, dst, pending, condition, remaining):
+        try:
+            while True:
+                with condition:
+                    while not pending:
+                        condition.wait()
+                    deadline, data = pending[0]
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        condition.wait(delay)
+                        continue
+                    pending.popleft()
+
+                if not data:
+                    dst.shutdown(socket.SHUT_WR)
+                    return
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self._release(src, dst, remaining)
+
+    def _release(self, src, dst, remaining):
+        with self._lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+            self._sockets.difference_update((src, dst))
+        src.close()
+        dst.close()
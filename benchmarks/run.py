@@ -0,0 +1,123 @@
+"""
+Runs the benchmarks of the stores against local stand-ins of their services.
+
+    python -m benchmarks.run --backends local,s3,sftp --latency-ms 50 --output results.json
+    python -m benchmarks.run --backends local --fault-latency-ms 20,500 --fault-bandwidth 10M
+    python -m benchmarks.run --baseline baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+from dblue_stores.stores.faults import Constant, LogNormal
+
+from .backends import BACKENDS
+from .compare import print_comparison
+from .suite import BenchmarkConfig, run
+
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value):
+    """Parses a size in bytes, with an optional `K`, `M` or `G` suffix, e.g. `32M`."""
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def parse_latency(value):
+    """Parses a latency in milliseconds, `MEDIAN,P99` is a log-normal distribution, e.g. `20,500`."""
+    values = [float(v) / 1000. for v in value.split(',')]
+    if len(values) == 1:
+        return Constant(values[0])
+    if len(values) == 2 and 0 < values[0] < values[1]:
+        return LogNormal(*values)
+    raise argparse.ArgumentTypeError('expected a latency, or a median and a greater 99th percentile')
+
+
+def parse_backends(value):
+    backends = [backend.strip() for backend in value.split(',') if backend.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise argparse.ArgumentTypeError('unknown backends: {}'.format(', '.join(sorted(unknown))))
+    return backends
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', type=parse_backends, default=list(BACKENDS),
+                        help='comma separated backends, among {} (default: all)'.format(', '.join(BACKENDS)))
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='round trip latency added to the requests, to mimic WAN conditions')
+    parser.add_argument('--fault-latency-ms', type=parse_latency,
+                        help='latency added to every request of the stores by a FaultInjectionStore, '
+                             'constant, or log-normal given as MEDIAN,P99')
+    parser.add_argument('--fault-bandwidth', type=parse_size,
+                        help='bandwidth in bytes per second shared by the transfers of a FaultInjectionStore')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of every benchmark')
+    parser.add_argument('--small-files', type=int, default=1000, help='number of files of the small files directory')
+    parser.add_argument('--small-size', type=parse_size, default=4 * 1024, help='size of the small files')
+    parser.add_argument('--large-files', type=int, default=4, help='number of files of the large files directory')
+    parser.add_argument('--large-size', type=parse_size, default=32 * 1024 ** 2, help='size of the large files')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated data and of the injected faults')
+    parser.add_argument('--s3-endpoint', help='endpoint of a running S3 server, instead of moto')
+    parser.add_argument('--gcs-endpoint', help='endpoint of a running GCS server, e.g. fake-gcs-server')
+    parser.add_argument('--azure-endpoint', help='connection string of a running Azure server, e.g. Azurite')
+    parser.add_argument('--workdir', help='directory of the data of the benchmarks (default: a temporary directory)')
+    parser.add_argument('--output', help='file to write the results to, as JSON')
+    parser.add_argument('--baseline', help='results to compare to, the command fails if a benchmark regressed')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown of the median above which a benchmark regressed (default: 0.1)')
+    return parser
+
+
+def print_results(results):
+    print('{:<8} {:<20} {:>10} {:>10} {:>12} {:>10}'.format(
+        'backend', 'benchmark', 'median s', 'min s', 'MB/s', 'files/s'))
+    for backend, benchmarks in results['results'].items():
+        if 'skipped' in benchmarks:
+            print('{:<8} skipped: {}'.format(backend, benchmarks['skipped']))
+            continue
+        for name, summary in benchmarks.items():
+            print('{:<8} {:<20} {:>10.3f} {:>10.3f} {:>12} {:>10}'.format(
+                backend, name, summary['median'], summary['min'],
+                '{:.1f}'.format(summary['throughput_mb_s']) if summary['throughput_mb_s'] else '-',
+                '{:.1f}'.format(summary['files_per_s']) if summary['files_per_s'] else '-'))
+
+
+def main(args=None):
+    options = get_parser().parse_args(args)
+    faults = {}
+    if options.fault_latency_ms:
+        faults['latency'] = options.fault_latency_ms
+    if options.fault_bandwidth:
+        faults['bandwidth'] = options.fault_bandwidth
+    config = BenchmarkConfig(small_files=options.small_files,
+                             small_size=options.small_size,
+                             large_files=options.large_files,
+                             large_size=options.large_size,
+                             repeat=options.repeat,
+                             latency=options.latency_ms / 1000.,
+                             seed=options.seed,
+                             faults=faults)
+    endpoints = {'s3': options.s3_endpoint, 'gcs': options.gcs_endpoint, 'azure': options.azure_endpoint}
+
+    results = run(options.backends, config, endpoints=endpoints, workdir=options.workdir)
+    print_results(results)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        print()
+        if print_comparison(baseline, results, threshold=options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+import socket
+import threading
+
+import paramiko
+
+from paramiko.sftp import SFTP_FAILURE, SFTP_OK
+
+
+def _to_sftp_error(e):
+    return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class _Server(paramiko.ServerInterface):
+    def __init__(self, username, password):
+        self._username = username
+        self._password = password
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self._username, self._password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class _Handle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return _to_sftp_error(e)
+
+    def chattr(self, attr):
+        return SFTP_OK
+
+
+class _LocalSFTPServer(paramiko.SFTPServerInterface):
+    """Serves a local directory, the remote paths are relative to it."""
+
+    def __init__(self, server, root):
+        super(_LocalSFTPServer, self).__init__(server)
+        self._root = root
+
+    def _get_path(self, path):
+        return os.path.join(self._root, self.canonicalize(path).lstrip('/'))
+
+    def list_folder(self, path):
+        path = self._get_path(path)
+        try:
+            results = []
+            for name in os.listdir(path):
+                attr = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                results.append(attr)
+            return results
+        except OSError as e:
+            return _to_sftp_error(e)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._get_path(path)))
+        except OSError as e:
+            return _to_sftp_error(e)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._get_path(path)))
+        except OSError as e:
+            return _to_sftp_error(e)
+
+    def open(self, path, flags, attr):
+        path = self._get_path(path)
+        try:
+            fd = os.open(path, flags | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as e:
+            return _to_sftp_error(e)
+
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            os.close(fd)
+            return _to_sftp_error(e)
+
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._get_path(path))
+        except OSError as e:
+            return _to_sftp_error(e)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._get_path(oldpath), self._get_path(newpath))
+        except OSError as e:
+            return _to_sftp_error(e)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._get_path(path))
+        except OSError as e:
+            return _to_sftp_error(e)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._get_path(path))
+        except OSError as e:
+            return _to_sftp_error(e)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        return SFTP_OK if os.path.exists(self._get_path(path)) else SFTP_FAILURE
+
+
+class SFTPServer(object):
+    """
+    An in-process SFTP server serving a local directory, with password authentication.
+
+    Args:
+        root: `str`. the directory to serve.
+        username: `str`. the username to accept.
+        password: `str`. the password to accept.
+        host: `str`. the host to listen on, the port is chosen by the system.
+    """
+
+    def __init__(self, root, username='benchmark', password='benchmark', host='127.0.0.1'):
+        self.root = root
+        self.username = username
+        self.password = password
+        self._host = host
+        self._host_key = None
+        self._socket = None
+        self._transports = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def address(self):
+        return self._socket.getsockname()
+
+    @property
+    def port(self):
+        return self.address[1]
+
+    def start(self):
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self._host, 0))
+        self._socket.listen(128)
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._closed.set()
+        self._socket.close()
+        with self._lock:
+            transports = list(self._transports)
+            del self._transports[:]
+        for transport in transports:
+            transport.close()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                continue
+
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(self._host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _LocalSFTPServer, root=self.root)
+            # The handshake runs on the thread of the transport
+            transport.start_server(event=threading.Event(), server=_Server(self.username, self.password))
+            with self._lock:
+                self._transports.append(transport)
@@ -0,0 +1,334 @@
+import datetime
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from collections import OrderedDict
+
+from dblue_stores import metrics
+from dblue_stores.stores.faults import FaultInjectionStore
+
+from .backends import BACKENDS, BackendUnavailable
+
+RESULTS_VERSION = 1
+
+
+class BenchmarkError(Exception):
+    """Raised when an operation did not transfer or list what was expected."""
+
+
+class BenchmarkConfig(object):
+    """
+    The parameters of a benchmark run, the results are only comparable between runs with the same parameters.
+
+    Args:
+        small_files: `int`. the number of files of the directory of small files.
+        small_size: `int`. the size of the small files in bytes.
+        large_files: `int`. the number of files of the directory of large files.
+        large_size: `int`. the size of the large files in bytes, and of the file of the file transfers.
+        repeat: `int`. the number of times every benchmark is run.
+        latency: `float`. the round trip latency, in seconds, added to the requests of the stores.
+        seed: `int`. the seed of the generated data, and of the injected faults.
+        faults: `dict`. the options of a `FaultInjectionStore` wrapping the stores, e.g. to add
+            a long tailed latency distribution, `{'latency': LogNormal(0.02, 0.5), 'bandwidth': 10e6}`.
+    """
+
+    def __init__(self,
+                 small_files=1000,
+                 small_size=4 * 1024,
+                 large_files=4,
+                 large_size=32 * 1024 * 1024,
+                 repeat=3,
+                 latency=0,
+                 seed=0,
+                 faults=None):
+        self.small_files = small_files
+        self.small_size = small_size
+        self.large_files = large_files
+        self.large_size = large_size
+        self.repeat = repeat
+        self.latency = latency
+        self.seed = seed
+        self.faults = faults or {}
+
+    def to_dict(self):
+        return OrderedDict([
+            ('small_files', self.small_files),
+            ('small_size', self.small_size),
+            ('large_files', self.large_files),
+            ('large_size', self.large_size),
+            ('repeat', self.repeat),
+            ('latency', self.latency),
+            ('seed', self.seed),
+            ('faults', OrderedDict(
+                (key, value if isinstance(value, (int, float)) else repr(value))
+                for key, value in sorted(self.faults.items()))),
+        ])
+
+
+class Dataset(object):
+    """
+    The local files of the benchmarks, generated from a seed so that every run transfers the same data.
+
+    Layout:
+        file: a file of `large_size` bytes.
+        small/: `small_files` files of `small_size` bytes.
+        large/: `large_files` files of `large_size` bytes.
+    """
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, dirname, config):
+        self.dirname = dirname
+        self.config = config
+        self.file = os.path.join(dirname, 'file')
+        self.small_dir = os.path.join(dirname, 'small')
+        self.large_dir = os.path.join(dirname, 'large')
+
+    @property
+    def files(self):
+        return 1 + self.config.small_files + self.config.large_files
+
+    def generate(self):
+        rng = random.Random(self.config.seed)
+        # The files are slices of a random block, with different offsets so that they are not identical
+        block = rng.getrandbits(8 * self.BLOCK_SIZE * 2).to_bytes(self.BLOCK_SIZE * 2, 'little')
+
+        def write(filename, size, offset):
+            offset = offset % self.BLOCK_SIZE
+            with open(filename, 'wb') as f:
+                while size > 0:
+                    chunk = block[offset:offset + min(size, self.BLOCK_SIZE)]
+                    f.write(chunk)
+                    size -= len(chunk)
+
+        os.makedirs(self.small_dir)
+        os.makedirs(self.large_dir)
+        write(self.file, self.config.large_size, 0)
+        for i in range(self.config.small_files):
+            filename = os.path.join(self.small_dir, '{:05d}'.format(i))
+            write(filename, self.config.small_size, rng.randrange(self.BLOCK_SIZE))
+        for i in range(self.config.large_files):
+            filename = os.path.join(self.large_dir, '{:02d}'.format(i))
+            write(filename, self.config.large_size, rng.randrange(self.BLOCK_SIZE))
+        return self
+
+
+def count_files(dirname):
+    return sum(len(files) for _, _, files in os.walk(dirname))
+
+
+def check_count(name, count, expected):
+    if count != expected:
+        raise BenchmarkError('{}: expected {} files, got {}'.format(name, expected, count))
+
+
+# Every benchmark takes the backend, the dataset, the remote prefix of the run and a local scratch directory,
+# and returns the bytes and files it processed, they are run in order, each one depends on the previous ones.
+
+def upload_file(backend, dataset, prefix, scratch):
+    backend.upload_file(dataset.file, prefix + '/file')
+    return dataset.config.large_size, 1
+
+
+def download_file(backend, dataset, prefix, scratch):
+    filename = os.path.join(scratch, 'file')
+    backend.download_file(prefix + '/file', filename)
+    if os.path.getsize(filename) != dataset.config.large_size:
+        raise BenchmarkError('download_file: the size of the downloaded file is not {}'.format(
+            dataset.config.large_size))
+    return dataset.config.large_size, 1
+
+
+def upload_dir_small(backend, dataset, prefix, scratch):
+    backend.upload_dir(dataset.small_dir, prefix + '/small')
+    return dataset.config.small_files * dataset.config.small_size, dataset.config.small_files
+
+
+def ls(backend, dataset, prefix, scratch):
+    check_count('ls', backend.ls(prefix + '/small'), dataset.config.small_files)
+    return 0, dataset.config.small_files
+
+
+def download_dir_small(backend, dataset, prefix, scratch):
+    dirname = os.path.join(scratch, 'small')
+    backend.download_dir(prefix + '/small', dirname)
+    check_count('download_dir_small', count_files(dirname), dataset.config.small_files)
+    return dataset.config.small_files * dataset.config.small_size, dataset.config.small_files
+
+
+def upload_dir_large(backend, dataset, prefix, scratch):
+    backend.upload_dir(dataset.large_dir, prefix + '/large')
+    return dataset.config.large_files * dataset.config.large_size, dataset.config.large_files
+
+
+def download_dir_large(backend, dataset, prefix, scratch):
+    dirname = os.path.join(scratch, 'large')
+    backend.download_dir(prefix + '/large', dirname)
+    check_count('download_dir_large', count_files(dirname), dataset.config.large_files)
+    return dataset.config.large_files * dataset.config.large_size, dataset.config.large_files
+
+
+def list_recursive(backend, dataset, prefix, scratch):
+    check_count('list_recursive', backend.list_recursive(prefix), dataset.files)
+    return 0, dataset.files
+
+
+def delete(backend, dataset, prefix, scratch):
+    backend.delete(prefix)
+    return 0, dataset.files
+
+
+BENCHMARKS = OrderedDict((benchmark.__name__, benchmark) for benchmark in (
+    upload_file,
+    download_file,
+    upload_dir_small,
+    ls,
+    download_dir_small,
+    upload_dir_large,
+    download_dir_large,
+    list_recursive,
+    delete,
+))
+
+
+def summarize(durations, size, files, stats, repeat):
+    median = statistics.median(durations)
+    summary = OrderedDict([
+        ('median', median),
+        ('min', min(durations)),
+        ('max', max(durations)),
+        ('mean', statistics.mean(durations)),
+        ('runs', durations),
+        ('bytes', size),
+        ('files', files),
+        ('throughput_mb_s', size / median / 1e6 if size and median else None),
+        ('files_per_s', files / median if files and median else None),
+    ])
+
+    # The requests of the stores, aggregated over the buckets, per run
+    requests = OrderedDict()
+    for (_, _, operation), values in sorted(stats.items()):
+        operation_stats = requests.setdefault(operation, OrderedDict([
+            ('count', 0), ('errors', 0), ('retries', 0), ('latency_p50', None), ('latency_p99', None)]))
+        operation_stats['count'] += values['count'] / float(repeat)
+        operation_stats['errors'] += values['errors'] / float(repeat)
+        operation_stats['retries'] += values['retries'] / float(repeat)
+        operation_stats['latency_p50'] = values['latency_p50']
+        operation_stats['latency_p99'] = values['latency_p99']
+    summary['requests'] = requests
+    return summary
+
+
+def run_backend(backend, dataset, config, scratch):
+    """Runs every benchmark `config.repeat` times on a started backend, and returns their summaries."""
+    durations = OrderedDict((name, []) for name in BENCHMARKS)
+    sizes = {}
+    sinks = OrderedDict((name, metrics.InMemorySink()) for name in BENCHMARKS)
+
+    previous_sinks = metrics.get_sinks()
+    try:
+        for i in range(config.repeat):
+            # Every run uses new paths, so that no transfer is skipped because its files exist
+            prefix = 'run-{}'.format(i)
+            run_scratch = os.path.join(scratch, prefix)
+            os.makedirs(run_scratch)
+            for name, benchmark in BENCHMARKS.items():
+                metrics.set_sinks([sinks[name]])
+                start = time.perf_counter()
+                sizes[name] = benchmark(backend, dataset, prefix, run_scratch)
+                durations[name].append(time.perf_counter() - start)
+            shutil.rmtree(run_scratch)
+    finally:
+        metrics.set_sinks(previous_sinks)
+
+    results = OrderedDict()
+    for name in BENCHMARKS:
+        size, files = sizes[name]
+        results[name] = summarize(durations[name], size, files, sinks[name].get_stats(), config.repeat)
+    return results
+
+
+def run(backends, config, endpoints=None, workdir=None):
+    """
+    Runs the benchmarks on backends and returns the results, see `save_results`.
+
+    Args:
+        backends: `list`. the names of the backends, see `BACKENDS`.
+        config: `BenchmarkConfig`. the parameters of the benchmarks.
+        endpoints: `dict`. the endpoints of already running stand-ins by backend name.
+        workdir: `str`. a directory for the data of the benchmarks, a temporary directory by default.
+    """
+    endpoints = endpoints or {}
+    workdir = tempfile.mkdtemp(dir=workdir, prefix='dblue-stores-benchmarks-')
+    results = OrderedDict()
+    try:
+        dataset = Dataset(os.path.join(workdir, 'dataset'), config).generate()
+        for name in backends:
+            backend_dir = os.path.join(workdir, name)
+            os.makedirs(backend_dir)
+            backend = BACKENDS[name](backend_dir, latency=config.latency, endpoint=endpoints.get(name))
+            try:
+                backend.start()
+            except BackendUnavailable as e:
+                backend.stop()
+                results[name] = OrderedDict([('skipped', str(e))])
+                continue
+
+            store = backend.store
+            faults = None
+            if config.faults:
+                faults = FaultInjectionStore(store, seed=config.seed, **config.faults)
+                backend.store = faults
+
+            try:
+                results[name] = run_backend(backend, dataset, config, os.path.join(backend_dir, 'scratch'))
+            finally:
+                # The backend stops, and closes, the store it started
+                if faults is not None:
+                    faults.close()
+                    backend.store = store
+                backend.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return OrderedDict([
+        ('version', RESULTS_VERSION),
+        ('created_at', datetime.datetime.utcnow().isoformat() + 'Z'),
+        ('environment', OrderedDict([
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('cpus', os.cpu_count()),
+        ])),
+        ('config', config.to_dict()),
+        ('results', results),
+    ])
+
+
+def compare(baseline, results, threshold=0.1):
+    """
+    Compares the median durations of two results.
+
+    Args:
+        baseline: `dict`. the results to compare to.
+        results: `dict`. the new results.
+        threshold: `float`. the relative slowdown above which a benchmark regressed.
+
+    Returns:
+        list, of `(backend, benchmark, baseline median, median, change, regressed)`,
+        for the benchmarks of both results.
+    """
+    rows = []
+    for backend, benchmarks in results['results'].items():
+        baseline_benchmarks = baseline['results'].get(backend, {})
+        for name, summary in benchmarks.items():
+            baseline_summary = baseline_benchmarks.get(name)
+            if not isinstance(summary, dict) or not isinstance(baseline_summary, dict):
+                continue
+            change = summary['median'] / baseline_summary['median'] - 1 if baseline_summary['median'] else 0
+            regressed = change > threshold
+            rows.append((backend, name, baseline_summary['median'], summary['median'], change, regressed))
+    return rows
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+from functools import partial
+
+from . import settings
+from .exceptions import DblueStoresException
+from .logger import logger
+from .transfer import TransferExecutor
+from .utils import copy_file, iter_files
+
+
+class DownloadCache(object):
+    """
+    An on-disk read-through cache of downloaded files.
+
+    Entries are keyed by the store type, the path of the file and its version
+    (S3/Azure ETag, GCS generation, size and modification time for SFTP and local files),
+    so a file is downloaded again as soon as it changes in the store.
+
+    The cache holds at most `max_bytes`, the least recently used entries are evicted first.
+    Hits are served by copying the cached file with `copy_file`, i.e. reflinks or in-kernel copies when possible,
+    or by hardlinking it, in which case the served files must not be modified in place.
+
+    The cache can be shared by several processes, the recency of entries is tracked in memory
+    and persisted in the modification time of the cached files.
+
+    Args:
+        cache_dir: `str`. the directory of the cache, defaults to `settings.DOWNLOAD_CACHE_DIR`.
+        max_bytes: `int`. the maximum size of the cache, defaults to `settings.DOWNLOAD_CACHE_MAX_BYTES`.
+        hardlink: `bool`. whether or not to serve hits by hardlinking the cached files.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, hardlink=False):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir or settings.DOWNLOAD_CACHE_DIR))
+        self.max_bytes = settings.DOWNLOAD_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hardlink = hardlink
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def __repr__(self):
+        return '<DownloadCache {} entries={} bytes={}>'.format(self.cache_dir, len(self._entries), self._size)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._size,
+        }
+
+    @property
+    def size(self):
+        return self._size
+
+    def _load(self):
+        """Indexes the entries already in the cache directory, from the least to the most recently used."""
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        entries = []
+        for entry in iter_files(self.cache_dir):
+            file_name = os.path.basename(entry.path)
+            if file_name.startswith('.'):  # Partial downloads
+                continue
+            entries.append((entry.mtime, file_name, entry.size))
+
+        for _, digest, size in sorted(entries):
+            self._entries[digest] = size
+            self._size += size
+
+    @staticmethod
+    def get_digest(store_type, path, version):
+        return hashlib.sha256('{}\0{}\0{}'.format(store_type, path, version).encode('utf-8')).hexdigest()
+
+    def _get_path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _serve(self, digest, local_path):
+        if os.path.exists(local_path) and os.path.samefile(self._get_path(digest), local_path):
+            return
+        copy_file(self._get_path(digest), local_path, hardlink=self.hardlink)
+
+    def _touch(self, digest):
+        """Marks an entry as recently used, hardlinked entries are not touched to not change the served files."""
+        if not self.hardlink:
+            try:
+                os.utime(self._get_path(digest))
+            except OSError:
+                pass
+
+    def _add(self, digest, size):
+        evicted = []
+        with self._lock:
+            if digest in self._entries:
+                self._size -= self._entries.pop(digest)
+            self._entries[digest] = size
+            self._size += size
+
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_digest, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                evicted.append(old_digest)
+
+        for old_digest in evicted:
+            logger.debug('Evicting %s from the download cache', old_digest)
+            try:
+                os.remove(self._get_path(old_digest))
+            except OSError:
+                pass
+
+    def _remove(self, digest):
+        with self._lock:
+            if digest in self._entries:
+                self._size -= self._entries.pop(digest)
+
+    def clear(self):
+        """Removes all the entries from the cache."""
+        with self._lock:
+            digests = list(self._entries)
+            self._entries.clear()
+            self._size = 0
+
+        for digest in digests:
+            try:
+                os.remove(self._get_path(digest))
+            except OSError:
+                pass
+
+    def download_file(self, store, path, local_path, metadata=None):
+        """
+        Downloads a file through the cache.
+
+        Files without a known version, or larger than the cache, are downloaded without being cached.
+
+        Args:
+            store: `BaseStore`. the store of the file.
+            path: `str`. the path of the file in the store, e.g. an s3 url.
+            local_path: `str`. the path to download to.
+            metadata: `dict`. the metadata of the file, fetched from the store if not provided.
+
+        Returns:
+            bool, whether or not it was a hit.
+        """
+        if metadata is None:
+            metadata = store.get_metadata(path)
+
+        version = metadata.get('version')
+        size = metadata.get('size')
+        if version is None or size is None or size > self.max_bytes:
+            with self._lock:
+                self.misses += 1
+            store._sync_download(path, local_path)  # pylint:disable=protected-access
+            return False
+
+        digest = self.get_digest(store.STORE_TYPE, path, version)
+        with self._lock:
+            cached = digest in self._entries
+            if cached:
+                self._entries.move_to_end(digest)
+
+        if cached:
+            try:
+                self._serve(digest, local_path)
+            except (IOError, OSError):
+                # Evicted by another process
+                self._remove(digest)
+            else:
+                self._touch(digest)
+                with self._lock:
+                    self.hits += 1
+                return True
+
+        with self._lock:
+            self.misses += 1
+
+        cache_path = self._get_path(digest)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(cache_path))
+        os.close(fd)
+        try:
+            store._sync_download(path, tmp_path)  # pylint:disable=protected-access
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._add(digest, os.path.getsize(cache_path))
+        self._serve(digest, local_path)
+        return False
+
+    def download_dir(self, store, path, local_path, max_workers=None, raise_errors=True):
+        """
+        Downloads a directory through the cache, with one listing of the directory to get the versions of the files.
+
+        Args:
+            store: `BaseStore`. the store of the directory.
+            path: `str`. the path of the directory in the store, e.g. an s3 url.
+            local_path: `str`. the path to download to.
+            max_workers: `int`. number of files to download concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            TransferResult
+        """
+        def download(name, metadata):
+            filename = os.path.join(local_path, *name.split('/'))
+            dirname = os.path.dirname(filename)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            self.download_file(store, '{}/{}'.format(path.rstrip('/'), name), filename, metadata=metadata)
+
+        def get_tasks():
+            for name, metadata in store.iter_metadata(path):
+                yield name, partial(download, name, metadata)
+
+        if not os.path.isdir(local_path):
+            os.makedirs(local_path)
+
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks())
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+
+def get_download_cache(cache):
+    """
+    Resolves the `cache` argument of a `StoreManager`.
+
+    Args:
+        cache: `DownloadCache`, `True` to use a cache configured with the settings, or `None`.
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return DownloadCache()
+    if isinstance(cache, DownloadCache):
+        return cache
+    raise DblueStoresException('Received an unrecognised download cache `{}`.'.format(cache))
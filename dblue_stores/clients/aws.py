@@ -1,11 +1,17 @@
+import threading
+
 import boto3
 
 from decouple import config
 
 from .base import BaseClient
+from .pool import client_pool, make_key
 
 
 class AWSClient(BaseClient):
+    # Creating clients and resources from a pooled session is not thread-safe
+    _session_lock = threading.Lock()
+
     @classmethod
     def get_client(cls, *args, **kwargs):
         return cls._get_client(*args, **kwargs)
@@ -23,12 +29,17 @@ class AWSClient(BaseClient):
         session_token = session_token or config("AWS_SECURITY_TOKEN", default=None)
         region_name = region_name or config("AWS_REGION", default=None)
 
-        return boto3.session.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            aws_session_token=session_token,
-            region_name=region_name
-        )
+        def create_session():
+            return boto3.session.Session(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                aws_session_token=session_token,
+                region_name=region_name
+            )
+
+        # Sessions are not thread-safe, they are only used to create clients and resources under a lock
+        key = make_key('aws-session', boto3.session.Session, access_key, secret_key, session_token, region_name)
+        return client_pool.get(key, create_session)
 
     @classmethod
     def _get_client(cls,
@@ -56,12 +67,18 @@ class AWSClient(BaseClient):
         else:
             verify_ssl = verify_ssl
 
-        return session.client(
-            client_type,
-            endpoint_url=endpoint_url,
-            use_ssl=use_ssl,
-            verify=verify_ssl
-        )
+        def create_client():
+            return session.client(
+                client_type,
+                endpoint_url=endpoint_url,
+                use_ssl=use_ssl,
+                verify=verify_ssl
+            )
+
+        # Clients are thread-safe, they are shared by all the stores with the same credentials and endpoint
+        key = make_key('aws-client', session, client_type, endpoint_url, use_ssl, verify_ssl)
+        with cls._session_lock:
+            return client_pool.get(key, create_client)
 
     @classmethod
     def get_resource(cls,
@@ -88,9 +105,11 @@ class AWSClient(BaseClient):
         else:
             verify_ssl = verify_ssl
 
-        return session.resource(
-            resource_type,
-            endpoint_url=endpoint_url,
-            use_ssl=use_ssl,
-            verify=verify_ssl
-        )
+        # Resources are not thread-safe, so they are not pooled, only their session is
+        with cls._session_lock:
+            return session.resource(
+                resource_type,
+                endpoint_url=endpoint_url,
+                use_ssl=use_ssl,
+                verify=verify_ssl
+            )
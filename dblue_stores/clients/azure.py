@@ -2,6 +2,7 @@ from azure.storage.blob import BlockBlobService
 from decouple import config
 
 from .base import BaseClient
+from .pool import client_pool, make_key
 
 
 class AzureClient(BaseClient):
@@ -16,8 +17,12 @@ class AzureClient(BaseClient):
         account_key = account_key or config("AZURE_ACCOUNT_KEY", default=None)
         connection_string = connection_string or config("AZURE_CONNECTION_STRING", default=None)
 
-        return BlockBlobService(
-            account_name=account_name,
-            account_key=account_key,
-            connection_string=connection_string
-        )
+        def create_connection():
+            return BlockBlobService(
+                account_name=account_name,
+                account_key=account_key,
+                connection_string=connection_string
+            )
+
+        key = make_key('azure-blob-service', BlockBlobService, account_name, account_key, connection_string)
+        return client_pool.get(key, create_connection)
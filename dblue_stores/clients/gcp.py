@@ -12,6 +12,7 @@ from google.oauth2.service_account import Credentials  # pylint: disable=ungroup
 from ..exceptions import DblueStoresException
 from ..logger import logger
 from .base import BaseClient
+from .pool import client_pool, make_key
 
 DEFAULT_SCOPES = ('https://www.googleapis.com/auth/cloud-platform',)
 
@@ -51,7 +52,10 @@ class GCPClient(BaseClient):
         else:
             # Get credentials from JSON data.
             try:
-                if not isinstance(keyfile_dict, Mapping):
+                if isinstance(keyfile_dict, Mapping):
+                    # Copied to not alter the caller's dict, e.g. the key of the pooled client
+                    keyfile_dict = dict(keyfile_dict)
+                else:
                     keyfile_dict = json.loads(keyfile_dict)
 
                 # Convert escaped newlines to actual newlines if any.
@@ -72,13 +76,21 @@ class GCPClient(BaseClient):
 
     @classmethod
     def _get_client(cls, project_id=None, key_path=None, keyfile_dict=None, credentials=None, scopes=None):
-        credentials = credentials or cls.get_credentials(key_path=key_path,
-                                                         keyfile_dict=keyfile_dict,
-                                                         scopes=scopes)
-
         project_id = project_id or config("GCP_PROJECT_ID", default=None)
 
-        return Client(
-            project=project_id,
-            credentials=credentials
-        )
+        def create_client():
+            return Client(
+                project=project_id,
+                credentials=credentials or cls.get_credentials(key_path=key_path,
+                                                               keyfile_dict=keyfile_dict,
+                                                               scopes=scopes)
+            )
+
+        key = make_key('gcp-client',
+                       Client,
+                       project_id,
+                       credentials,
+                       key_path or config("GCP_KEY_FILE_PATH", default=None),
+                       keyfile_dict or config("GCP_KEY_FILE_DICT", default=None),
+                       scopes or config("GCP_SCOPES", default=None))
+        return client_pool.get(key, create_client)
@@ -0,0 +1,124 @@
+import json
+import threading
+
+from .. import settings
+from ..logger import logger
+
+
+def _normalize_key_part(part):
+    if isinstance(part, dict):
+        return json.dumps(part, sort_keys=True, default=str)
+    if isinstance(part, (list, tuple)):
+        return tuple(_normalize_key_part(item) for item in part)
+    if isinstance(part, (set, frozenset)):
+        return tuple(sorted((_normalize_key_part(item) for item in part), key=repr))
+    try:
+        hash(part)
+    except TypeError:
+        raise TypeError('Unsupported pool key part of type `{}`.'.format(type(part).__name__))
+    return part
+
+
+def make_key(*parts):
+    """
+    Returns a hashable pool key from the parts identifying a client, e.g. the store type and credentials.
+
+    Dicts, e.g. service account info, are serialized, lists and tuples, e.g. scopes, are keyed by value,
+    and sets are sorted. Other unhashable values raise a `TypeError`,
+    keying them by identity would create a new client for every equal value.
+    """
+    return tuple(_normalize_key_part(part) for part in parts)
+
+
+class ClientPool(object):
+    """
+    A thread-safe, process-wide, pool of clients and sessions.
+
+    Creating a client, e.g. a boto3 session and client, costs tens of milliseconds and new connections,
+    the pool returns the same client for the same key, i.e. the same store type, credentials and endpoint,
+    so that their connection pools are reused as well.
+
+    The pool can be disabled with the `CLIENT_POOL_ENABLED` env var.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, key):
+        return key in self._clients
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._clients)}
+
+    def get(self, key, factory):
+        """
+        Returns the client of key, created with factory if it is not in the pool yet.
+
+        Args:
+            key: `tuple`. the key of the client, see `make_key`.
+            factory: `callable`. creates the client.
+        """
+        if not settings.CLIENT_POOL_ENABLED:
+            return factory()
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+
+        # Clients are created outside of the lock to not block the other keys,
+        # if two threads create the same client the first one is kept
+        client = factory()
+        with self._lock:
+            self.misses += 1
+            return self._clients.setdefault(key, client)
+
+    @staticmethod
+    def _close(client):
+        close = getattr(client, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.debug('Failed to close client %s: %s', client, e)
+
+    def evict(self, client, close=True):
+        """
+        Removes a client from the pool, e.g. after its credentials were revoked.
+
+        Args:
+            client: the client to remove.
+            close: `bool`. whether or not to close the client.
+
+        Returns:
+            bool, whether or not the client was in the pool.
+        """
+        with self._lock:
+            keys = [key for key, value in self._clients.items() if value is client]
+            for key in keys:
+                del self._clients[key]
+
+        if keys and close:
+            self._close(client)
+        return bool(keys)
+
+    def clear(self, close=True):
+        """Removes all the clients from the pool, and closes them."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+
+        if close:
+            for client in {id(client): client for client in clients}.values():
+                self._close(client)
+
+
+client_pool = ClientPool()
@@ -1,8 +1,104 @@
+import threading
+
+from functools import partial
+
 import paramiko
 
 from decouple import config
 
+from .. import settings
+from ..logger import logger
 from .base import BaseClient
+from .pool import make_key
+
+
+class SFTPConnectionPool(object):
+    """
+    A thread-safe, process-wide, pool of SSH connections.
+
+    An SSH handshake costs a few round trips and hundreds of milliseconds on slow links,
+    the pool keeps up to `SFTP_POOL_SIZE` connections per host, port and user,
+    shared by the stores, which open their SFTP channels over them.
+
+    Pooled connections send keepalives every `SFTP_KEEPALIVE_INTERVAL` seconds, so that idle connections
+    are not dropped by firewalls, and are checked before being returned, dead connections are reconnected.
+
+    The pool can be disabled with the `CLIENT_POOL_ENABLED` env var.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._connections = {}
+        self.hits = 0
+        self.connects = 0
+        self.reconnects = 0
+
+    def __len__(self):
+        return sum(len(transports) for transports in self._connections.values())
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'connects': self.connects, 'reconnects': self.reconnects, 'size': len(self)}
+
+    @staticmethod
+    def is_healthy(transport):
+        return transport.is_active() and transport.is_authenticated()
+
+    def is_pooled(self, transport):
+        with self._lock:
+            return any(transport in transports for transports in self._connections.values())
+
+    def get(self, key, connect, index=0):
+        """
+        Returns a healthy connection of key, connected with connect if needed.
+
+        Args:
+            key: `tuple`. the key of the connection, see `make_key`.
+            connect: `callable`. opens a new connection.
+            index: `int`. the index of the connection, modulo the size of the pool,
+                to spread the channels of a store over several connections.
+        """
+        if not settings.CLIENT_POOL_ENABLED:
+            return connect()
+
+        with self._lock:
+            # Connections are opened under a lock per key to not block the other hosts
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            transports = self._connections.setdefault(key, [])
+            slot = min(index % max(settings.SFTP_POOL_SIZE, 1), len(transports))
+            if slot < len(transports):
+                transport = transports[slot]
+                if self.is_healthy(transport):
+                    self.hits += 1
+                    return transport
+
+                logger.debug('Reconnecting the SFTP connection %s', transport)
+                transport.close()
+                self.reconnects += 1
+
+            transport = connect()
+            self.connects += 1
+            if slot < len(transports):
+                transports[slot] = transport
+            else:
+                transports.append(transport)
+            return transport
+
+    def clear(self):
+        """Closes all the connections of the pool."""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+
+        for transports in connections:
+            for transport in transports:
+                transport.close()
+
+
+sftp_pool = SFTPConnectionPool()
 
 
 class SFTPClient(BaseClient):
@@ -11,12 +107,40 @@ class SFTPClient(BaseClient):
         return cls._get_client(*args, **kwargs)
 
     @staticmethod
-    def _get_client(host=None, port=None, username='root', password=None):
+    def connect(host, port, username, password):
+        """Opens a new SSH connection, sending keepalives every `SFTP_KEEPALIVE_INTERVAL` seconds."""
+        transport = paramiko.Transport(sock=(host, port))
+        transport.connect(None, username, password)
+        transport.set_keepalive(settings.SFTP_KEEPALIVE_INTERVAL)
+        return transport
+
+    @classmethod
+    def get_transport(cls, host=None, port=None, username='root', password=None, index=0):
+        """
+        Returns a pooled SSH connection, several SFTP channels can be opened over it.
+
+        Args:
+            host: `str`. SFTP host
+            port: `int`. SFTP port
+            username: `str`.  SFTP username
+            password: `str`.  SFTP password
+            index: `int`. the index of the connection in the pool of the host.
+        """
         host = host or config("SFTP_HOST", default='127.0.0.1')
         port = port or config("SFTP_PORT", default=22, cast=int)
         username = username or config("SFTP_USER", default='root')
         password = password or config("SFTP_PASSWORD", default='')
 
-        transport = paramiko.Transport(sock=(host, port))
-        transport.connect(None, username, password)
+        # The password is part of the key so that connections are only shared by the same credentials
+        key = make_key('sftp', host, port, username, password)
+        return sftp_pool.get(key, partial(cls.connect, host, port, username, password), index=index)
+
+    @classmethod
+    def _get_client(cls, host=None, port=None, username='root', password=None):
+        transport = cls.get_transport(host=host, port=port, username=username, password=password)
+        return cls.open_channel(transport)
+
+    @staticmethod
+    def open_channel(transport):
+        """Opens a new SFTP channel over an SSH connection."""
         return paramiko.SFTPClient.from_transport(transport)
@@ -0,0 +1,270 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The number of entries whose names are copied per chunk by `CompactListing.take`
+_TAKE_CHUNK_SIZE = 64 * 1024
+
+
+def _to_numpy(buffer, dtype):
+    """Zero-copy numpy view of a buffer."""
+    if not len(buffer):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(buffer, dtype=dtype)
+
+
+class CompactListing(object):
+    """
+    A memory efficient, columnar, container of listing entries.
+
+    The names are stored encoded in one contiguous buffer with an offsets array,
+    the sizes and modification times in typed arrays, which takes roughly the size of the names
+    plus 24 bytes per entry, instead of a python tuple of objects per entry.
+
+    Iterating or indexing a listing returns `(name, size)` tuples, like the keys returned by `list`,
+    but filtering, sorting and summing work on the columns directly,
+    and are vectorized if numpy is installed.
+
+    Unknown sizes are stored as -1 and unknown modification times as `nan`.
+
+    Args:
+        encoding: `str`. the encoding used to store the names.
+    """
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+        self._names = bytearray()
+        self._offsets = array('q', [0])
+        self._sizes = array('q')
+        self._mtimes = array('d')
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __repr__(self):
+        return '<CompactListing entries={} bytes={}>'.format(len(self), self.nbytes)
+
+    def __eq__(self, other):
+        if isinstance(other, CompactListing):
+            return (self._names == other._names and
+                    self._offsets == other._offsets and
+                    self._sizes == other._sizes)
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        return self.name(index), self.size(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.name(i), self.size(i)
+
+    @property
+    def nbytes(self):
+        """The memory used by the columns."""
+        return (len(self._names) +
+                self._offsets.itemsize * len(self._offsets) +
+                self._sizes.itemsize * len(self._sizes) +
+                self._mtimes.itemsize * len(self._mtimes))
+
+    @property
+    def names(self):
+        """Generator of the names of the entries."""
+        return (self.name(i) for i in range(len(self)))
+
+    @property
+    def sizes(self):
+        """A copy of the sizes column, a numpy array if numpy is installed."""
+        if np is not None:
+            return _to_numpy(self._sizes, np.int64).copy()
+        return array('q', self._sizes)
+
+    @property
+    def mtimes(self):
+        """A copy of the modification times column as timestamps, a numpy array if numpy is installed."""
+        if np is not None:
+            return _to_numpy(self._mtimes, np.float64).copy()
+        return array('d', self._mtimes)
+
+    def _name_bytes(self, index):
+        return bytes(self._names[self._offsets[index]:self._offsets[index + 1]])
+
+    def name(self, index):
+        return self._name_bytes(index).decode(self.encoding)
+
+    def size(self, index):
+        size = self._sizes[index]
+        return None if size < 0 else size
+
+    def mtime(self, index):
+        mtime = self._mtimes[index]
+        return None if mtime != mtime else mtime
+
+    def append(self, name, size=None, mtime=None):
+        self._names += name.encode(self.encoding)
+        self._offsets.append(len(self._names))
+        self._sizes.append(-1 if size is None else size)
+        self._mtimes.append(float('nan') if mtime is None else mtime)
+
+    def extend(self, entries):
+        """
+        Appends entries to the listing.
+
+        Args:
+            entries: `CompactListing` or iterable of `(name, size)` or `(name, size, mtime)` tuples.
+        """
+        if isinstance(entries, CompactListing):
+            start = len(self._names)
+            self._names += entries._names
+            self._offsets.extend(start + offset for offset in entries._offsets[1:])
+            self._sizes.extend(entries._sizes)
+            self._mtimes.extend(entries._mtimes)
+            return
+
+        for entry in entries:
+            self.append(*entry)
+
+    def total_size(self):
+        """The sum of the known sizes."""
+        if np is not None:
+            sizes = _to_numpy(self._sizes, np.int64)
+            return int(sizes[sizes > 0].sum())
+        return sum(size for size in self._sizes if size > 0)
+
+    def take(self, indices):
+        """
+        Returns a new listing with the entries at the given indices, in that order.
+
+        Args:
+            indices: `iterable`. positions of the entries to keep.
+        """
+        result = CompactListing(encoding=self.encoding)
+
+        if np is not None:
+            indices = np.asarray(indices, dtype=np.int64)
+            if not len(indices):
+                return result
+            offsets = _to_numpy(self._offsets, np.int64)
+            starts = offsets[:-1][indices]
+            lengths = offsets[1:][indices] - starts
+            new_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=new_offsets[1:])
+            # The names are copied slice by slice, in chunks of entries to bound the python integers
+            names = bytearray(int(new_offsets[-1]))
+            with memoryview(self._names) as source, memoryview(names) as destination:
+                for chunk in range(0, len(indices), _TAKE_CHUNK_SIZE):
+                    chunk_slice = slice(chunk, chunk + _TAKE_CHUNK_SIZE)
+                    for start, new_start, new_end in zip(starts[chunk_slice].tolist(),
+                                                         new_offsets[:-1][chunk_slice].tolist(),
+                                                         new_offsets[1:][chunk_slice].tolist()):
+                        destination[new_start:new_end] = source[start:start + new_end - new_start]
+            result._names = names
+            result._offsets = array('q', new_offsets.tobytes())
+            result._sizes = array('q', _to_numpy(self._sizes, np.int64)[indices].tobytes())
+            result._mtimes = array('d', _to_numpy(self._mtimes, np.float64)[indices].tobytes())
+            return result
+
+        for i in indices:
+            result._names += self._names[self._offsets[i]:self._offsets[i + 1]]
+            result._offsets.append(len(result._names))
+            result._sizes.append(self._sizes[i])
+            result._mtimes.append(self._mtimes[i])
+        return result
+
+    def filter(self, mask):
+        """
+        Returns a new listing with the entries selected by a boolean mask,
+        e.g. `listing.filter(listing.sizes > 1024)`.
+
+        Args:
+            mask: `iterable`. one boolean per entry.
+        """
+        if np is not None:
+            return self.take(np.flatnonzero(np.asarray(mask, dtype=bool)))
+        return self.take([i for i, selected in enumerate(mask) if selected])
+
+    def startswith(self, prefix):
+        """
+        Returns a boolean mask of the entries with names starting with prefix.
+
+        Args:
+            prefix: `str`. the prefix to look for.
+        """
+        prefix = prefix.encode(self.encoding)
+
+        if np is not None:
+            offsets = _to_numpy(self._offsets, np.int64)
+            starts = offsets[:-1]
+            mask = (offsets[1:] - starts) >= len(prefix)
+            if not len(prefix) or not mask.any():
+                return mask
+            names = _to_numpy(self._names, np.uint8)
+            candidates = starts[mask]
+            selected = np.ones(len(candidates), dtype=bool)
+            for i, char in enumerate(bytearray(prefix)):
+                selected &= names[candidates + i] == char
+            mask[mask] = selected
+            return mask
+
+        return [self._names[self._offsets[i]:self._offsets[i + 1]].startswith(prefix)
+                for i in range(len(self))]
+
+    def argsort(self, by='name', reverse=False):
+        """
+        Returns the indices that would sort the listing.
+
+        Args:
+            by: `str`. the column to sort by, one of `name`, `size` or `mtime`.
+            reverse: `bool`. whether or not to sort in descending order.
+        """
+        if by not in ('name', 'size', 'mtime'):
+            raise ValueError('Cannot sort by `{}`.'.format(by))
+
+        if np is not None:
+            if by == 'size':
+                indices = np.argsort(_to_numpy(self._sizes, np.int64), kind='stable')
+            elif by == 'mtime':
+                indices = np.argsort(_to_numpy(self._mtimes, np.float64), kind='stable')
+            else:
+                indices = np.argsort(self._name_objects(), kind='stable')
+            return indices[::-1] if reverse else indices
+
+        if by == 'size':
+            key = self._sizes.__getitem__
+        elif by == 'mtime':
+            # Unknown modification times are sorted last, like numpy does
+            def key(i):
+                mtime = self._mtimes[i]
+                return mtime != mtime, mtime
+        else:
+            key = self._name_bytes
+        return sorted(range(len(self)), key=key, reverse=reverse)
+
+    def _name_objects(self):
+        """
+        The encoded names as a numpy object array, which sorts like the decoded utf-8 names.
+
+        Unlike a fixed width bytes array, it takes the size of every name rather than of the longest one.
+        """
+        names = np.empty(len(self), dtype=object)
+        names[:] = [bytes(self._names[start:end]) for start, end in zip(self._offsets, self._offsets[1:])]
+        return names
+
+    def sort(self, by='name', reverse=False):
+        """
+        Returns a new sorted listing.
+
+        Args:
+            by: `str`. the column to sort by, one of `name`, `size` or `mtime`.
+            reverse: `bool`. whether or not to sort in descending order.
+        """
+        return self.take(self.argsort(by=by, reverse=reverse))
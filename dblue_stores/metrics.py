@@ -0,0 +1,277 @@
+import bisect
+import logging
+import threading
+import time
+
+from . import settings
+from .logger import logger
+
+# Upper bounds, in seconds, of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Names of the operations recorded by the stores
+LIST = 'list'
+HEAD = 'head'
+GET = 'get'
+PUT = 'put'
+DELETE = 'delete'
+
+
+class Histogram(object):
+    """A latency histogram with fixed buckets, the last bucket counts the values above all the bounds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket containing the quantile q, or None if it is above all bounds."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return None
+
+
+class OperationStats(object):
+    """The aggregated metrics of an operation of a store on a bucket."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency = Histogram()
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes': self.bytes,
+            'latency_sum': self.latency.sum,
+            'latency_p50': self.latency.quantile(0.5),
+            'latency_p99': self.latency.quantile(0.99),
+        }
+
+
+class MetricsSink(object):
+    """The interface of the sinks receiving the operations of the stores."""
+
+    def record(self, store_type, bucket, operation, duration, size=0, retries=0, error=None):
+        """
+        Records an operation.
+
+        Args:
+            store_type: `str`. the type of the store, e.g. `s3`.
+            bucket: `str`. the bucket, container or host of the operation.
+            operation: `str`. the operation, e.g. `list`, `head`, `get`, `put` or `delete`.
+            duration: `float`. the latency of the operation in seconds.
+            size: `int`. the number of bytes transferred.
+            retries: `int`. the number of retries of the requests of the operation, when known.
+            error: `Exception`. the error of the operation if it failed.
+        """
+        raise NotImplementedError
+
+
+class InMemorySink(MetricsSink):
+    """Aggregates the counts, bytes, retries, errors and latency histograms by store type, bucket and operation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, store_type, bucket, operation, duration, size=0, retries=0, error=None):
+        key = (store_type, bucket, operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = OperationStats()
+            stats.count += 1
+            stats.bytes += size
+            stats.retries += retries
+            if error is not None:
+                stats.errors += 1
+            stats.latency.observe(duration)
+
+    def get_stats(self):
+        """Returns a copy of the aggregated metrics, as dicts by `(store_type, bucket, operation)`."""
+        with self._lock:
+            return {key: stats.to_dict() for key, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class LoggingSink(MetricsSink):
+    """Logs every operation, at the debug level by default."""
+
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+    def record(self, store_type, bucket, operation, duration, size=0, retries=0, error=None):
+        if not logger.isEnabledFor(self.level):
+            return
+        logger.log(self.level,
+                   '%s %s %s: %.1fms, %s bytes, %s retries%s',
+                   store_type, bucket, operation.upper(), duration * 1000, size, retries,
+                   ', failed: {}'.format(error) if error is not None else '')
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusSink(InMemorySink):
+    """An `InMemorySink` exporting its metrics in the Prometheus text exposition format, see `export`."""
+
+    PREFIX = 'dblue_stores'
+
+    COUNTERS = (
+        ('requests_total', 'count', 'Number of operations.'),
+        ('errors_total', 'errors', 'Number of failed operations.'),
+        ('retries_total', 'retries', 'Number of retried requests.'),
+        ('bytes_total', 'bytes', 'Number of bytes transferred.'),
+    )
+
+    def export(self):
+        """Returns the metrics in the Prometheus text format, e.g. to be served on a `/metrics` endpoint."""
+        # The metrics are formatted under the lock to export a consistent snapshot
+        with self._lock:
+            items = sorted(self._stats.items())
+            lines = []
+            for name, attribute, description in self.COUNTERS:
+                name = '{}_{}'.format(self.PREFIX, name)
+                lines.append('# HELP {} {}'.format(name, description))
+                lines.append('# TYPE {} counter'.format(name))
+                for key, stats in items:
+                    lines.append('{}{{{}}} {}'.format(name, self._labels(key), getattr(stats, attribute)))
+
+            name = '{}_request_duration_seconds'.format(self.PREFIX)
+            lines.append('# HELP {} Latency of the operations.'.format(name))
+            lines.append('# TYPE {} histogram'.format(name))
+            for key, stats in items:
+                labels = self._labels(key)
+                total = 0
+                bounds = [repr(float(bound)) for bound in stats.latency.buckets] + ['+Inf']
+                for bound, count in zip(bounds, stats.latency.counts):
+                    total += count
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, total))
+                lines.append('{}_sum{{{}}} {}'.format(name, labels, repr(stats.latency.sum)))
+                lines.append('{}_count{{{}}} {}'.format(name, labels, stats.latency.count))
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels(key):
+        store_type, bucket, operation = key
+        return 'store="{}",bucket="{}",operation="{}"'.format(
+            _escape_label(store_type), _escape_label(bucket), _escape_label(operation))
+
+
+class Measure(object):
+    """Times an operation and records it to the sinks, the transferred bytes and retries can be set while it runs."""
+
+    __slots__ = ('store_type', 'bucket', 'operation', 'size', 'retries', '_start', '_discarded')
+
+    def __init__(self, store_type, bucket, operation):
+        self.store_type = store_type
+        self.bucket = bucket
+        self.operation = operation
+        self.size = 0
+        self.retries = 0
+        self._start = None
+        self._discarded = False
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def discard(self):
+        """Does not record the operation, e.g. when the end of a listing was reached without a request."""
+        self._discarded = True
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._discarded:
+            return False
+        duration = time.perf_counter() - self._start
+        for sink in _sinks:
+            try:
+                sink.record(self.store_type, self.bucket or '', self.operation, duration,
+                            size=self.size or 0, retries=self.retries, error=exc_value)
+            except Exception as e:  # pylint:disable=broad-except
+                logger.debug('Failed to record metrics to %s: %s', sink, e)
+        return False
+
+
+class _NoMeasure(object):
+    """Used when no sink is configured, so that the instrumentation costs nothing."""
+
+    __slots__ = ('size', 'retries')
+
+    def __enter__(self):
+        return self
+
+    def discard(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+default_sink = InMemorySink()
+
+_sinks = (default_sink,) if settings.METRICS_ENABLED else ()
+_sinks_lock = threading.Lock()
+
+
+def measure(store_type, bucket, operation):
+    """
+    Returns a context manager recording an operation of a store to the sinks.
+
+    Args:
+        store_type: `str`. the type of the store.
+        bucket: `str`. the bucket, container or host of the operation.
+        operation: `str`. the name of the operation.
+    """
+    if not _sinks:
+        return _NoMeasure()
+    return Measure(store_type, bucket, operation)
+
+
+def get_sinks():
+    return list(_sinks)
+
+
+def add_sink(sink):
+    """Adds a sink, e.g. a `PrometheusSink` or a `LoggingSink`."""
+    global _sinks  # pylint:disable=global-statement
+    with _sinks_lock:
+        if sink not in _sinks:
+            # The tuple is replaced, not mutated, so that the stores iterate on it without a lock
+            _sinks = _sinks + (sink,)
+
+
+def remove_sink(sink):
+    global _sinks  # pylint:disable=global-statement
+    with _sinks_lock:
+        _sinks = tuple(s for s in _sinks if s is not sink)
+
+
+def set_sinks(sinks):
+    """Replaces all the sinks, an empty list disables the metrics."""
+    global _sinks  # pylint:disable=global-statement
+    with _sinks_lock:
+        _sinks = tuple(sinks)
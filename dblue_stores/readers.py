@@ -0,0 +1,137 @@
+import io
+import threading
+
+from collections import OrderedDict
+
+from . import settings
+from .exceptions import DblueStoresException
+
+
+class RangedReader(io.RawIOBase):
+    """
+    A seekable, read-only, file-like object over a remote object, backed by ranged reads.
+
+    The object is read by blocks of `block_size` bytes, the most recently used blocks are kept in memory,
+    so that small reads and seeks back and forth, e.g. reading the footer of a Parquet file
+    and then a few row groups, only fetch the blocks they touch.
+    When the blocks are read sequentially, the next `readahead` blocks are fetched in the same request.
+
+    Args:
+        fetch: `callable`. `fetch(start, end)` returns the bytes of the object from start to end, inclusive.
+        size: `int`. the size of the object.
+        name: `str`. the name of the object.
+        block_size: `int`. the size of the blocks, defaults to `settings.READER_BLOCK_SIZE`.
+        readahead: `int`. the number of blocks to prefetch on sequential reads,
+            defaults to `settings.READER_READAHEAD_BLOCKS`.
+        cache_blocks: `int`. the maximum number of blocks kept in memory,
+            defaults to `settings.READER_CACHE_BLOCKS`.
+    """
+
+    def __init__(self, fetch, size, name=None, block_size=None, readahead=None, cache_blocks=None):
+        super(RangedReader, self).__init__()
+        self.name = name
+        self.size = size
+        self.block_size = block_size or settings.READER_BLOCK_SIZE
+        self.readahead = settings.READER_READAHEAD_BLOCKS if readahead is None else readahead
+        self.cache_blocks = max(cache_blocks or settings.READER_CACHE_BLOCKS, self.readahead + 1)
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._fetch = fetch
+        self._position = 0
+        self._blocks = OrderedDict()
+        self._last_block = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<RangedReader {} size={}>'.format(self.name, self.size)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence `{}`.'.format(whence))
+
+        if position < 0:
+            raise ValueError('Negative seek position {}.'.format(position))
+        self._position = position
+        return position
+
+    def _fetch_blocks(self, index):
+        """Fetches the block at index, and the next blocks on sequential reads, in one request."""
+        count = 1
+        if self.readahead and self._last_block is not None and index == self._last_block + 1:
+            last = (self.size - 1) // self.block_size
+            count = 1 + min(self.readahead, last - index)
+            # Do not fetch again the blocks that are still cached
+            for i in range(1, count):
+                if index + i in self._blocks:
+                    count = i
+                    break
+
+        start = index * self.block_size
+        end = min(start + count * self.block_size, self.size) - 1
+        data = self._fetch(start, end)
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        if len(data) != end - start + 1:
+            raise DblueStoresException('Received {} bytes instead of {} reading `{}` from {}.'.format(
+                len(data), end - start + 1, self.name, start))
+
+        for i in range(count):
+            self._blocks[index + i] = data[i * self.block_size:(i + 1) * self.block_size]
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+
+    def _get_block(self, index):
+        block = self._blocks.get(index)
+        if block is None:
+            self._fetch_blocks(index)
+            block = self._blocks[index]
+        else:
+            self._blocks.move_to_end(index)
+        self._last_block = index
+        return block
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+        view = memoryview(b).cast('B')
+        with self._lock:
+            size = max(min(len(view), self.size - self._position), 0)
+            read = 0
+            while read < size:
+                index, offset = divmod(self._position, self.block_size)
+                block = self._get_block(index)
+                length = min(len(block) - offset, size - read)
+                view[read:read + length] = block[offset:offset + length]
+                read += length
+                self._position += length
+        return read
+
+    def readall(self):
+        data = bytearray(max(self.size - self._position, 0))
+        self.readinto(data)
+        return bytes(data)
+
+    def close(self):
+        self._blocks.clear()
+        super(RangedReader, self).close()
+
+
+def check_read_mode(mode):
+    if mode not in ('r', 'rb'):
+        raise DblueStoresException('Only binary read mode `rb` is supported, received `{}`.'.format(mode))
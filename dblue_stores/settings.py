@@ -1,3 +1,40 @@
 from decouple import config
 
 CREDENTIALS_AUTH_MOUNT_PATH = config("CREDENTIALS_AUTH_MOUNT_PATH", default="/.dblue/credentials")
+
+TRANSFER_MAX_WORKERS = config("TRANSFER_MAX_WORKERS", default=8, cast=int)
+
+DOWNLOAD_CACHE_DIR = config("DOWNLOAD_CACHE_DIR", default="~/.dblue/cache")
+
+DOWNLOAD_CACHE_MAX_BYTES = config("DOWNLOAD_CACHE_MAX_BYTES", default=10 * 1024 ** 3, cast=int)
+
+READER_BLOCK_SIZE = config("READER_BLOCK_SIZE", default=1024 * 1024, cast=int)
+
+READER_READAHEAD_BLOCKS = config("READER_READAHEAD_BLOCKS", default=4, cast=int)
+
+READER_CACHE_BLOCKS = config("READER_CACHE_BLOCKS", default=16, cast=int)
+
+DOWNLOAD_PART_SIZE = config("DOWNLOAD_PART_SIZE", default=16 * 1024 * 1024, cast=int)
+
+ASYNC_MAX_WORKERS = config("ASYNC_MAX_WORKERS", default=64, cast=int)
+
+CLIENT_POOL_ENABLED = config("CLIENT_POOL_ENABLED", default=True, cast=bool)
+
+CREDENTIALS_CHECK_INTERVAL = config("CREDENTIALS_CHECK_INTERVAL", default=5, cast=float)
+
+SFTP_CHANNELS = config("SFTP_CHANNELS", default=4, cast=int)
+
+SFTP_TRANSPORTS = config("SFTP_TRANSPORTS", default=1, cast=int)
+
+SFTP_POOL_SIZE = config("SFTP_POOL_SIZE", default=4, cast=int)
+
+SFTP_KEEPALIVE_INTERVAL = config("SFTP_KEEPALIVE_INTERVAL", default=30, cast=int)
+
+AZURE_BLOCK_SIZE = config("AZURE_BLOCK_SIZE", default=4 * 1024 * 1024, cast=int)
+
+AZURE_MAX_SINGLE_PUT_SIZE = config("AZURE_MAX_SINGLE_PUT_SIZE", default=64 * 1024 * 1024, cast=int)
+
+# 0 keeps the default of the SDK
+AZURE_MAX_CONNECTIONS = config("AZURE_MAX_CONNECTIONS", default=0, cast=int)
+
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
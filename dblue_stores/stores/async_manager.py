@@ -0,0 +1,183 @@
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .. import settings
+from .manager import StoreManager
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_DONE = object()
+
+
+def get_executor():
+    """
+    Returns the executor shared by the async stores and managers,
+    a pool of `settings.ASYNC_MAX_WORKERS` threads created on first use.
+    """
+    global _executor  # pylint:disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_MAX_WORKERS,
+                                           thread_name_prefix='dblue-stores')
+    return _executor
+
+
+async def run_in_executor(executor, fn, *args, **kwargs):
+    """Runs a blocking call on the executor without blocking the event loop."""
+    # `get_running_loop` requires python 3.7
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+async def iterate_in_executor(executor, iterable):
+    """Consumes a blocking iterable on the executor, e.g. a paginated listing, one item at a time."""
+    iterator = await run_in_executor(executor, iter, iterable)
+    while True:
+        item = await run_in_executor(executor, next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+class AsyncStore(object):
+    """
+    Async interface of a store.
+
+    The blocking calls of the store run on a bounded executor shared by all the async stores and managers,
+    so that many concurrent operations can be awaited from one event loop without starting a thread for each,
+    and listings are streamed one page at a time.
+
+    Args:
+        store: `BaseStore`. the store to wrap.
+        executor: `Executor`. the executor to run the calls on, defaults to the shared executor.
+    """
+
+    def __init__(self, store, executor=None):
+        self._store = store
+        self._executor = executor
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def executor(self):
+        return self._executor or get_executor()
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_in_executor(self.executor, fn, *args, **kwargs)
+
+    async def ls(self, *args, **kwargs):
+        return await self.run(self.store.ls, *args, **kwargs)
+
+    async def iter_ls(self, *args, **kwargs):
+        async for page in iterate_in_executor(self.executor, self.store.iter_ls(*args, **kwargs)):
+            yield page
+
+    async def list(self, *args, **kwargs):
+        return await self.run(self.store.list, *args, **kwargs)
+
+    async def iter_list(self, *args, **kwargs):
+        async for page in iterate_in_executor(self.executor, self.store.iter_list(*args, **kwargs)):
+            yield page
+
+    async def get_metadata(self, *args, **kwargs):
+        return await self.run(self.store.get_metadata, *args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return await self.run(self.store.delete, *args, **kwargs)
+
+    async def upload_file(self, *args, **kwargs):
+        return await self.run(self.store.upload_file, *args, **kwargs)
+
+    async def download_file(self, *args, **kwargs):
+        return await self.run(self.store.download_file, *args, **kwargs)
+
+    async def upload_dir(self, *args, **kwargs):
+        return await self.run(self.store.upload_dir, *args, **kwargs)
+
+    async def download_dir(self, *args, **kwargs):
+        return await self.run(self.store.download_dir, *args, **kwargs)
+
+    async def sync(self, *args, **kwargs):
+        return await self.run(self.store.sync, *args, **kwargs)
+
+
+class AsyncStoreManager(object):
+    """
+    Async version of `StoreManager`, see `AsyncStore`.
+
+    Args:
+        store: `BaseStore`. the store to use, defaults to the local store.
+        path: `str`. the base path of the relative paths.
+        cache: `DownloadCache`. an optional on-disk cache for the downloads.
+        executor: `Executor`. the executor to run the calls on, defaults to the shared executor.
+    """
+
+    def __init__(self, store=None, path=None, cache=None, executor=None):
+        self._manager = StoreManager(store=store, path=path, cache=cache)
+        self._executor = executor
+
+    @property
+    def manager(self):
+        return self._manager
+
+    @property
+    def store(self):
+        return self._manager.store
+
+    @property
+    def path(self):
+        return self._manager.path
+
+    @property
+    def executor(self):
+        return self._executor or get_executor()
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_in_executor(self.executor, fn, *args, **kwargs)
+
+    async def ls(self, path, sort=True, compact=False):
+        return await self.run(self._manager.ls, path, sort=sort, compact=compact)
+
+    async def iter_ls(self, path, compact=False):
+        async for page in iterate_in_executor(self.executor, self._manager.iter_ls(path, compact=compact)):
+            yield page
+
+    async def list(self, path):
+        return await self.run(self._manager.list, path)
+
+    async def iter_list(self, path):
+        async for page in iterate_in_executor(self.executor, self._manager.iter_list(path)):
+            yield page
+
+    async def delete(self, path):
+        return await self.run(self._manager.delete, path)
+
+    async def upload_file(self, filename, path=None, **kwargs):
+        return await self.run(self._manager.upload_file, filename, path, **kwargs)
+
+    async def upload_dir(self, dirname, path=None, max_workers=None, **kwargs):
+        return await self.run(self._manager.upload_dir, dirname, path, max_workers=max_workers, **kwargs)
+
+    async def download_file(self, filename, local_path=None, use_basename=False, **kwargs):
+        return await self.run(self._manager.download_file,
+                              filename,
+                              local_path,
+                              use_basename=use_basename,
+                              **kwargs)
+
+    async def download_dir(self, dirname, local_path=None, use_basename=False, max_workers=None, **kwargs):
+        return await self.run(self._manager.download_dir,
+                              dirname,
+                              local_path,
+                              use_basename=use_basename,
+                              max_workers=max_workers,
+                              **kwargs)
+
+    async def sync(self, src, dst, **kwargs):
+        return await self.run(self._manager.sync, src, dst, **kwargs)
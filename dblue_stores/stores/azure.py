@@ -1,22 +1,45 @@
 import os
 import re
 
+from functools import partial
 from urllib.parse import urlparse
 
 from azure.common import AzureHttpError  # pylint: disable=import-error
-from azure.storage.blob.models import BlobPrefix  # pylint: disable=import-error
+from azure.storage.blob.models import BlobBlock, BlobPrefix  # pylint: disable=import-error
 
+from .. import settings
+from .. import metrics
 from ..clients.azure import AzureClient
 from ..exceptions import DblueStoresException
-from ..utils import append_basename, check_dir_exists, walk
+from ..listing import CompactListing
+from ..readers import RangedReader, check_read_mode
+from ..transfer import BufferReader, TransferExecutor, download_ranges, upload_ranges
+from ..utils import append_basename, b64_to_hex, check_dir_exists, iter_files, to_timestamp
 from .base import BaseStore
 
 # pylint:disable=arguments-differ
 
+# Maximum number of blocks of a block blob
+MAX_BLOCKS = 50000
+
 
 class AzureStore(BaseStore):
     """
     Azure store Service.
+
+    Files larger than `max_single_put_size` are uploaded as blocks of `block_size` bytes,
+    sent concurrently over `max_connections` connections and committed with one block list.
+
+    Args:
+        connection: `BlockBlobService`. an existing connection.
+        account_name: `str`. The storage account name.
+        account_key: `str`. The storage account key.
+        connection_string: `str`. If specified, this will override all other parameters.
+        block_size: `int`. the size of the blocks, defaults to `settings.AZURE_BLOCK_SIZE`.
+        max_single_put_size: `int`. the size above which files are uploaded as blocks,
+            defaults to `settings.AZURE_MAX_SINGLE_PUT_SIZE`.
+        max_connections: `int`. the number of concurrent requests of a transfer,
+            defaults to `settings.AZURE_MAX_CONNECTIONS`, or the defaults of the SDK.
     """
     STORE_TYPE = BaseStore.AZURE_STORE
 
@@ -27,6 +50,10 @@ class AzureStore(BaseStore):
         self._account_key = kwargs.get('account_key')
         self._connection_string = kwargs.get('connection_string')
 
+        self._block_size = kwargs.get('block_size') or settings.AZURE_BLOCK_SIZE
+        self._max_single_put_size = kwargs.get('max_single_put_size') or settings.AZURE_MAX_SINGLE_PUT_SIZE
+        self._max_connections = kwargs.get('max_connections') or settings.AZURE_MAX_CONNECTIONS or None
+
     @property
     def connection(self):
         if self._connection is None:
@@ -101,20 +128,82 @@ class AzureStore(BaseStore):
         if not container_name:
             container_name, _, blob = self.parse_wasbs_url(blob)
         try:
-            return self.connection.get_blob_properties(
-                container_name,
-                blob
-            )
+            with self.measure(metrics.HEAD, container_name):
+                return self.connection.get_blob_properties(
+                    container_name,
+                    blob
+                )
         except AzureHttpError:
             return None
 
-    def ls(self, path):
-        results = self.list(key=path)
-        return {'files': results['blobs'], 'dirs': results['prefixes']}
+    def _get_range_fetcher(self, blob, container_name):
+        """Returns a function fetching byte ranges of the current version of a blob, and the size of the blob."""
+        try:
+            with self.measure(metrics.HEAD, container_name):
+                properties = self.connection.get_blob_properties(container_name, blob).properties
+        except AzureHttpError as e:
+            raise DblueStoresException(e)
 
-    def list(self, key, container_name=None, path=None, delimiter='/', marker=None):
+        def fetch(start, end):
+            try:
+                with self.measure(metrics.GET, container_name) as measure:
+                    data = self.connection.get_blob_to_bytes(container_name,
+                                                             blob,
+                                                             start_range=start,
+                                                             end_range=end,
+                                                             max_connections=1,
+                                                             if_match=properties.etag).content
+                    measure.size = len(data)
+                return data
+            except AzureHttpError as e:
+                raise DblueStoresException(e)
+
+        return fetch, properties.content_length
+
+    def open(self, blob, mode='rb', container_name=None, block_size=None, readahead=None, cache_blocks=None):
         """
-        Checks if a blob exists.
+        Opens a blob as a seekable file-like object backed by ranged downloads, see `RangedReader`.
+
+        The reads fail if the blob is overwritten after it was opened.
+
+        Args:
+            blob: `str`. Name of existing blob.
+            mode: `str`. the mode, only `rb` is supported.
+            container_name: `str`. Name of existing container.
+            block_size: `int`. the size of the blocks fetched by each request.
+            readahead: `int`. the number of blocks to prefetch on sequential reads.
+            cache_blocks: `int`. the maximum number of blocks kept in memory.
+
+        Returns:
+            RangedReader
+        """
+        check_read_mode(mode)
+        if not container_name:
+            container_name, _, blob = self.parse_wasbs_url(blob)
+
+        fetch, size = self._get_range_fetcher(blob, container_name)
+        return RangedReader(fetch,
+                            size=size,
+                            name=blob,
+                            block_size=block_size,
+                            readahead=readahead,
+                            cache_blocks=cache_blocks)
+
+    def ls(self, path, compact=False):
+        results = {'files': CompactListing() if compact else [], 'dirs': []}
+        for page in self.iter_ls(path, compact=compact):
+            results['files'].extend(page['files'])
+            results['dirs'].extend(page['dirs'])
+        return results
+
+    def iter_ls(self, path, compact=False):
+        for page in self.iter_list(key=path, compact=compact):
+            yield {'files': page['blobs'], 'dirs': page['prefixes']}
+
+    def iter_list(self, key, container_name=None, path=None, delimiter='/', marker=None, recursive=False,
+                  compact=False):
+        """
+        Lists prefixes and blobs in a container, one page at a time.
 
         Args:
             key: `str`. key prefix.
@@ -122,6 +211,12 @@ class AzureStore(BaseStore):
             path: `str`. an extra path to append to the key.
             delimiter: `str`. the delimiter marks key hierarchy.
             marker: `str`. An opaque continuation token.
+            recursive: `bool`. if it should list the whole subtree under the key,
+                the delimiter is ignored and no prefixes are returned.
+            compact: `bool`. if it should return the blobs in a `CompactListing` instead of a list of tuples.
+
+        Returns:
+            generator of dicts with the `blobs` and `prefixes` of every page.
         """
         if not container_name:
             container_name, _, key = self.parse_wasbs_url(key)
@@ -136,30 +231,131 @@ class AzureStore(BaseStore):
         if prefix and not prefix.endswith('/'):
             prefix += '/'
 
-        list_blobs = []
-        list_prefixes = []
+        if recursive:
+            delimiter = None
+
         while True:
-            results = self.connection.list_blobs(container_name,
-                                                 prefix=prefix,
-                                                 delimiter=delimiter,
-                                                 marker=marker)
-            for r in results:
+            with self.measure(metrics.LIST, container_name):
+                results = self.connection.list_blobs(container_name,
+                                                     prefix=prefix,
+                                                     delimiter=delimiter,
+                                                     marker=marker)
+            list_blobs = CompactListing() if compact else []
+            list_prefixes = []
+            # The items of the current segment only, iterating the results would fetch the next pages
+            for r in results.items:
                 if isinstance(r, BlobPrefix):
                     name = r.name[len(key):]
                     list_prefixes.append(name)
+                elif compact:
+                    name = r.name[len(key):]
+                    list_blobs.append(name, r.properties.content_length, to_timestamp(r.properties.last_modified))
                 else:
                     name = r.name[len(key):]
                     list_blobs.append((name, r.properties.content_length))
+            yield {
+                'blobs': list_blobs,
+                'prefixes': list_prefixes
+            }
+            if results.next_marker:
+                marker = results.next_marker
+            else:
+                break
+
+    def iter_metadata(self, key, container_name=None):
+        """
+        Yields `(name, metadata)` for every blob under a key, the `version` of a blob is its ETag.
+
+        Args:
+            key: `str`. key prefix, or a wasbs url if no container name is provided.
+            container_name: `str`. Name of existing container.
+        """
+        if not container_name:
+            container_name, _, key = self.parse_wasbs_url(key)
+
+        if key and not key.endswith('/'):
+            key += '/'
+
+        marker = None
+        while True:
+            with self.measure(metrics.LIST, container_name):
+                results = self.connection.list_blobs(container_name, prefix=key, marker=marker)
+            for r in results.items:
+                name = r.name[len(key):]
+                if not name or name.endswith('/'):
+                    continue
+                yield name, self._get_metadata(r.properties)
             if results.next_marker:
                 marker = results.next_marker
             else:
                 break
+
+    @staticmethod
+    def _get_metadata(properties):
+        return {
+            'size': properties.content_length,
+            'mtime': to_timestamp(properties.last_modified),
+            'md5': b64_to_hex(properties.content_settings.content_md5),
+            'version': properties.etag,
+        }
+
+    def get_metadata(self, blob, container_name=None):
+        """
+        Returns the metadata of a blob, a dict with its `size`, `mtime`, `md5` and `version`, the ETag.
+
+        Args:
+            blob: `str`. Name of existing blob.
+            container_name: `str`. Name of existing container.
+        """
+        if not container_name:
+            container_name, _, blob = self.parse_wasbs_url(blob)
+
+        try:
+            with self.measure(metrics.HEAD, container_name):
+                properties = self.connection.get_blob_properties(container_name, blob).properties
+            return self._get_metadata(properties)
+        except AzureHttpError as e:
+            raise DblueStoresException(e)
+
+    def list(self, key, container_name=None, path=None, delimiter='/', marker=None, recursive=False,
+             compact=False):
+        """
+        Lists prefixes and blobs in a container.
+
+        Args:
+            key: `str`. key prefix.
+            container_name: `str`. Name of existing container.
+            path: `str`. an extra path to append to the key.
+            delimiter: `str`. the delimiter marks key hierarchy.
+            marker: `str`. An opaque continuation token.
+            recursive: `bool`. if it should list the whole subtree under the key,
+                the delimiter is ignored and no prefixes are returned.
+            compact: `bool`. if it should return the blobs in a `CompactListing` instead of a list of tuples.
+        """
+        list_blobs = CompactListing() if compact else []
+        list_prefixes = []
+        for page in self.iter_list(key=key,
+                                   container_name=container_name,
+                                   path=path,
+                                   delimiter=delimiter,
+                                   marker=marker,
+                                   recursive=recursive,
+                                   compact=compact):
+            list_blobs.extend(page['blobs'])
+            list_prefixes.extend(page['prefixes'])
         return {
             'blobs': list_blobs,
             'prefixes': list_prefixes
         }
 
-    def upload_file(self, filename, blob, container_name=None, use_basename=True):
+    def upload_file(self,
+                    filename,
+                    blob,
+                    container_name=None,
+                    use_basename=True,
+                    block_size=None,
+                    max_single_put_size=None,
+                    max_connections=None):
         """
         Uploads a local file to Google Cloud Storage.
 
@@ -168,6 +364,11 @@ class AzureStore(BaseStore):
             blob: `str`. blob to upload to.
             container_name: `str`. the name of the container.
             use_basename: `bool`. whether or not to use the basename of the filename.
+            block_size: `int`. the size of the blocks, overriding the option of the store.
+            max_single_put_size: `int`. the size above which the file is uploaded as blocks,
+                overriding the option of the store.
+            max_connections: `int`. the number of blocks to upload concurrently,
+                overriding the option of the store.
         """
         if not container_name:
             container_name, _, blob = self.parse_wasbs_url(blob)
@@ -175,9 +376,55 @@ class AzureStore(BaseStore):
         if use_basename:
             blob = append_basename(blob, filename)
 
-        self.connection.create_blob_from_path(container_name, blob, filename)
+        size = os.path.getsize(filename)
+        if size <= (max_single_put_size or self._max_single_put_size):
+            with self.measure(metrics.PUT, container_name) as measure:
+                measure.size = size
+                self.connection.create_blob_from_path(container_name, blob, filename)
+            return
+
+        self._upload_blocks(filename,
+                            size,
+                            blob,
+                            container_name,
+                            block_size=block_size or self._block_size,
+                            max_connections=max_connections or self._max_connections)
+
+    @staticmethod
+    def get_block_size(size, block_size):
+        """Returns the block size of a file, increased if needed to fit in the maximum number of blocks."""
+        return max(block_size, -(-size // MAX_BLOCKS))
+
+    def _upload_blocks(self, filename, size, blob, container_name, block_size, max_connections=None):
+        """Uploads the blocks of a file concurrently, then commits them in one block list."""
+        block_size = self.get_block_size(size, block_size)
+
+        def put_block(index, data):
+            # The client only sends bytes or streams, the block is streamed from the memory-mapped file
+            with self.measure(metrics.PUT, container_name) as measure, BufferReader(data) as block:
+                measure.size = len(data)
+                self.connection.put_block(container_name, blob, block, self._get_block_id(index))
 
-    def upload_dir(self, dirname, blob, container_name=None, use_basename=True):
+        count = upload_ranges(put_block, filename, block_size, max_workers=max_connections)
+        block_list = [BlobBlock(id=self._get_block_id(index)) for index in range(count)]
+        with self.measure(metrics.PUT, container_name):
+            self.connection.put_block_list(container_name, blob, block_list)
+
+    @staticmethod
+    def _get_block_id(index):
+        # The ids of the blocks of a blob must have the same length
+        return '{:08d}'.format(index)
+
+    def upload_dir(self,
+                   dirname,
+                   blob,
+                   container_name=None,
+                   use_basename=True,
+                   max_workers=None,
+                   raise_errors=True,
+                   block_size=None,
+                   max_single_put_size=None,
+                   max_connections=None):
         """
         Uploads a local directory to to Google Cloud Storage.
 
@@ -186,6 +433,15 @@ class AzureStore(BaseStore):
             blob: `str`. blob to upload to.
             container_name: `str`. the name of the container.
             use_basename: `bool`. whether or not to use the basename of the directory.
+            max_workers: `int`. number of files to upload concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+            block_size: `int`. the size of the blocks of every file, see `upload_file`.
+            max_single_put_size: `int`. the size above which files are uploaded as blocks.
+            max_connections: `int`. the number of blocks of a file to upload concurrently.
+
+        Returns:
+            TransferResult
         """
         if not container_name:
             container_name, _, blob = self.parse_wasbs_url(blob)
@@ -195,15 +451,29 @@ class AzureStore(BaseStore):
 
         # Turn the path to absolute paths
         dirname = os.path.abspath(dirname)
-        with walk(dirname) as files:
-            for f in files:
+
+        def get_tasks(entries):
+            for entry in entries:
+                f = entry.path
                 file_blob = os.path.join(blob, os.path.relpath(f, dirname))
-                self.upload_file(filename=f,
+                yield f, partial(self.upload_file,
+                                 filename=f,
                                  blob=file_blob,
                                  container_name=container_name,
-                                 use_basename=False)
+                                 use_basename=False,
+                                 block_size=block_size,
+                                 max_single_put_size=max_single_put_size,
+                                 max_connections=max_connections)
+
+        # The files are uploaded while the directory is traversed
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks(iter_files(dirname)))
 
-    def download_file(self, blob, local_path, container_name=None, use_basename=True):
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+    def download_file(self, blob, local_path, container_name=None, use_basename=True, part_size=None,
+                      max_workers=None, max_connections=None):
         """
         Downloads a file from Google Cloud Storage.
 
@@ -212,6 +482,11 @@ class AzureStore(BaseStore):
             local_path: `str`. the path to download to.
             container_name: `str`. the name of the container.
             use_basename: `bool`. whether or not to use the basename of the blob.
+            part_size: `int`. the size of the ranges of a parallel download.
+            max_workers: `int`. if provided, the blob is downloaded by fetching this number
+                of byte ranges concurrently, see `download_ranges`.
+            max_connections: `int`. the number of concurrent requests of the SDK download,
+                overriding the option of the store.
         """
         if not container_name:
             container_name, _, blob = self.parse_wasbs_url(blob)
@@ -223,12 +498,31 @@ class AzureStore(BaseStore):
 
         check_dir_exists(local_path)
 
+        if max_workers:
+            fetch, size = self._get_range_fetcher(blob, container_name)
+            download_ranges(fetch, size, local_path, part_size=part_size, max_workers=max_workers)
+            return
+
+        max_connections = max_connections or self._max_connections
         try:
-            self.connection.get_blob_to_path(container_name, blob, local_path)
+            with self.measure(metrics.GET, container_name) as measure:
+                if max_connections:
+                    self.connection.get_blob_to_path(container_name, blob, local_path,
+                                                     max_connections=max_connections)
+                else:
+                    self.connection.get_blob_to_path(container_name, blob, local_path)
+                measure.size = os.path.getsize(local_path)
         except AzureHttpError as e:
             raise DblueStoresException(e)
 
-    def download_dir(self, blob, local_path, container_name=None, use_basename=True):
+    def download_dir(self,
+                     blob,
+                     local_path,
+                     container_name=None,
+                     use_basename=True,
+                     max_workers=None,
+                     raise_errors=True,
+                     max_connections=None):
         """
         Download a directory from Google Cloud Storage.
 
@@ -237,6 +531,13 @@ class AzureStore(BaseStore):
             local_path: `str`. the path to download to.
             container_name: `str`. the name of the container.
             use_basename: `bool`. whether or not to use the basename of the key.
+            max_workers: `int`. number of files to download concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+            max_connections: `int`. the number of concurrent requests of every file download.
+
+        Returns:
+            TransferResult
         """
         if not container_name:
             container_name, _, blob = self.parse_wasbs_url(blob)
@@ -251,46 +552,43 @@ class AzureStore(BaseStore):
         except DblueStoresException:
             os.makedirs(local_path)
 
-        results = self.list(container_name=container_name, key=blob, delimiter='/')
-
-        # Create directories
-        for prefix in sorted(results['prefixes']):
-            direname = os.path.join(local_path, prefix)
-            prefix = os.path.join(blob, prefix)
-            # Download files under
-            self.download_dir(blob=prefix,
-                              local_path=direname,
-                              container_name=container_name,
-                              use_basename=False)
-
-        # Download files
-        for file_key in results['blobs']:
-            file_key = file_key[0]
-            filename = os.path.join(local_path, file_key)
-            file_key = os.path.join(blob, file_key)
-            self.download_file(blob=file_key,
-                               local_path=filename,
-                               container_name=container_name,
-                               use_basename=False)
+        results = self.list(container_name=container_name, key=blob, recursive=True)
+
+        def get_tasks():
+            for file_key, _ in results['blobs']:
+                filename = os.path.join(local_path, file_key)
+                # Blobs ending with a delimiter are empty directory markers
+                dirname = filename if file_key.endswith('/') else os.path.dirname(filename)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                if file_key.endswith('/'):
+                    continue
+
+                file_key = os.path.join(blob, file_key)
+                yield file_key, partial(self.download_file,
+                                        blob=file_key,
+                                        local_path=filename,
+                                        container_name=container_name,
+                                        use_basename=False,
+                                        max_connections=max_connections)
+
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks())
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
 
     def delete(self, blob, container_name=None):
         if not container_name:
             container_name, _, blob = self.parse_wasbs_url(blob)
 
-        results = self.list(container_name=container_name, key=blob, delimiter='/')
+        results = self.list(container_name=container_name, key=blob, recursive=True)
 
-        if not any([results['prefixes'], results['blobs']]):
+        if not results['blobs']:
             self.delete_file(blob=blob, container_name=container_name)
 
-        # Delete directories
-        for prefix in sorted(results['prefixes']):
-            prefix = os.path.join(blob, prefix)
-            # Download files under
-            self.delete(blob=prefix, container_name=container_name)
-
         # Delete files
-        for file_key in results['blobs']:
-            file_key = file_key[0]
+        for file_key, _ in results['blobs']:
             file_key = os.path.join(blob, file_key)
             self.delete_file(blob=file_key, container_name=container_name)
 
@@ -306,6 +604,7 @@ class AzureStore(BaseStore):
             container_name, _, blob = self.parse_wasbs_url(blob)
 
         try:
-            self.connection.delete_blob(container_name, blob)
+            with self.measure(metrics.DELETE, container_name):
+                self.connection.delete_blob(container_name, blob)
         except AzureHttpError:
             pass
@@ -1,4 +1,13 @@
+import os
+
+from functools import partial
+
+from .. import metrics
 from ..exceptions import DblueStoresException
+from ..sync import SyncPlan, get_local_metadata
+from ..transfer import TransferExecutor
+
+_DONE = object()
 
 
 class BaseStore:
@@ -14,6 +23,9 @@ class BaseStore:
 
     STORE_TYPE = None
 
+    # Injects faults in the requests of the store, set by `FaultInjectionStore`
+    _faults = None
+
     BLOB_TYPE_DIR = "DIR"
     BLOB_TYPE_FILE = "FILE"
 
@@ -27,7 +39,7 @@ class BaseStore:
 
         if store_type == cls.LOCAL_STORE:
             from .local import LocalStore
-            return LocalStore()
+            return LocalStore(**kwargs)
         if store_type == cls.AZURE_STORE:
             from .azure import AzureStore
             return AzureStore(**kwargs)
@@ -65,10 +77,50 @@ class BaseStore:
             return cls.get_store(store_type=store_type, keyfile_dict=store_access)
         return cls.get_store(store_type=store_type, **store_access)
 
+    def as_async(self, executor=None):
+        """Returns an `AsyncStore` running the calls of this store on an executor."""
+        from .async_manager import AsyncStore
+        return AsyncStore(self, executor=executor)
+
     def set_env_vars(self):
         """Set authentication and access of the current store to the env vars"""
         pass
 
+    def measure(self, operation, bucket, may_discard=False):
+        """
+        Returns a context manager recording an operation of the store to the metrics sinks, see `metrics.measure`.
+
+        Args:
+            operation: `str`. the operation, e.g. `metrics.GET`.
+            bucket: `str`. the bucket, container or host of the operation.
+            may_discard: `bool`. whether or not the measure may be discarded because no request was sent,
+                the injected faults, if any, are then only applied once the operation completed.
+        """
+        measure = metrics.measure(self.STORE_TYPE, bucket, operation)
+        if self._faults is not None:
+            return self._faults.inject(measure, operation, deferred=may_discard)
+        return measure
+
+    def _measure_pages(self, pages, bucket, get_retries=None):
+        """
+        Yields the pages of a listing, recording the request of every page as a `list` operation.
+
+        Args:
+            pages: `iterable`. the pages of the listing, requested lazily.
+            bucket: `str`. the bucket, container or host of the listing.
+            get_retries: `callable`. returns the number of retries of the request of a page.
+        """
+        pages = iter(pages)
+        while True:
+            with self.measure(metrics.LIST, bucket, may_discard=True) as measure:
+                page = next(pages, _DONE)
+                if page is _DONE:
+                    measure.discard()
+                    return
+                if get_retries is not None:
+                    measure.retries = get_retries(page)
+            yield page
+
     @property
     def is_local_store(self):
         return self.STORE_TYPE == self.LOCAL_STORE
@@ -89,12 +141,21 @@ class BaseStore:
     def is_sftp_store(self):
         return self.STORE_TYPE == self.SFTP_STORE
 
-    def ls(self, path):
+    def open(self, path, mode='rb', **kwargs):
+        raise NotImplementedError
+
+    def ls(self, path, compact=False):
+        raise NotImplementedError
+
+    def iter_ls(self, path, compact=False):
         raise NotImplementedError
 
     def list(self, *args, **kwargs):
         raise NotImplementedError
 
+    def iter_list(self, *args, **kwargs):
+        raise NotImplementedError
+
     def delete(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -109,3 +170,107 @@ class BaseStore:
 
     def upload_dir(self, *args, **kwargs):
         raise NotImplementedError
+
+    def iter_metadata(self, path):
+        """
+        Yields `(name, metadata)` for every file under a remote path, names are relative to the path,
+        metadata are dicts with the `size`, `mtime`, `md5` and `version` of the files.
+        """
+        raise NotImplementedError
+
+    def get_metadata(self, path):
+        """Returns the metadata of a remote file, see `iter_metadata`."""
+        raise NotImplementedError
+
+    def _sync_upload(self, filename, path):
+        self.upload_file(filename, path, use_basename=False)
+
+    def _sync_download(self, path, filename):
+        self.download_file(path, filename, use_basename=False)
+
+    def _sync_delete(self, paths):
+        for path in paths:
+            self.delete_file(path)
+
+    @staticmethod
+    def _join_remote_path(path, name):
+        return '{}/{}'.format(path.rstrip('/'), name)
+
+    def _is_sync_remote_path(self, path):
+        return self.get_store_type_from_path(path) == self.STORE_TYPE
+
+    def sync(self, src, dst, delete=False, dry_run=False, upload=None, max_workers=None, raise_errors=True):
+        """
+        Incrementally syncs a local directory and a remote path of this store, in either direction.
+
+        Only the files missing in the destination or that changed are transferred,
+        files of the same size are compared by md5 when the store exposes it,
+        and by modification time otherwise.
+        Downloaded files get the modification time of their blob, so that they are not transferred again.
+
+        Args:
+            src: `str`. the source directory, a local directory or a url of this store.
+            dst: `str`. the destination directory, a local directory or a url of this store.
+            delete: `bool`. whether or not to delete the destination files missing in the source,
+                deletes are skipped if some transfers failed.
+            dry_run: `bool`. whether or not to only compute the plan without transferring anything.
+            upload: `bool`. the direction of the sync, inferred from the urls if not provided.
+            max_workers: `int`. number of files to transfer concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            SyncPlan
+        """
+        if upload is None:
+            if self._is_sync_remote_path(dst) and not self._is_sync_remote_path(src):
+                upload = True
+            elif self._is_sync_remote_path(src) and not self._is_sync_remote_path(dst):
+                upload = False
+            else:
+                raise DblueStoresException(
+                    'Could not infer the direction of the sync from `{}` to `{}`.'.format(src, dst))
+
+        local_dir, remote_dir = (src, dst) if upload else (dst, src)
+        local_entries = get_local_metadata(local_dir)
+        remote_entries = dict(self.iter_metadata(remote_dir))
+
+        if upload:
+            plan = SyncPlan.compute(src, dst, local_entries, remote_entries, upload=True, delete=delete)
+        else:
+            plan = SyncPlan.compute(src, dst, remote_entries, local_entries, upload=False, delete=delete)
+
+        if dry_run:
+            return plan
+
+        def download(name):
+            filename = os.path.join(local_dir, *name.split('/'))
+            dirname = os.path.dirname(filename)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            self._sync_download(self._join_remote_path(remote_dir, name), filename)
+            mtime = remote_entries[name].get('mtime')
+            if mtime is not None:
+                os.utime(filename, (mtime, mtime))
+
+        def get_tasks():
+            for name in plan.transfers:
+                if upload:
+                    yield name, partial(self._sync_upload,
+                                        local_entries[name]['path'],
+                                        self._join_remote_path(remote_dir, name))
+                else:
+                    yield name, partial(download, name)
+
+        plan.result = TransferExecutor(max_workers=max_workers).run(get_tasks())
+
+        if plan.deletes and plan.result.ok:
+            if upload:
+                self._sync_delete([self._join_remote_path(remote_dir, name) for name in plan.deletes])
+            else:
+                for name in plan.deletes:
+                    os.remove(local_entries[name]['path'])
+
+        if raise_errors:
+            plan.result.raise_for_errors()
+        return plan
@@ -0,0 +1,315 @@
+import math
+import random
+import threading
+import time
+
+from .. import metrics
+from ..exceptions import DblueStoresException
+from .base import BaseStore
+
+# The quantile function of the standard normal distribution at 0.99
+_Z_99 = 2.3263478740408408
+
+
+class InjectedFault(DblueStoresException):
+    """A failure of a request injected by a `FaultInjectionStore`."""
+
+    def __init__(self, message, operation=None, status=None):
+        super(InjectedFault, self).__init__(message)
+        self.operation = operation
+        self.status = status
+
+
+class ThrottlingFault(InjectedFault):
+    """An injected `503 Slow Down` response, as returned by the services when they throttle the requests."""
+
+
+class TimeoutFault(InjectedFault):
+    """An injected timeout, raised once the timeout of the request elapsed."""
+
+
+class Constant(object):
+    """A constant latency in seconds."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return 'Constant({!r})'.format(self.value)
+
+    def sample(self, rng):
+        return self.value
+
+
+class Uniform(object):
+    """A latency uniformly distributed between `low` and `high` seconds."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return 'Uniform({!r}, {!r})'.format(self.low, self.high)
+
+    def sample(self, rng):
+        return rng.uniform(self.low, self.high)
+
+
+class LogNormal(object):
+    """
+    A log-normal latency, i.e. with a long tail, given by its median and its 99th percentile in seconds.
+
+    Args:
+        median: `float`. the median latency.
+        p99: `float`. the 99th percentile of the latency, greater than the median.
+    """
+
+    def __init__(self, median, p99):
+        if not 0 < median < p99:
+            raise DblueStoresException('The 99th percentile of a latency must be greater than its median.')
+        self.median = median
+        self.p99 = p99
+        self._mu = math.log(median)
+        self._sigma = math.log(p99 / float(median)) / _Z_99
+
+    def __repr__(self):
+        return 'LogNormal({!r}, {!r})'.format(self.median, self.p99)
+
+    def sample(self, rng):
+        return rng.lognormvariate(self._mu, self._sigma)
+
+
+def get_latency(latency):
+    if latency is None or hasattr(latency, 'sample'):
+        return latency
+    return Constant(latency)
+
+
+class _FaultyMeasure(object):
+    """
+    Wraps the measure of a request to delay or fail it, the injected delays are measured with the request.
+
+    The faults of a deferred measure are injected once the operation completed, and not at all if it is discarded,
+    e.g. at the end of a listing where no request is sent.
+    """
+
+    __slots__ = ('_faults', '_measure', '_operation', '_deferred', '_discarded', '_start', 'size', 'retries')
+
+    def __init__(self, faults, measure, operation, deferred=False):
+        self._faults = faults
+        self._measure = measure
+        self._operation = operation
+        self._deferred = deferred
+        self._discarded = False
+        self._start = None
+        self.size = 0
+        self.retries = 0
+
+    def _before_request(self):
+        try:
+            self._faults.before_request(self._operation)
+        except InjectedFault as e:
+            self._measure.__exit__(type(e), e, e.__traceback__)
+            raise
+
+    def __enter__(self):
+        self._measure.__enter__()
+        self._start = time.monotonic()
+        if not self._deferred:
+            self._before_request()
+        return self
+
+    def discard(self):
+        self._discarded = True
+        self._measure.discard()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._measure.size = self.size
+        self._measure.retries = self.retries
+        if exc_type is None and not self._discarded:
+            if self._deferred:
+                self._before_request()
+            self._faults.after_request(self._operation, self._start, self.size or 0)
+        return self._measure.__exit__(exc_type, exc_value, traceback)
+
+
+class FaultInjectionStore(BaseStore):
+    """
+    Wraps a store, including a `LocalStore`, to add latency, bandwidth caps and failures to its requests,
+    e.g. to tune the concurrency of the transfers or the handling of the errors without a cloud account.
+
+    The faults are injected in every request of the wrapped store, i.e. in every `list` page,
+    `head`, `get`, `put` and `delete` recorded in the metrics, including the requests
+    of the directory transfers and of the syncs, so the wrapped store should only be used through the wrapper.
+    The wrapper is a `BaseStore` and can be used by a `StoreManager`.
+
+    The wrapper can be closed, or used as a context manager, to stop injecting faults in the wrapped store.
+
+    The latency, error and timeout options are values, or dicts of values by operation, e.g. `{metrics.GET: 0.05}`.
+    The faults are drawn from a random generator seeded with `seed`, so that the same sequence of requests
+    gets the same latencies and failures, the order of concurrent requests is however not deterministic.
+
+    Args:
+        store: `BaseStore`. the store to wrap.
+        latency: `float` or a distribution, e.g. `LogNormal(0.02, 0.5)`. the latency added before every request.
+        bandwidth: `float`. the maximum throughput in bytes per second of the transfers,
+            the concurrent `get` and `put` requests share the bandwidth.
+        error_rate: `float`. the probability of a request to fail with a `ThrottlingFault`.
+        timeout_rate: `float`. the probability of a request to fail with a `TimeoutFault`, after `timeout` seconds.
+        timeout: `float`. the duration of the requests that time out.
+        seed: `int`. the seed of the random generator.
+    """
+
+    def __init__(self,
+                 store,
+                 latency=None,
+                 bandwidth=None,
+                 error_rate=0,
+                 timeout_rate=0,
+                 timeout=1,
+                 seed=None):
+        # pylint:disable=protected-access
+        if isinstance(store, FaultInjectionStore) or store._faults is not None:
+            raise DblueStoresException('The store already injects faults.')
+
+        self._store = store
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._error_rate = error_rate
+        self._timeout_rate = timeout_rate
+        self._timeout = timeout
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # When the bandwidth is free again, after the transfers already scheduled
+        self._bandwidth_available_at = 0
+        self.requests = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self._previous_faults = store._faults
+        store._faults = self
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def stats(self):
+        return {'requests': self.requests, 'throttled': self.throttled, 'timeouts': self.timeouts}
+
+    @property
+    def STORE_TYPE(self):  # pylint:disable=invalid-name
+        return self._store.STORE_TYPE
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stops injecting faults in the wrapped store, which can then be used, or wrapped, again."""
+        # pylint:disable=protected-access
+        if self._store._faults is self:
+            self._store._faults = self._previous_faults
+
+    def __getattr__(self, name):
+        # The methods specific to a store, e.g. `S3Store.upload_bytes`
+        return getattr(self._store, name)
+
+    @staticmethod
+    def _get_option(value, operation):
+        if isinstance(value, dict):
+            return value.get(operation)
+        return value
+
+    def inject(self, measure, operation, deferred=False):
+        """
+        Returns a measure of a request of the wrapped store delaying or failing the request.
+
+        Args:
+            measure: the measure of the request, see `metrics.measure`.
+            operation: `str`. the operation of the request.
+            deferred: `bool`. whether or not to inject the faults once the request completed,
+                for measures that are discarded when no request was sent.
+        """
+        return _FaultyMeasure(self, measure, operation, deferred=deferred)
+
+    def before_request(self, operation):
+        latency = get_latency(self._get_option(self._latency, operation))
+        error_rate = self._get_option(self._error_rate, operation) or 0
+        timeout_rate = self._get_option(self._timeout_rate, operation) or 0
+
+        # The values are drawn in the same order for every request, so that the sequence is reproducible
+        with self._lock:
+            self.requests += 1
+            delay = latency.sample(self._rng) if latency is not None else 0
+            timeout = self._rng.random() < timeout_rate
+            error = self._rng.random() < error_rate and not timeout
+            self.timeouts += timeout
+            self.throttled += error
+
+        if delay > 0:
+            time.sleep(delay)
+        if timeout:
+            time.sleep(self._get_option(self._timeout, operation) or 0)
+            raise TimeoutFault('Injected timeout of a `{}` request'.format(operation), operation=operation)
+        if error:
+            raise ThrottlingFault('Injected `503 Slow Down` of a `{}` request'.format(operation),
+                                  operation=operation,
+                                  status=503)
+
+    def after_request(self, operation, start, size):
+        bandwidth = self._get_option(self._bandwidth, operation)
+        if not bandwidth or not size or operation not in (metrics.GET, metrics.PUT):
+            return
+
+        # The transfers are scheduled one after the other on the bandwidth, from the start of their request
+        with self._lock:
+            available_at = max(self._bandwidth_available_at, start) + size / float(bandwidth)
+            self._bandwidth_available_at = available_at
+
+        delay = available_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def set_env_vars(self):
+        self._store.set_env_vars()
+
+    def open(self, *args, **kwargs):
+        return self._store.open(*args, **kwargs)
+
+    def ls(self, *args, **kwargs):
+        return self._store.ls(*args, **kwargs)
+
+    def iter_ls(self, *args, **kwargs):
+        return self._store.iter_ls(*args, **kwargs)
+
+    def list(self, *args, **kwargs):
+        return self._store.list(*args, **kwargs)
+
+    def iter_list(self, *args, **kwargs):
+        return self._store.iter_list(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._store.delete(*args, **kwargs)
+
+    def download_file(self, *args, **kwargs):
+        return self._store.download_file(*args, **kwargs)
+
+    def download_dir(self, *args, **kwargs):
+        return self._store.download_dir(*args, **kwargs)
+
+    def upload_file(self, *args, **kwargs):
+        return self._store.upload_file(*args, **kwargs)
+
+    def upload_dir(self, *args, **kwargs):
+        return self._store.upload_dir(*args, **kwargs)
+
+    def iter_metadata(self, *args, **kwargs):
+        return self._store.iter_metadata(*args, **kwargs)
+
+    def get_metadata(self, *args, **kwargs):
+        return self._store.get_metadata(*args, **kwargs)
+
+    def sync(self, *args, **kwargs):
+        return self._store.sync(*args, **kwargs)
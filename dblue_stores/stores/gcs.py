@@ -1,13 +1,20 @@
+import inspect
 import os
+import threading
 
+from functools import partial
 from urllib.parse import urlparse
 
 from google.api_core.exceptions import GoogleAPIError, NotFound
 
+from .. import metrics
 from ..clients.gcp import GCPClient
 from ..exceptions import DblueStoresException
+from ..listing import CompactListing
 from ..logger import logger
-from ..utils import append_basename, check_dir_exists, walk
+from ..readers import RangedReader, check_read_mode
+from ..transfer import TransferExecutor, download_ranges
+from ..utils import append_basename, b64_to_hex, check_dir_exists, iter_files, to_timestamp
 from .base import BaseStore
 
 # pylint:disable=arguments-differ
@@ -18,6 +25,8 @@ class GCSStore(BaseStore):
     Google cloud store Service.
     """
     STORE_TYPE = BaseStore.GCS_STORE
+    # Maximum number of calls allowed in a batch request
+    BATCH_SIZE = 100
 
     def __init__(self, client=None, **kwargs):
         self._client = client
@@ -27,6 +36,12 @@ class GCSStore(BaseStore):
         self._keyfile_dict = kwargs.get('keyfile_dict')
         self._scopes = kwargs.get('scopes')
         self._encoding = kwargs.get('encoding', 'utf-8')
+        self._validate_buckets = kwargs.get('validate_buckets', True)
+
+        self._buckets = {}
+        self._buckets_lock = threading.RLock()
+        self._bucket_cache_hits = 0
+        self._bucket_cache_misses = 0
 
     @property
     def client(self):
@@ -64,6 +79,7 @@ class GCSStore(BaseStore):
             credentials=credentials,
             scopes=scopes,
         )
+        self.clear_bucket_cache()
 
     @staticmethod
     def parse_gcs_url(gcs_url):
@@ -86,10 +102,49 @@ class GCSStore(BaseStore):
         """
         Gets a bucket by name.
 
+        Bucket handles are cached by name, if the store was created with `validate_buckets=False`
+        the handle is created without any request, otherwise the bucket is fetched once
+        to make sure that it exists.
+
         Args:
             bucket_name: `str`. Name of the bucket
         """
-        return self.client.get_bucket(bucket_name)
+        with self._buckets_lock:
+            bucket = self._buckets.get(bucket_name)
+            if bucket is not None:
+                self._bucket_cache_hits += 1
+                return bucket
+
+            if self._validate_buckets:
+                bucket = self.client.get_bucket(bucket_name)
+            else:
+                bucket = self.client.bucket(bucket_name)
+            self._bucket_cache_misses += 1
+            self._buckets[bucket_name] = bucket
+            return bucket
+
+    def clear_bucket_cache(self):
+        """Drops the cached bucket handles."""
+        with self._buckets_lock:
+            self._buckets = {}
+
+    @property
+    def bucket_cache_stats(self):
+        """
+        Returns the bucket cache counters.
+
+        Returns:
+            dict with the cache `hits` and `misses`, and the number of `requests_saved`
+            compared to fetching the bucket on every operation.
+        """
+        requests_saved = self._bucket_cache_hits
+        if not self._validate_buckets:
+            requests_saved += self._bucket_cache_misses
+        return {
+            'hits': self._bucket_cache_hits,
+            'misses': self._bucket_cache_misses,
+            'requests_saved': requests_saved,
+        }
 
     def check_blob(self, blob, bucket_name=None):
         """
@@ -118,20 +173,93 @@ class GCSStore(BaseStore):
 
         bucket = self.get_bucket(bucket_name)
         # Wrap google.cloud.storage's blob to raise if the file doesn't exist
-        obj = bucket.get_blob(blob)
+        with self.measure(metrics.HEAD, bucket_name):
+            obj = bucket.get_blob(blob)
 
         if obj is None:
             raise DblueStoresException('File does not exist: {}'.format(blob))
 
         return obj
 
-    def ls(self, path):
-        results = self.list(key=path)
-        return {'files': results['blobs'], 'dirs': results['prefixes']}
+    def _get_range_fetcher(self, blob, bucket_name):
+        """Returns a function fetching byte ranges of the current generation of a blob, and the size of the blob."""
+        obj = self.get_blob(blob=blob, bucket_name=bucket_name)
+
+        if hasattr(obj, 'download_as_bytes'):
+            def download(start, end):
+                return obj.download_as_bytes(start=start, end=end, if_generation_match=obj.generation)
+        else:
+            # Older clients, e.g. google-cloud-storage 1.10, have no preconditions on downloads,
+            # the media link of a blob returned by `get_blob` is pinned to its generation,
+            # so the ranges of an overwritten blob are not found, unless the bucket keeps the old versions
+            def download(start, end):
+                return obj.download_as_string(start=start, end=end)
+
+        def fetch(start, end):
+            try:
+                with self.measure(metrics.GET, bucket_name) as measure:
+                    data = download(start, end)
+                    measure.size = len(data)
+                return data
+            except (NotFound, GoogleAPIError) as e:
+                raise DblueStoresException(e)
+
+        return fetch, obj.size
+
+    def open(self, blob, mode='rb', bucket_name=None, block_size=None, readahead=None, cache_blocks=None):
+        """
+        Opens a blob as a seekable file-like object backed by ranged downloads, see `RangedReader`.
+
+        The reads fail if the blob is overwritten after it was opened,
+        with older clients they keep reading the opened generation if the bucket keeps the old versions.
+
+        Args:
+            blob: `str`. the path to the blob.
+            mode: `str`. the mode, only `rb` is supported.
+            bucket_name: `str`. Name of the bucket in which the file is stored.
+            block_size: `int`. the size of the blocks fetched by each request.
+            readahead: `int`. the number of blocks to prefetch on sequential reads.
+            cache_blocks: `int`. the maximum number of blocks kept in memory.
+
+        Returns:
+            RangedReader
+        """
+        check_read_mode(mode)
+        if not bucket_name:
+            bucket_name, blob = self.parse_gcs_url(blob)
 
-    def list(self, key, bucket_name=None, path=None, delimiter='/', blobs=True, prefixes=True):
+        fetch, size = self._get_range_fetcher(blob, bucket_name)
+        return RangedReader(fetch,
+                            size=size,
+                            name='gs://{}/{}'.format(bucket_name, blob),
+                            block_size=block_size,
+                            readahead=readahead,
+                            cache_blocks=cache_blocks)
+
+    def ls(self, path, compact=False):
+        results = {'files': CompactListing() if compact else [], 'dirs': []}
+        for page in self.iter_ls(path, compact=compact):
+            results['files'].extend(page['files'])
+            results['dirs'].extend(page['dirs'])
+        return results
+
+    def iter_ls(self, path, compact=False):
+        for page in self.iter_list(key=path, compact=compact):
+            yield {'files': page['blobs'], 'dirs': page['prefixes']}
+
+    def iter_list(self,
+                  key,
+                  bucket_name=None,
+                  path=None,
+                  delimiter='/',
+                  blobs=True,
+                  prefixes=True,
+                  recursive=False,
+                  compact=False,
+                  page_size=None,
+                  fields=None):
         """
-        List prefixes and blobs in a bucket.
+        List prefixes and blobs in a bucket, one page at a time.
 
         Args:
             key: `str`. a key prefix.
@@ -140,9 +268,15 @@ class GCSStore(BaseStore):
             delimiter: `str`. the delimiter marks key hierarchy.
             blobs: `bool`. if it should include blobs.
             prefixes: `bool`. if it should include prefixes.
+            recursive: `bool`. if it should list the whole subtree under the key,
+                the delimiter is ignored and no prefixes are returned.
+            compact: `bool`. if it should return the blobs in a `CompactListing` instead of a list of tuples.
+            page_size: `int`. the maximum number of blobs and prefixes per page, defaults to the API's 1000.
+            fields: `str`. the partial response projection of the listing requests,
+                defaults to the fields of the blobs used by the listing, see `get_list_fields`.
 
         Returns:
-             Service client instance
+            generator of dicts with the `blobs` and `prefixes` of every page.
         """
         if not bucket_name:
             bucket_name, key = self.parse_gcs_url(key)
@@ -159,11 +293,12 @@ class GCSStore(BaseStore):
         if prefix and not prefix.endswith('/'):
             prefix += '/'
 
-        def get_iterator():
-            return bucket.list_blobs(prefix=prefix, delimiter=delimiter)
+        if recursive:
+            delimiter = None
+            prefixes = False
 
         def get_blobs(_blobs):
-            list_blobs = []
+            list_blobs = CompactListing() if compact else []
             for blob in _blobs:
 
                 # To solve empty blob issue
@@ -172,7 +307,10 @@ class GCSStore(BaseStore):
 
                 name = blob.name[len(key):]
 
-                list_blobs.append((name, blob.size))
+                if compact:
+                    list_blobs.append(name, blob.size, to_timestamp(blob.updated))
+                else:
+                    list_blobs.append((name, blob.size))
 
             return list_blobs
 
@@ -183,19 +321,143 @@ class GCSStore(BaseStore):
                 list_prefixes.append(name)
             return list_prefixes
 
-        results = {
-            'blobs': [],
-            'prefixes': []
+        if fields is None:
+            fields = self.get_list_fields(('name', 'size', 'updated') if compact else ('name', 'size'),
+                                          blobs=blobs)
+
+        # Blobs and prefixes are collected from the same pages to list only once
+        iterator = self._list_blobs(bucket, prefix=prefix, delimiter=delimiter, page_size=page_size, fields=fields)
+        for page in self._measure_pages(iterator.pages, bucket_name):
+            yield {
+                'blobs': get_blobs(page if blobs else []),
+                'prefixes': get_prefixes(page.prefixes) if prefixes else [],
+            }
+
+    @staticmethod
+    def get_list_fields(blob_fields, blobs=True):
+        """
+        Returns the partial response projection of a listing, only the given fields of the blobs are returned,
+        the prefixes and the page tokens are always included.
+
+        Args:
+            blob_fields: `list`. the fields of the blobs, e.g. `name`, `size`, `updated`, `md5Hash`.
+            blobs: `bool`. if the blobs are needed at all.
+        """
+        if not blobs:
+            return 'prefixes,nextPageToken'
+        return 'items({}),prefixes,nextPageToken'.format(','.join(blob_fields))
+
+    @staticmethod
+    def _list_blobs(bucket, prefix, delimiter=None, page_size=None, fields=None):
+        kwargs = {'prefix': prefix, 'delimiter': delimiter}
+        if fields:
+            # Without the page token only the first page would be listed
+            if 'nextPageToken' not in fields:
+                fields += ',nextPageToken'
+            kwargs['fields'] = fields
+        if not page_size:
+            return bucket.list_blobs(**kwargs)
+
+        parameters = inspect.signature(bucket.list_blobs).parameters
+        if 'page_size' in parameters or any(p.kind == p.VAR_KEYWORD for p in parameters.values()):
+            return bucket.list_blobs(page_size=page_size, **kwargs)
+
+        # Older versions of google-cloud-storage, e.g. 1.10, have no `page_size`, and their `max_results`
+        # limits the whole listing, the page size is set with the `maxResults` param of every request instead
+        iterator = bucket.list_blobs(**kwargs)
+        iterator.extra_params['maxResults'] = page_size
+        return iterator
+
+    def iter_metadata(self, key, bucket_name=None, page_size=None):
+        """
+        Yields `(name, metadata)` for every blob under a key, the `version` of a blob is its generation.
+
+        Args:
+            key: `str`. a key prefix, or a gcs url if no bucket name is provided.
+            bucket_name: `str`. the name of the bucket.
+            page_size: `int`. the maximum number of blobs per listing request.
+        """
+        if not bucket_name:
+            bucket_name, key = self.parse_gcs_url(key)
+
+        if key and not key.endswith('/'):
+            key += '/'
+
+        bucket = self.get_bucket(bucket_name)
+        fields = self.get_list_fields(('name', 'size', 'updated', 'md5Hash', 'generation'))
+        iterator = self._list_blobs(bucket, prefix=key, page_size=page_size, fields=fields)
+        for page in self._measure_pages(iterator.pages, bucket_name):
+            for blob in page:
+                name = blob.name[len(key):]
+                if not name or name.endswith('/'):
+                    continue
+                yield name, self._get_metadata(blob)
+
+    @staticmethod
+    def _get_metadata(blob):
+        return {
+            'size': blob.size,
+            'mtime': to_timestamp(blob.updated),
+            'md5': b64_to_hex(blob.md5_hash),
+            'version': str(blob.generation) if blob.generation else None,
         }
 
-        if blobs:
-            iterator = get_iterator()
-            results['blobs'] = get_blobs(list(iterator))
+    def get_metadata(self, blob, bucket_name=None):
+        """
+        Returns the metadata of a blob, a dict with its `size`, `mtime`, `md5` and `version`, the generation.
 
-        if prefixes:
-            iterator = get_iterator()
-            for page in iterator.pages:
-                results['prefixes'] += get_prefixes(page.prefixes)
+        Args:
+            blob: `str`. the path to the blob.
+            bucket_name: `str`. the name of the bucket.
+        """
+        return self._get_metadata(self.get_blob(blob=blob, bucket_name=bucket_name))
+
+    def list(self,
+             key,
+             bucket_name=None,
+             path=None,
+             delimiter='/',
+             blobs=True,
+             prefixes=True,
+             recursive=False,
+             compact=False,
+             page_size=None,
+             fields=None):
+        """
+        List prefixes and blobs in a bucket.
+
+        Args:
+            key: `str`. a key prefix.
+            bucket_name: `str`. the name of the bucket.
+            path: `str`. an extra path to append to the key.
+            delimiter: `str`. the delimiter marks key hierarchy.
+            blobs: `bool`. if it should include blobs.
+            prefixes: `bool`. if it should include prefixes.
+            recursive: `bool`. if it should list the whole subtree under the key,
+                the delimiter is ignored and no prefixes are returned.
+            compact: `bool`. if it should return the blobs in a `CompactListing` instead of a list of tuples.
+            page_size: `int`. the maximum number of blobs and prefixes per listing request.
+            fields: `str`. the partial response projection of the listing requests.
+
+        Returns:
+             dict with the `blobs` and `prefixes`.
+        """
+        results = {
+            'blobs': CompactListing() if compact else [],
+            'prefixes': []
+        }
+        for page in self.iter_list(key=key,
+                                   bucket_name=bucket_name,
+                                   path=path,
+                                   delimiter=delimiter,
+                                   blobs=blobs,
+                                   prefixes=prefixes,
+                                   recursive=recursive,
+                                   compact=compact,
+                                   page_size=page_size,
+                                   fields=fields):
+            results['blobs'].extend(page['blobs'])
+            results['prefixes'].extend(page['prefixes'])
 
         return results
 
@@ -216,9 +478,11 @@ class GCSStore(BaseStore):
             blob = append_basename(blob, filename)
 
         bucket = self.get_bucket(bucket_name)
-        bucket.blob(blob).upload_from_filename(filename)
+        with self.measure(metrics.PUT, bucket_name) as measure:
+            measure.size = os.path.getsize(filename)
+            bucket.blob(blob).upload_from_filename(filename)
 
-    def download_file(self, blob, local_path, bucket_name=None, use_basename=True):
+    def download_file(self, blob, local_path, bucket_name=None, use_basename=True, part_size=None, max_workers=None):
         """
         Downloads a file from Google Cloud Storage.
 
@@ -227,6 +491,9 @@ class GCSStore(BaseStore):
             local_path: `str`. the path to download to.
             bucket_name: `str`. the name of the bucket.
             use_basename: `bool`. whether or not to use the basename of the blob.
+            part_size: `int`. the size of the ranges of a parallel download.
+            max_workers: `int`. if provided, the blob is downloaded by fetching this number
+                of byte ranges concurrently, see `download_ranges`.
         """
         if not bucket_name:
             bucket_name, blob = self.parse_gcs_url(blob)
@@ -238,13 +505,26 @@ class GCSStore(BaseStore):
 
         check_dir_exists(local_path)
 
+        if max_workers:
+            fetch, size = self._get_range_fetcher(blob, bucket_name)
+            download_ranges(fetch, size, local_path, part_size=part_size, max_workers=max_workers)
+            return
+
         try:
             blob = self.get_blob(blob=blob, bucket_name=bucket_name)
-            blob.download_to_filename(local_path)
+            with self.measure(metrics.GET, bucket_name) as measure:
+                blob.download_to_filename(local_path)
+                measure.size = os.path.getsize(local_path)
         except (NotFound, GoogleAPIError) as e:
             raise DblueStoresException(e)
 
-    def upload_dir(self, dirname, blob, bucket_name=None, use_basename=True):
+    def upload_dir(self,
+                   dirname,
+                   blob,
+                   bucket_name=None,
+                   use_basename=True,
+                   max_workers=None,
+                   raise_errors=True):
         """
         Uploads a local directory to to Google Cloud Storage.
 
@@ -253,6 +533,12 @@ class GCSStore(BaseStore):
             blob: `str`. blob to upload to.
             bucket_name: `str`. the name of the bucket.
             use_basename: `bool`. whether or not to use the basename of the directory.
+            max_workers: `int`. number of files to upload concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            TransferResult
         """
         if not bucket_name:
             bucket_name, blob = self.parse_gcs_url(blob)
@@ -262,15 +548,31 @@ class GCSStore(BaseStore):
 
         # Turn the path to absolute paths
         dirname = os.path.abspath(dirname)
-        with walk(dirname) as files:
-            for f in files:
+
+        def get_tasks(entries):
+            for entry in entries:
+                f = entry.path
                 file_blob = os.path.join(blob, os.path.relpath(f, dirname))
-                self.upload_file(filename=f,
+                yield f, partial(self.upload_file,
+                                 filename=f,
                                  blob=file_blob,
                                  bucket_name=bucket_name,
                                  use_basename=False)
 
-    def download_dir(self, blob, local_path, bucket_name=None, use_basename=True):
+        # The files are uploaded while the directory is traversed
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks(iter_files(dirname)))
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+    def download_dir(self,
+                     blob,
+                     local_path,
+                     bucket_name=None,
+                     use_basename=True,
+                     max_workers=None,
+                     raise_errors=True):
         """
         Download a directory from Google Cloud Storage.
 
@@ -279,6 +581,12 @@ class GCSStore(BaseStore):
             local_path: `str`. the path to download to.
             bucket_name: `str`. Name of the bucket in which to store the file.
             use_basename: `bool`. whether or not to use the basename of the key.
+            max_workers: `int`. number of files to download concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            TransferResult
         """
         if not bucket_name:
             bucket_name, blob = self.parse_gcs_url(blob)
@@ -293,53 +601,179 @@ class GCSStore(BaseStore):
         except DblueStoresException:
             os.makedirs(local_path)
 
-        results = self.list(bucket_name=bucket_name, key=blob, delimiter='/')
-
-        # Create directories
-        for prefix in sorted(results['prefixes']):
-            direname = os.path.join(local_path, prefix)
-            prefix = os.path.join(blob, prefix)
-            # Download files under
-            self.download_dir(blob=prefix,
-                              local_path=direname,
-                              bucket_name=bucket_name,
-                              use_basename=False)
-
-        # Download files
-        for file_key in results['blobs']:
-            file_key = file_key[0]
-            filename = os.path.join(local_path, file_key)
-            file_key = os.path.join(blob, file_key)
-            self.download_file(blob=file_key,
-                               local_path=filename,
-                               bucket_name=bucket_name,
-                               use_basename=False)
+        results = self.list(bucket_name=bucket_name, key=blob, recursive=True)
+
+        def get_tasks():
+            for file_key, _ in results['blobs']:
+                filename = os.path.join(local_path, file_key)
+                # Blobs ending with a delimiter are empty directory markers
+                dirname = filename if file_key.endswith('/') else os.path.dirname(filename)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                if file_key.endswith('/'):
+                    continue
+
+                file_key = os.path.join(blob, file_key)
+                yield file_key, partial(self.download_file,
+                                        blob=file_key,
+                                        local_path=filename,
+                                        bucket_name=bucket_name,
+                                        use_basename=False)
+
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks())
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+    def _get_batches(self, keys, bucket_name=None):
+        """Groups keys, or urls if no bucket name is provided, by bucket in batches of `BATCH_SIZE`."""
+        batches = {}
+        for key in keys:
+            key_bucket_name = bucket_name
+            if not key_bucket_name:
+                key_bucket_name, key = self.parse_gcs_url(key)
+            batch = batches.setdefault(key_bucket_name, [])
+            batch.append(key)
+            if len(batch) == self.BATCH_SIZE:
+                yield key_bucket_name, batches.pop(key_bucket_name)
+
+        for key_bucket_name, batch in batches.items():
+            yield key_bucket_name, batch
+
+    def _send_batch(self, operation, bucket_name, requests):
+        """
+        Sends requests in one batch request.
+
+        A batch raises the error of its first failed sub-request,
+        the status of every sub-request is read from the responses of the batch instead.
+
+        Args:
+            operation: `str`. the operation recorded in the metrics.
+            bucket_name: `str`. the name of the bucket.
+            requests: `list`. callables sending the requests, e.g. `blob.reload`.
+
+        Returns:
+            dict mapping the indices of the failed requests to their status code,
+            or None if the batch request itself failed, or if the responses of the batch can't be read,
+            the requests are then sent one by one by the caller.
+        """
+        responses = []
+        batch = self.client.batch()
+        # The responses are read from a private method of the batch, which not every client version has
+        finish_futures = getattr(batch, '_finish_futures', None)
+        if not callable(finish_futures):
+            logger.debug('Batch responses are not supported by this google-cloud-storage version.')
+            return None
+
+        def record_responses(batch_responses, *args, **kwargs):
+            responses.extend(batch_responses)
+            return finish_futures(batch_responses, *args, **kwargs)
+
+        batch._finish_futures = record_responses  # pylint:disable=protected-access
+        try:
+            with self.measure(operation, bucket_name):
+                try:
+                    with batch:
+                        for request in requests:
+                            request()
+                except (NotFound, GoogleAPIError):
+                    if len(responses) != len(requests):
+                        raise
+        except (NotFound, GoogleAPIError) as e:
+            logger.debug('Failed to send a batch of %s requests: %s', len(requests), e)
+            return None
+        return {index: response.status_code
+                for index, response in enumerate(responses)
+                if not 200 <= response.status_code < 300}
+
+    def stat_many(self, keys, bucket_name=None):
+        """
+        Gets the metadata of several blobs, packing up to `BATCH_SIZE` lookups in one batch request.
+
+        Only the lookups that failed for another reason than a missing blob are sent again, one by one.
+
+        Args:
+            keys: `iterable`. blobs to look up, or gcs urls if no bucket name is provided.
+            bucket_name: `str`. the name of the bucket.
+
+        Returns:
+            dict mapping every key to its blob, or to None if the blob does not exist.
+        """
+        results = {}
+        for batch_bucket_name, batch in self._get_batches(keys, bucket_name=bucket_name):
+            bucket = self.get_bucket(batch_bucket_name)
+            blobs = [bucket.blob(key) for key in batch]
+            failures = self._send_batch(metrics.HEAD, batch_bucket_name, [blob.reload for blob in blobs])
+
+            for index, (key, blob) in enumerate(zip(batch, blobs)):
+                if failures is None:
+                    blob = bucket.get_blob(key)
+                elif index in failures:
+                    blob = None if failures[index] == 404 else bucket.get_blob(key)
+                results[key if bucket_name else 'gs://{}/{}'.format(batch_bucket_name, key)] = blob
+        return results
 
     def delete(self, key, bucket_name=None):
         if not bucket_name:
             bucket_name, key = self.parse_gcs_url(key)
 
-        results = self.list(bucket_name=bucket_name, key=key, delimiter='/')
-        if not any([results['prefixes'], results['blobs']]):
+        results = self.list(bucket_name=bucket_name, key=key, recursive=True)
+        if not results['blobs']:
             self.delete_file(key=key, bucket_name=bucket_name)
+            return
+
+        keys = (os.path.join(key, file_key) for file_key, _ in results['blobs'])
+        errors = self.delete_many(keys=keys, bucket_name=bucket_name)
+        if errors:
+            raise DblueStoresException('Failed to delete {} blobs, e.g. {}: {}'.format(
+                len(errors), *next(iter(errors.items()))))
+
+    def _sync_delete(self, paths):
+        errors = self.delete_many(keys=paths)
+        if errors:
+            raise DblueStoresException('Failed to delete {} blobs, e.g. {}: {}'.format(
+                len(errors), *next(iter(errors.items()))))
+
+    def delete_many(self, keys, bucket_name=None):
+        """
+        Deletes several blobs, packing up to `BATCH_SIZE` deletes in one batch request.
 
-        # Delete directories
-        for prefix in sorted(results['prefixes']):
-            prefix = os.path.join(key, prefix)
-            # Download files under
-            self.delete(key=prefix, bucket_name=bucket_name)
+        Blobs that do not exist are not reported as errors.
 
-        # Delete files
-        for file_key in results['blobs']:
-            file_key = file_key[0]
-            file_key = os.path.join(key, file_key)
-            self.delete_file(key=file_key, bucket_name=bucket_name)
+        Args:
+            keys: `iterable`. blobs to delete, or gcs urls if no bucket name is provided.
+            bucket_name: `str`. the name of the bucket.
+
+        Returns:
+            dict mapping the keys that could not be deleted to their exception.
+        """
+        errors = {}
+        for batch_bucket_name, batch in self._get_batches(keys, bucket_name=bucket_name):
+            bucket = self.get_bucket(batch_bucket_name)
+            failures = self._send_batch(metrics.DELETE,
+                                        batch_bucket_name,
+                                        [partial(bucket.delete_blob, key) for key in batch])
+
+            for index, key in enumerate(batch):
+                # Deleted, or already missing
+                if failures is not None and failures.get(index, 404) == 404:
+                    continue
+                # The deletes that failed are retried one by one
+                try:
+                    bucket.delete_blob(key)
+                except NotFound:
+                    pass
+                except GoogleAPIError as e:
+                    errors[key if bucket_name else 'gs://{}/{}'.format(batch_bucket_name, key)] = e
+        return errors
 
     def delete_file(self, key, bucket_name=None):
         if not bucket_name:
             bucket_name, key = self.parse_gcs_url(key)
         bucket = self.get_bucket(bucket_name)
         try:
-            return bucket.delete_blob(key)
+            with self.measure(metrics.DELETE, bucket_name):
+                return bucket.delete_blob(key)
         except (NotFound, GoogleAPIError) as e:
             raise DblueStoresException(e)
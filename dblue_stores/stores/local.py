@@ -0,0 +1,241 @@
+import io
+import os
+import shutil
+
+from functools import partial
+
+from .. import metrics
+from ..exceptions import DblueStoresException
+from ..listing import CompactListing
+from ..readers import check_read_mode
+from ..sync import get_local_file_metadata, get_local_metadata
+from ..transfer import TransferExecutor, TransferResult
+from ..utils import append_basename, check_dir_exists, copy_file, iter_files
+from .base import BaseStore
+
+# pylint:disable=arguments-differ
+
+
+class LocalStore(BaseStore):
+    """
+    Local filesystem store.
+
+    Files are copied with `copy_file`, i.e. with reflinks or in-kernel copies when possible,
+    so staging large files between local directories does not go through user space buffers.
+
+    Args:
+        hardlink: `bool`. whether or not to hardlink files instead of copying them
+            when both paths are on the same filesystem, the files then share their content.
+    """
+    STORE_TYPE = BaseStore.LOCAL_STORE
+
+    def __init__(self, hardlink=False, **kwargs):
+        self._hardlink = hardlink
+
+    def open(self, path, mode='rb', **kwargs):
+        check_read_mode(mode)
+        return io.open(path, 'rb')
+
+    def ls(self, path, compact=False):
+        results = self.list(path, compact=compact)
+        return {'files': results['files'], 'dirs': results['dirs']}
+
+    def iter_ls(self, path, compact=False):
+        return self.iter_list(path, compact=compact)
+
+    def iter_list(self, path, page_size=1000, compact=False):
+        """
+        Lists the files and directories under a path, one page at a time.
+
+        Args:
+            path: `str`. the directory to list.
+            page_size: `int`. maximum number of entries per page.
+            compact: `bool`. if it should return the files in a `CompactListing` of names, sizes
+                and modification times instead of a list of tuples.
+
+        Returns:
+            generator of dicts with the `files` and `dirs` of every page.
+        """
+        return self._measure_pages(self._iter_pages(path, page_size=page_size, compact=compact), None)
+
+    @staticmethod
+    def _iter_pages(path, page_size, compact):
+        if not os.path.isdir(path):
+            return
+
+        files = CompactListing() if compact else []
+        dirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                else:
+                    stat = entry.stat()
+                    if compact:
+                        files.append(entry.name, stat.st_size, stat.st_mtime)
+                    else:
+                        files.append((entry.name, stat.st_size))
+
+                if len(files) + len(dirs) >= page_size:
+                    yield {'files': files, 'dirs': dirs}
+                    files = CompactListing() if compact else []
+                    dirs = []
+
+        if files or dirs:
+            yield {'files': files, 'dirs': dirs}
+
+    def list(self, path, compact=False):
+        files = CompactListing() if compact else []
+        dirs = []
+        for page in self.iter_list(path, compact=compact):
+            files.extend(page['files'])
+            dirs.extend(page['dirs'])
+
+        return {'files': files, 'dirs': dirs}
+
+    def iter_metadata(self, path):
+        """Yields `(name, metadata)` for every file under a directory."""
+        with self.measure(metrics.LIST, None):
+            results = get_local_metadata(path)
+        for name, metadata in results.items():
+            yield name, metadata
+
+    def get_metadata(self, path):
+        try:
+            with self.measure(metrics.HEAD, None):
+                return get_local_file_metadata(path)
+        except OSError as e:
+            raise DblueStoresException(e)
+
+    def delete(self, path):
+        with self.measure(metrics.DELETE, None):
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.remove(path)
+
+    def delete_file(self, path):
+        with self.measure(metrics.DELETE, None):
+            if os.path.lexists(path):
+                os.remove(path)
+
+    def copy_file(self, src, dst, use_basename=True):
+        """
+        Copies a file.
+
+        Args:
+            src: `str`. the file to copy.
+            dst: `str`. the path to copy to.
+            use_basename: `bool`. whether or not to use the basename of the src.
+
+        Returns:
+            str, the copy method used, see `utils.copy_file`.
+        """
+        return self._copy_file(src, dst, use_basename=use_basename, operation=metrics.PUT)
+
+    def _copy_file(self, src, dst, use_basename, operation):
+        # Copies are recorded as `put` requests, except for downloads, recorded as `get` requests
+        dst = os.path.abspath(dst)
+        if use_basename:
+            dst = append_basename(dst, src)
+
+        check_dir_exists(dst)
+
+        try:
+            with self.measure(operation, None) as measure:
+                method = copy_file(src, dst, hardlink=self._hardlink)
+                measure.size = os.path.getsize(dst)
+                return method
+        except (IOError, OSError) as e:
+            raise DblueStoresException(e)
+
+    def upload_file(self, filename, path, use_basename=True):
+        self.copy_file(filename, path, use_basename=use_basename)
+
+    def download_file(self, path, local_path, use_basename=True):
+        self._copy_file(path, local_path, use_basename=use_basename, operation=metrics.GET)
+
+    def copy_dir(self, src, dst, use_basename=True, max_workers=None, raise_errors=True):
+        """
+        Copies a directory.
+
+        Args:
+            src: `str`. the directory to copy.
+            dst: `str`. the path to copy to.
+            use_basename: `bool`. whether or not to use the basename of the src.
+            max_workers: `int`. number of files to copy concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            TransferResult
+        """
+        return self._copy_dir(src, dst,
+                              use_basename=use_basename,
+                              max_workers=max_workers,
+                              raise_errors=raise_errors,
+                              operation=metrics.PUT)
+
+    def _copy_dir(self, src, dst, use_basename, max_workers, raise_errors, operation):
+        if not os.path.isdir(src):
+            return TransferResult()
+
+        src = os.path.abspath(src)
+        dst = os.path.abspath(dst)
+        if use_basename:
+            dst = append_basename(dst, src)
+
+        def get_tasks(entries):
+            for entry in entries:
+                f = entry.path
+                filename = os.path.join(dst, os.path.relpath(f, src))
+                dirname = os.path.dirname(filename)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname, exist_ok=True)
+                yield f, partial(self._copy_file, f, filename, use_basename=False, operation=operation)
+
+        if not os.path.isdir(dst):
+            os.makedirs(dst)
+
+        # The files are copied while the directory is traversed
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks(iter_files(src)))
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+    def upload_dir(self, dirname, path, use_basename=True, max_workers=None, raise_errors=True):
+        return self.copy_dir(dirname, path,
+                             use_basename=use_basename,
+                             max_workers=max_workers,
+                             raise_errors=raise_errors)
+
+    def download_dir(self, path, local_path, use_basename=True, max_workers=None, raise_errors=True):
+        return self._copy_dir(path, local_path,
+                              use_basename=use_basename,
+                              max_workers=max_workers,
+                              raise_errors=raise_errors,
+                              operation=metrics.GET)
+
+    def _sync_upload(self, filename, path):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        self.copy_file(filename, path, use_basename=False)
+
+    def _sync_download(self, path, filename):
+        self._copy_file(path, filename, use_basename=False, operation=metrics.GET)
+
+    def sync(self, src, dst, delete=False, dry_run=False, upload=True, max_workers=None, raise_errors=True):
+        """
+        Incrementally syncs two local directories, see `BaseStore.sync`.
+
+        Copies keep the modification time of their source, so unchanged files are compared by size
+        and modification time without hashing them.
+        """
+        return super(LocalStore, self).sync(src, dst,
+                                            delete=delete,
+                                            dry_run=dry_run,
+                                            upload=True if upload is None else upload,
+                                            max_workers=max_workers,
+                                            raise_errors=raise_errors)
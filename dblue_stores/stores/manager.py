@@ -1,18 +1,37 @@
 import json
 import os
+import threading
+import time
 
 from .base import BaseStore
 from .. import settings
+from ..cache import get_download_cache
 from ..exceptions import DblueStoresException
+from ..listing import CompactListing
+from ..utils import append_basename
 
 
 class StoreManager(object):
     """
     A convenient class to map experiment/job outputs/data paths to a given/configured store.
+
+    The managers of datasets returned by `get_store_for_dataset` are cached and shared,
+    they should not be mutated with `set_store`, `set_path` or `set_cache`.
+
+    Args:
+        store: `BaseStore`. the store to use, defaults to the local store.
+        path: `str`. the base path of the relative paths.
+        cache: `DownloadCache`. an optional on-disk cache for the downloads,
+            `True` uses a cache configured with the settings.
     """
 
-    def __init__(self, store=None, path=None):
+    # Managers of datasets, with the signature of their credential file, by dataset id
+    _datasets = {}
+    _datasets_lock = threading.Lock()
+
+    def __init__(self, store=None, path=None, cache=None):
         self._path = path
+        self._cache = get_download_cache(cache)
         if not store:
             store = BaseStore.get_store()
         if isinstance(store, BaseStore):
@@ -25,15 +44,25 @@ class StoreManager(object):
         store = BaseStore.get_store_for_type(store_type=store_type, store_access=store_access)
         return cls(store=store)
 
+    @staticmethod
+    def get_credential_path(dataset_id):
+        return "{}/{}.json".format(settings.CREDENTIALS_AUTH_MOUNT_PATH, dataset_id)
+
     @classmethod
     def get_credential_for_dataset(cls, dataset_id):
-        credential_file_path = "{}/{}.json".format(settings.CREDENTIALS_AUTH_MOUNT_PATH, dataset_id)
+        credential_file_path = cls.get_credential_path(dataset_id)
         with open(credential_file_path) as f:
             credential = json.load(f)
             return credential
 
+    @staticmethod
+    def _get_file_signature(path):
+        """Changes when a file is modified or replaced, e.g. when a mounted Kubernetes secret is rotated."""
+        stat = os.stat(path)
+        return stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
     @classmethod
-    def get_store_for_dataset(cls, dataset_id):
+    def _create_store_for_dataset(cls, dataset_id):
         try:
             credential = cls.get_credential_for_dataset(dataset_id)
 
@@ -48,6 +77,50 @@ class StoreManager(object):
         except Exception as e:  # handle other exceptions such as attribute errors
             raise DblueStoresException("Unable to create store: %s", e)
 
+    @classmethod
+    def get_store_for_dataset(cls, dataset_id, use_cache=True):
+        """
+        Returns the manager of a dataset, configured with the credential file mounted for the dataset.
+
+        Managers are cached by dataset, the credential file is only checked for changes
+        every `CREDENTIALS_CHECK_INTERVAL` seconds, and read again if it was modified or replaced.
+
+        Args:
+            dataset_id: `str`. the id of the dataset.
+            use_cache: `bool`. whether or not to use the cached manager of the dataset.
+        """
+        if not use_cache:
+            return cls._create_store_for_dataset(dataset_id)
+
+        now = time.monotonic()
+        entry = cls._datasets.get(dataset_id)
+        if entry and now - entry['checked_at'] < settings.CREDENTIALS_CHECK_INTERVAL:
+            return entry['manager']
+
+        try:
+            signature = cls._get_file_signature(cls.get_credential_path(dataset_id))
+        except OSError:
+            cls.clear_dataset_cache(dataset_id)
+            raise DblueStoresException("Unable to get credential for %s", dataset_id)
+
+        if entry and entry['signature'] == signature:
+            entry['checked_at'] = now
+            return entry['manager']
+
+        manager = cls._create_store_for_dataset(dataset_id)
+        with cls._datasets_lock:
+            cls._datasets[dataset_id] = {'signature': signature, 'checked_at': now, 'manager': manager}
+        return manager
+
+    @classmethod
+    def clear_dataset_cache(cls, dataset_id=None):
+        """Removes the cached manager of a dataset, or of all the datasets."""
+        with cls._datasets_lock:
+            if dataset_id is None:
+                cls._datasets.clear()
+            else:
+                cls._datasets.pop(dataset_id, None)
+
     @classmethod
     def get_store_for_path(cls, path, store_access):
         store_type = BaseStore.get_store_type_from_path(path)
@@ -60,6 +133,9 @@ class StoreManager(object):
     def set_path(self, path):
         self._path = path
 
+    def set_cache(self, cache):
+        self._cache = get_download_cache(cache)
+
     def set_env_vars(self):
         """Set authentication and access of the current store to the env vars"""
         if self.store:
@@ -73,19 +149,52 @@ class StoreManager(object):
     def path(self):
         return self._path
 
-    def ls(self, path, sort=True):
+    @property
+    def cache(self):
+        return self._cache
+
+    def ls(self, path, sort=True, compact=False):
+        """
+        Lists the files and dirs under a path.
+
+        Args:
+            path: `str`. the path to list.
+            sort: `bool`. whether or not to sort the results.
+            compact: `bool`. whether or not to return the files in a `CompactListing`,
+                compact listings are sorted by name without materializing the entries.
+        """
         if self._path:  # We assume rel paths
             path = os.path.join(self._path, path)
-        results = self.store.ls(path)
+        results = self.store.ls(path, compact=compact)
         if sort:
-            return {'files': sorted(results['files']), 'dirs': sorted(results['dirs'])}
+            files = results['files']
+            files = files.sort() if isinstance(files, CompactListing) else sorted(files)
+            return {'files': files, 'dirs': sorted(results['dirs'])}
         return results
 
+    def iter_ls(self, path, compact=False):
+        """Yields the `files` and `dirs` under a path one page at a time, pages are not sorted."""
+        if self._path:  # We assume rel paths
+            path = os.path.join(self._path, path)
+        return self.store.iter_ls(path, compact=compact)
+
     def list(self, path):
         if self._path:  # We assume rel paths
             path = os.path.join(self._path, path)
         return self.store.list(path)
 
+    def iter_list(self, path):
+        """Yields the results of `list` one page at a time."""
+        if self._path:  # We assume rel paths
+            path = os.path.join(self._path, path)
+        return self.store.iter_list(path)
+
+    def open(self, path, mode='rb', **kwargs):
+        """Opens a file of the store as a seekable binary file-like object."""
+        if self._path:  # We assume rel paths
+            path = os.path.join(self._path, path)
+        return self.store.open(path, mode=mode, **kwargs)
+
     def delete(self, path):
         return self.store.delete(path)
 
@@ -93,9 +202,9 @@ class StoreManager(object):
         path = path or self._path
         self.store.upload_file(filename, path, **kwargs)
 
-    def upload_dir(self, dirname, path=None, **kwargs):
+    def upload_dir(self, dirname, path=None, max_workers=None, **kwargs):
         path = path or self._path
-        self.store.upload_dir(dirname, path, **kwargs)
+        return self.store.upload_dir(dirname, path, max_workers=max_workers, **kwargs)
 
     def download_file(self, filename, local_path=None, use_basename=False, **kwargs):
         if self._path:  # We assume rel paths
@@ -103,12 +212,44 @@ class StoreManager(object):
             local_path = local_path or filename
         else:
             file_path = filename
+
+        if self._cache and not kwargs:
+            local_path = os.path.abspath(local_path)
+            if use_basename:
+                local_path = append_basename(local_path, file_path)
+            self._cache.download_file(self.store, file_path, local_path)
+            return
+
         self.store.download_file(file_path, local_path, use_basename=use_basename, **kwargs)
 
-    def download_dir(self, dirname, local_path=None, use_basename=False, **kwargs):
+    def download_dir(self, dirname, local_path=None, use_basename=False, max_workers=None, **kwargs):
         if self._path:  # We assume rel paths
             dir_path = os.path.join(self._path, dirname)
             local_path = local_path or dirname
         else:
             dir_path = dirname
-        self.store.download_dir(dir_path, local_path, use_basename=use_basename, **kwargs)
+
+        if self._cache and set(kwargs) <= {'raise_errors'}:
+            local_path = os.path.abspath(local_path)
+            if use_basename:
+                local_path = append_basename(local_path, dir_path.rstrip('/'))
+            return self._cache.download_dir(self.store, dir_path, local_path, max_workers=max_workers, **kwargs)
+
+        return self.store.download_dir(dir_path,
+                                       local_path,
+                                       use_basename=use_basename,
+                                       max_workers=max_workers,
+                                       **kwargs)
+
+    def sync(self, src, dst, delete=False, dry_run=False, upload=None, max_workers=None, **kwargs):
+        """
+        Transfers only the new and changed files between a local directory and a store path,
+        returns the `SyncPlan`, see `BaseStore.sync`.
+        """
+        return self.store.sync(src,
+                               dst,
+                               delete=delete,
+                               dry_run=dry_run,
+                               upload=upload,
+                               max_workers=max_workers,
+                               **kwargs)
@@ -1,29 +1,53 @@
 import os
 
+from functools import partial
+from itertools import chain, islice
 from six import BytesIO
 from urllib.parse import urlparse
 
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
+from .. import metrics
 from ..clients.aws import AWSClient
 from ..exceptions import DblueStoresException
+from ..listing import CompactListing
 from ..logger import logger
-from ..utils import append_basename, check_dir_exists, force_bytes, walk
+from ..readers import RangedReader, check_read_mode
+from ..transfer import TransferExecutor, download_ranges
+from ..utils import append_basename, check_dir_exists, force_bytes, iter_files, to_timestamp
 from .base import BaseStore
 
 # pylint:disable=arguments-differ
 
 
+def get_retries(response):
+    """Returns the number of retries of the request of a boto3 response."""
+    return response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+
 class S3Store(BaseStore):
     """
     S3 store Service using Boto3.
     """
     STORE_TYPE = BaseStore.S3_STORE
     ENCRYPTION = "AES256"
+    DELETE_BATCH_SIZE = 1000
+    # The number of files from which `upload_dir` checks the existing keys against a listing
+    # of the destination instead of one HEAD request per file
+    UPLOAD_DIR_LISTING_MIN_FILES = 100
+    # Multipart uploads limits
+    MAX_PARTS = 10000
+    MIN_PART_SIZE = 8 * 1024 * 1024
+    MAX_PART_SIZE = 5 * 1024 ** 3
+    TRANSFER_OPTIONS = ('multipart_threshold', 'multipart_chunksize', 'max_concurrency', 'use_threads')
 
     def __init__(self, client=None, resource=None, **kwargs):
         self._client = client
         self._resource = resource
+        self._transfer_options = {
+            option: kwargs[option] for option in self.TRANSFER_OPTIONS if kwargs.get(option) is not None
+        }
 
         self._encoding = kwargs.get('encoding', 'utf-8')
         self._endpoint_url = kwargs.get('endpoint_url')
@@ -140,6 +164,45 @@ class S3Store(BaseStore):
             session_token=session_token,
             region_name=region_name)
 
+    @classmethod
+    def get_part_size(cls, size, chunksize=None):
+        """
+        Returns the size of the parts of a multipart transfer of size bytes.
+
+        The parts are at least `chunksize`, or `MIN_PART_SIZE`, and large enough
+        for the transfer to fit in `MAX_PARTS` parts, rounded up to the next MB.
+
+        Args:
+            size: `int`. the size of the transfer.
+            chunksize: `int`. the minimum size of the parts.
+        """
+        part_size = max(chunksize or cls.MIN_PART_SIZE, -(-size // cls.MAX_PARTS))
+        part_size = -(-part_size // (1024 * 1024)) * 1024 * 1024
+        return min(part_size, cls.MAX_PART_SIZE)
+
+    def get_transfer_config(self, size=None, transfer_config=None):
+        """
+        Returns the `TransferConfig` of a managed upload or download.
+
+        Args:
+            size: `int`. the size of the transfer, if known the part size is adapted to it.
+            transfer_config: `dict`. options overriding the options of the store,
+                `multipart_threshold`, `multipart_chunksize`, `max_concurrency` and `use_threads`.
+
+        Returns:
+            TransferConfig
+        """
+        options = dict(self._transfer_options)
+        for option, value in (transfer_config or {}).items():
+            if option not in self.TRANSFER_OPTIONS:
+                raise DblueStoresException('Received an unrecognised transfer option `{}`.'.format(option))
+            options[option] = value
+
+        if size is not None:
+            options['multipart_chunksize'] = self.get_part_size(size, options.get('multipart_chunksize'))
+
+        return TransferConfig(**options)
+
     @staticmethod
     def parse_s3_url(s3_url):
         """
@@ -185,31 +248,19 @@ class S3Store(BaseStore):
         """
         return self.resource.Bucket(bucket_name)
 
-    def ls(self, path):
-        (bucket_name, key) = self.parse_s3_url(path)
-        results = self.list(bucket_name=bucket_name, prefix=key)
-        return {'files': results['keys'], 'dirs': results['prefixes']}
+    def ls(self, path, compact=False):
+        results = {'files': CompactListing() if compact else [], 'dirs': []}
+        for page in self.iter_ls(path, compact=compact):
+            results['files'].extend(page['files'])
+            results['dirs'].extend(page['dirs'])
+        return results
 
-    def list(self,
-             bucket_name,
-             prefix='',
-             delimiter='/',
-             page_size=None,
-             max_items=None,
-             keys=True,
-             prefixes=True):
-        """
-        Lists prefixes and contents in a bucket under prefix.
+    def iter_ls(self, path, compact=False):
+        (bucket_name, key) = self.parse_s3_url(path)
+        for page in self.iter_list(bucket_name=bucket_name, prefix=key, compact=compact):
+            yield {'files': page['keys'], 'dirs': page['prefixes']}
 
-        Args:
-            bucket_name: `str`. the name of the bucket
-            prefix: `str`. a key prefix
-            delimiter: `str`. the delimiter marks key hierarchy.
-            page_size: `str`. pagination size
-            max_items: `int`. maximum items to return
-            keys: `bool`. if it should include keys
-            prefixes: `boll`. if it should include prefixes
-        """
+    def _paginate(self, bucket_name, prefix, delimiter, page_size=None, max_items=None):
         config = {
             'PageSize': page_size,
             'MaxItems': max_items,
@@ -222,20 +273,63 @@ class S3Store(BaseStore):
         else:
             paginator = self.client.get_paginator('list_objects_v2')
 
+        return paginator.paginate(Bucket=bucket_name,
+                                  Prefix=prefix,
+                                  Delimiter=delimiter,
+                                  PaginationConfig=config)
+
+    def iter_list(self,
+                  bucket_name,
+                  prefix='',
+                  delimiter='/',
+                  page_size=None,
+                  max_items=None,
+                  keys=True,
+                  prefixes=True,
+                  recursive=False,
+                  compact=False):
+        """
+        Lists prefixes and contents in a bucket under prefix, one page at a time.
+
+        Args:
+            bucket_name: `str`. the name of the bucket
+            prefix: `str`. a key prefix
+            delimiter: `str`. the delimiter marks key hierarchy.
+            page_size: `str`. pagination size
+            max_items: `int`. maximum items to return
+            keys: `bool`. if it should include keys
+            prefixes: `boll`. if it should include prefixes
+            recursive: `bool`. if it should list the whole subtree under the prefix,
+                the delimiter is ignored and keys are returned relative to the prefix, no prefixes are returned.
+            compact: `bool`. if it should return the keys in a `CompactListing` instead of a list of tuples.
+
+        Returns:
+            generator of dicts with the `keys` and `prefixes` of every page.
+        """
+        if recursive:
+            prefix = self.check_prefix_format(prefix=prefix, delimiter='/')
+            delimiter = ''
+
         prefix = self.check_prefix_format(prefix=prefix, delimiter=delimiter)
-        response = paginator.paginate(Bucket=bucket_name,
-                                      Prefix=prefix,
-                                      Delimiter=delimiter,
-                                      PaginationConfig=config)
+        response = self._paginate(bucket_name=bucket_name,
+                                  prefix=prefix,
+                                  delimiter=delimiter,
+                                  page_size=page_size,
+                                  max_items=max_items)
 
         def get_keys(contents):
-            list_keys = []
+            list_keys = CompactListing() if compact else []
             for cont in contents:
                 # To solve empty blob issue
                 if prefix == cont['Key']:
                     continue
 
-                list_keys.append((cont['Key'][len(prefix):], cont.get('Size')))
+                if compact:
+                    list_keys.append(cont['Key'][len(prefix):],
+                                     cont.get('Size'),
+                                     to_timestamp(cont.get('LastModified')))
+                else:
+                    list_keys.append((cont['Key'][len(prefix):], cont.get('Size')))
 
             return list_keys
 
@@ -245,15 +339,109 @@ class S3Store(BaseStore):
                 list_prefixes.append(pref['Prefix'][len(prefix): -1])
             return list_prefixes
 
+        for page in self._measure_pages(response, bucket_name, get_retries=get_retries):
+            yield {
+                'keys': get_keys(page.get('Contents', []) if keys else []),
+                'prefixes': get_prefixes(page.get('CommonPrefixes', [])) if prefixes else [],
+            }
+
+    def iter_metadata(self, key, bucket_name=None):
+        """
+        Yields `(name, metadata)` for every key under a prefix.
+
+        The md5 is taken from the ETag, it is unknown for multipart uploads
+        since their ETag is not a digest of the content, the ETag is also the `version` of the key.
+
+        Args:
+            key: `str`. a key prefix, or an s3 url if no bucket name is provided.
+            bucket_name: `str`. the name of the bucket.
+        """
+        if not bucket_name:
+            bucket_name, key = self.parse_s3_url(key)
+
+        prefix = self.check_prefix_format(prefix=key, delimiter='/')
+        pages = self._paginate(bucket_name=bucket_name, prefix=prefix, delimiter='')
+        for page in self._measure_pages(pages, bucket_name, get_retries=get_retries):
+            for cont in page.get('Contents', []):
+                name = cont['Key'][len(prefix):]
+                if not name or name.endswith('/'):
+                    continue
+                yield name, self._get_metadata(size=cont.get('Size'),
+                                               last_modified=cont.get('LastModified'),
+                                               etag=cont.get('ETag'))
+
+    @staticmethod
+    def _get_metadata(size, last_modified, etag):
+        etag = (etag or '').strip('"')
+        return {
+            'size': size,
+            'mtime': to_timestamp(last_modified),
+            'md5': etag if etag and '-' not in etag else None,
+            'version': etag or None,
+        }
+
+    def get_metadata(self, key, bucket_name=None):
+        """
+        Returns the metadata of a key, a dict with its `size`, `mtime`, `md5` and `version`, the ETag.
+
+        Args:
+            key: `str`. the path to the key.
+            bucket_name: `str`. the name of the bucket.
+        """
+        if not bucket_name:
+            bucket_name, key = self.parse_s3_url(key)
+
+        try:
+            with self.measure(metrics.HEAD, bucket_name) as measure:
+                response = self.client.head_object(Bucket=bucket_name, Key=key)
+                measure.retries = get_retries(response)
+        except ClientError as e:
+            raise DblueStoresException(e)
+
+        return self._get_metadata(size=response.get('ContentLength'),
+                                  last_modified=response.get('LastModified'),
+                                  etag=response.get('ETag'))
+
+    def list(self,
+             bucket_name,
+             prefix='',
+             delimiter='/',
+             page_size=None,
+             max_items=None,
+             keys=True,
+             prefixes=True,
+             recursive=False,
+             compact=False):
+        """
+        Lists prefixes and contents in a bucket under prefix.
+
+        Args:
+            bucket_name: `str`. the name of the bucket
+            prefix: `str`. a key prefix
+            delimiter: `str`. the delimiter marks key hierarchy.
+            page_size: `str`. pagination size
+            max_items: `int`. maximum items to return
+            keys: `bool`. if it should include keys
+            prefixes: `boll`. if it should include prefixes
+            recursive: `bool`. if it should list the whole subtree under the prefix,
+                the delimiter is ignored and keys are returned relative to the prefix, no prefixes are returned.
+            compact: `bool`. if it should return the keys in a `CompactListing` instead of a list of tuples.
+        """
         results = {
-            'keys': [],
+            'keys': CompactListing() if compact else [],
             'prefixes': []
         }
-        for page in response:
-            if prefixes:
-                results['prefixes'] += get_prefixes(page.get('CommonPrefixes', []))
-            if keys:
-                results['keys'] += get_keys(page.get('Contents', []))
+        for page in self.iter_list(bucket_name=bucket_name,
+                                   prefix=prefix,
+                                   delimiter=delimiter,
+                                   page_size=page_size,
+                                   max_items=max_items,
+                                   keys=keys,
+                                   prefixes=prefixes,
+                                   recursive=recursive,
+                                   compact=compact):
+            results['keys'].extend(page['keys'])
+            results['prefixes'].extend(page['prefixes'])
 
         return results
 
@@ -309,7 +497,8 @@ class S3Store(BaseStore):
             (bucket_name, key) = self.parse_s3_url(key)
 
         try:
-            self.client.head_object(Bucket=bucket_name, Key=key)
+            with self.measure(metrics.HEAD, bucket_name) as measure:
+                measure.retries = get_retries(self.client.head_object(Bucket=bucket_name, Key=key))
             return True
         except ClientError as e:
             logger.info(e.response["Error"]["Message"])
@@ -328,7 +517,8 @@ class S3Store(BaseStore):
 
         try:
             obj = self.resource.Object(bucket_name, key)
-            obj.load()
+            with self.measure(metrics.HEAD, bucket_name):
+                obj.load()
             return obj
         except Exception as e:
             raise DblueStoresException(e)
@@ -343,7 +533,65 @@ class S3Store(BaseStore):
         """
 
         obj = self.get_key(key, bucket_name)
-        return obj.get()['Body'].read().decode('utf-8')
+        with self.measure(metrics.GET, obj.bucket_name) as measure:
+            data = obj.get()['Body'].read()
+            measure.size = len(data)
+        return data.decode('utf-8')
+
+    def _get_range_fetcher(self, key, bucket_name):
+        """Returns a function fetching byte ranges of the current version of a key, and the size of the key."""
+        try:
+            with self.measure(metrics.HEAD, bucket_name) as measure:
+                response = self.client.head_object(Bucket=bucket_name, Key=key)
+                measure.retries = get_retries(response)
+        except ClientError as e:
+            raise DblueStoresException(e)
+        etag = response.get('ETag')
+
+        def fetch(start, end):
+            try:
+                with self.measure(metrics.GET, bucket_name) as measure:
+                    response = self.client.get_object(Bucket=bucket_name,
+                                                      Key=key,
+                                                      Range='bytes={}-{}'.format(start, end),
+                                                      IfMatch=etag)
+                    data = response['Body'].read()
+                    measure.size = len(data)
+                    measure.retries = get_retries(response)
+                return data
+            except ClientError as e:
+                raise DblueStoresException(e)
+
+        return fetch, response['ContentLength']
+
+    def open(self, key, mode='rb', bucket_name=None, block_size=None, readahead=None, cache_blocks=None):
+        """
+        Opens a key as a seekable file-like object backed by ranged GET requests, see `RangedReader`.
+
+        The reads fail if the key is overwritten after it was opened.
+
+        Args:
+            key: `str`. S3 key that will point to the file.
+            mode: `str`. the mode, only `rb` is supported.
+            bucket_name: `str`. Name of the bucket in which the file is stored.
+            block_size: `int`. the size of the blocks fetched by each request.
+            readahead: `int`. the number of blocks to prefetch on sequential reads.
+            cache_blocks: `int`. the maximum number of blocks kept in memory.
+
+        Returns:
+            RangedReader
+        """
+        check_read_mode(mode)
+        if not bucket_name:
+            bucket_name, key = self.parse_s3_url(key)
+
+        fetch, size = self._get_range_fetcher(key, bucket_name)
+        return RangedReader(fetch,
+                            size=size,
+                            name='s3://{}/{}'.format(bucket_name, key),
+                            block_size=block_size,
+                            readahead=readahead,
+                            cache_blocks=cache_blocks)
 
     def upload_bytes(self,
                      bytes_data,
@@ -351,7 +599,8 @@ class S3Store(BaseStore):
                      bucket_name=None,
                      overwrite=False,
                      encrypt=False,
-                     acl=None):
+                     acl=None,
+                     transfer_config=None):
         """
         Uploads bytes to S3
 
@@ -367,6 +616,7 @@ class S3Store(BaseStore):
             encrypt: `bool`. If True, the file will be encrypted on the server-side
                 by S3 and will be stored in an encrypted form while at rest in S3.
             acl: `str`. ACL to use for uploading, e.g. "public-read".
+            transfer_config: `dict`. transfer options overriding the options of the store.
         """
         if not bucket_name:
             (bucket_name, key) = self.parse_s3_url(key)
@@ -382,7 +632,14 @@ class S3Store(BaseStore):
 
         filelike_buffer = BytesIO(bytes_data)
 
-        self.client.upload_fileobj(filelike_buffer, bucket_name, key, ExtraArgs=extra_args)
+        with self.measure(metrics.PUT, bucket_name) as measure:
+            measure.size = len(bytes_data)
+            self.client.upload_fileobj(filelike_buffer,
+                                       bucket_name,
+                                       key,
+                                       ExtraArgs=extra_args,
+                                       Config=self.get_transfer_config(size=len(bytes_data),
+                                                                       transfer_config=transfer_config))
 
     def upload_string(self,
                       string_data,
@@ -391,7 +648,8 @@ class S3Store(BaseStore):
                       overwrite=False,
                       encrypt=False,
                       acl=None,
-                      encoding='utf-8'):
+                      encoding='utf-8',
+                      transfer_config=None):
         """
         Uploads a string to S3.
 
@@ -408,13 +666,15 @@ class S3Store(BaseStore):
                 by S3 and will be stored in an encrypted form while at rest in S3.
             acl: `str`. ACL to use for uploading, e.g. "public-read".
             encoding: `str`. Encoding to use.
+            transfer_config: `dict`. transfer options overriding the options of the store.
         """
         self.upload_bytes(force_bytes(string_data, encoding=encoding),
                           key=key,
                           bucket_name=bucket_name,
                           overwrite=overwrite,
                           encrypt=encrypt,
-                          acl=acl)
+                          acl=acl,
+                          transfer_config=transfer_config)
 
     def upload_file(self,
                     filename,
@@ -423,7 +683,8 @@ class S3Store(BaseStore):
                     overwrite=False,
                     encrypt=False,
                     acl=None,
-                    use_basename=True):
+                    use_basename=True,
+                    transfer_config=None):
         """
         Uploads a local file to S3.
 
@@ -438,6 +699,7 @@ class S3Store(BaseStore):
                 by S3 and will be stored in an encrypted form while at rest in S3.
             acl: `str`. ACL to use for uploading, e.g. "public-read".
             use_basename: `bool`. whether or not to use the basename of the filename.
+            transfer_config: `dict`. transfer options overriding the options of the store.
         """
         if not bucket_name:
             bucket_name, key = self.parse_s3_url(key)
@@ -454,9 +716,23 @@ class S3Store(BaseStore):
         if acl:
             extra_args['ACL'] = acl
 
-        self.client.upload_file(filename, bucket_name, key, ExtraArgs=extra_args)
+        size = os.path.getsize(filename)
+        with self.measure(metrics.PUT, bucket_name) as measure:
+            measure.size = size
+            self.client.upload_file(filename,
+                                    bucket_name,
+                                    key,
+                                    ExtraArgs=extra_args,
+                                    Config=self.get_transfer_config(size=size, transfer_config=transfer_config))
 
-    def download_file(self, key, local_path, bucket_name=None, use_basename=True):
+    def download_file(self,
+                      key,
+                      local_path,
+                      bucket_name=None,
+                      use_basename=True,
+                      part_size=None,
+                      max_workers=None,
+                      transfer_config=None):
         """
         Download a file from S3.
 
@@ -465,6 +741,11 @@ class S3Store(BaseStore):
             local_path: `str`. the path to download to.
             bucket_name: `str`. Name of the bucket in which to store the file.
             use_basename: `bool`. whether or not to use the basename of the key.
+            part_size: `int`. the size of the ranges of a parallel download.
+            max_workers: `int`. if provided, the key is downloaded by fetching this number
+                of byte ranges concurrently, see `download_ranges`.
+            transfer_config: `dict`. transfer options overriding the options of the store,
+                used if `max_workers` is not provided.
         """
         if not bucket_name:
             bucket_name, key = self.parse_s3_url(key)
@@ -476,8 +757,18 @@ class S3Store(BaseStore):
 
         check_dir_exists(local_path)
 
+        if max_workers:
+            fetch, size = self._get_range_fetcher(key, bucket_name)
+            download_ranges(fetch, size, local_path, part_size=part_size, max_workers=max_workers)
+            return
+
         try:
-            self.client.download_file(bucket_name, key, local_path)
+            with self.measure(metrics.GET, bucket_name) as measure:
+                self.client.download_file(bucket_name,
+                                          key,
+                                          local_path,
+                                          Config=self.get_transfer_config(transfer_config=transfer_config))
+                measure.size = os.path.getsize(local_path)
         except ClientError as e:
             raise DblueStoresException(e)
 
@@ -488,7 +779,10 @@ class S3Store(BaseStore):
                    overwrite=False,
                    encrypt=False,
                    acl=None,
-                   use_basename=True):
+                   use_basename=True,
+                   max_workers=None,
+                   raise_errors=True,
+                   transfer_config=None):
         """
         Uploads a local directory to S3.
 
@@ -496,13 +790,22 @@ class S3Store(BaseStore):
             dirname: `str`. name of the directory to upload.
             key: `str`. S3 key that will point to the file.
             bucket_name: `str`. Name of the bucket in which to store the file.
-            overwrite: `bool`. A flag to decide whether or not to overwrite the key
-                if it already exists. If replace is False and the key exists, an
-                error will be raised.
+            overwrite: `bool`. A flag to decide whether or not to overwrite the keys
+                if they already exist. If overwrite is False and a key exists, the upload of its file fails.
+                The keys of small directories are checked one by one before their upload,
+                from `UPLOAD_DIR_LISTING_MIN_FILES` files they are checked against one listing
+                of the destination made before the uploads.
             encrypt: `bool`. If True, the file will be encrypted on the server-side
                 by S3 and will be stored in an encrypted form while at rest in S3.
             acl: `str`. ACL to use for uploading, e.g. "public-read".
             use_basename: `bool`. whether or not to use the basename of the directory.
+            max_workers: `int`. number of files to upload concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+            transfer_config: `dict`. transfer options of every file, overriding the options of the store.
+
+        Returns:
+            TransferResult
         """
         if not bucket_name:
             bucket_name, key = self.parse_s3_url(key)
@@ -512,18 +815,55 @@ class S3Store(BaseStore):
 
         # Turn the path to absolute paths
         dirname = os.path.abspath(dirname)
-        with walk(dirname) as files:
-            for f in files:
+
+        entries = iter_files(dirname)
+        # Check existing keys of large directories against one listing of the target prefix
+        # instead of one HEAD request per file, the keys of small directories are checked by their upload
+        existing_keys = None
+        if not overwrite:
+            first_entries = list(islice(entries, self.UPLOAD_DIR_LISTING_MIN_FILES))
+            entries = chain(first_entries, entries)
+            if len(first_entries) == self.UPLOAD_DIR_LISTING_MIN_FILES:
+                prefix = self.check_prefix_format(prefix=key, delimiter='/')
+                results = self.list(bucket_name=bucket_name, prefix=key, recursive=True, prefixes=False,
+                                    compact=True)
+                existing_keys = set(prefix + name for name in results['keys'].names)
+
+        def key_exists(file_key):
+            raise DblueStoresException("The key {} already exists.".format(file_key))
+
+        def get_tasks(entries):
+            for entry in entries:
+                f = entry.path
                 file_key = os.path.join(key, os.path.relpath(f, dirname))
-                self.upload_file(filename=f,
+                if existing_keys is not None and file_key in existing_keys:
+                    yield f, partial(key_exists, file_key)
+                    continue
+                yield f, partial(self.upload_file,
+                                 filename=f,
                                  key=file_key,
                                  bucket_name=bucket_name,
-                                 overwrite=overwrite,
+                                 overwrite=overwrite or existing_keys is not None,
                                  encrypt=encrypt,
                                  acl=acl,
-                                 use_basename=False)
+                                 use_basename=False,
+                                 transfer_config=transfer_config)
+
+        # The files are uploaded while the directory is traversed
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks(entries))
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
 
-    def download_dir(self, key, local_path, bucket_name=None, use_basename=True):
+    def download_dir(self,
+                     key,
+                     local_path,
+                     bucket_name=None,
+                     use_basename=True,
+                     max_workers=None,
+                     raise_errors=True,
+                     transfer_config=None):
         """
         Download a directory from S3.
 
@@ -532,6 +872,13 @@ class S3Store(BaseStore):
             local_path: `str`. the path to download to.
             bucket_name: `str`. Name of the bucket in which to store the file.
             use_basename: `bool`. whether or not to use the basename of the key.
+            max_workers: `int`. number of files to download concurrently.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+            transfer_config: `dict`. transfer options of every file, overriding the options of the store.
+
+        Returns:
+            TransferResult
         """
         if not bucket_name:
             bucket_name, key = self.parse_s3_url(key)
@@ -546,54 +893,121 @@ class S3Store(BaseStore):
         except DblueStoresException:
             os.makedirs(local_path)
 
-        results = self.list(bucket_name=bucket_name, prefix=key, delimiter='/')
-
-        # Create directories
-        for prefix in sorted(results['prefixes']):
-            direname = os.path.join(local_path, prefix)
-            prefix = os.path.join(key, prefix)
-            # Download files under
-            self.download_dir(key=prefix,
-                              local_path=direname,
-                              bucket_name=bucket_name,
-                              use_basename=False)
-
-        # Download files
-        for file_key in results['keys']:
-            file_key = file_key[0]
-            filename = os.path.join(local_path, file_key)
-            file_key = os.path.join(key, file_key)
-            self.download_file(key=file_key,
-                               local_path=filename,
-                               bucket_name=bucket_name,
-                               use_basename=False)
-
-    def delete(self, key, bucket_name=None):
+        results = self.list(bucket_name=bucket_name, prefix=key, recursive=True, prefixes=False)
+
+        def get_tasks():
+            for file_key, _ in results['keys']:
+                filename = os.path.join(local_path, file_key)
+                # Keys ending with a delimiter are empty directory markers
+                dirname = filename if file_key.endswith('/') else os.path.dirname(filename)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                if file_key.endswith('/'):
+                    continue
+
+                file_key = os.path.join(key, file_key)
+                yield file_key, partial(self.download_file,
+                                        key=file_key,
+                                        local_path=filename,
+                                        bucket_name=bucket_name,
+                                        use_basename=False,
+                                        transfer_config=transfer_config)
+
+        result = TransferExecutor(max_workers=max_workers).run(get_tasks())
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+    def delete(self, key, bucket_name=None, max_workers=None):
+        """
+        Deletes a key, or all the keys under a prefix.
+
+        Args:
+            key: `str`. S3 key or prefix to delete.
+            bucket_name: `str`. Name of the bucket in which the key is stored.
+            max_workers: `int`. number of delete batches to send concurrently.
+        """
         if not bucket_name:
             (bucket_name, key) = self.parse_s3_url(key)
 
-        results = self.list(bucket_name=bucket_name, prefix=key, delimiter='/')
+        results = self.list(bucket_name=bucket_name, prefix=key, recursive=True, prefixes=False)
 
-        if not any([results['prefixes'], results['keys']]):
+        if not results['keys']:
             self.delete_file(key=key, bucket_name=bucket_name)
+            return
 
-        # Delete directories
-        for prefix in sorted(results['prefixes']):
-            prefix = os.path.join(key, prefix)
-            # Download files under
-            self.delete(key=prefix, bucket_name=bucket_name)
+        keys = (os.path.join(key, file_key) for file_key, _ in results['keys'])
+        errors = self.delete_many(keys=keys, bucket_name=bucket_name, max_workers=max_workers)
+        if errors:
+            raise DblueStoresException('Failed to delete {} keys, e.g. {}: {}'.format(
+                len(errors), errors[0]['Key'], errors[0]['Message']))
 
-        # Delete files
-        for file_key in results['keys']:
-            file_key = file_key[0]
-            file_key = os.path.join(key, file_key)
-            self.delete_file(key=file_key, bucket_name=bucket_name)
+    def delete_many(self, keys, bucket_name=None, max_workers=None):
+        """
+        Deletes keys in batches of `DELETE_BATCH_SIZE` keys using `DeleteObjects` requests.
+
+        Args:
+            keys: `iterable`. S3 keys to delete, or S3 urls if no bucket name is provided.
+            bucket_name: `str`. Name of the bucket in which the keys are stored.
+            max_workers: `int`. number of batches to send concurrently.
+
+        Returns:
+            list of per-key errors, dicts with the `Key`, `Code` and `Message` of the failed deletes.
+        """
+        errors = []
+
+        def delete_batch(batch_bucket_name, batch):
+            try:
+                with self.measure(metrics.DELETE, batch_bucket_name) as measure:
+                    response = self.client.delete_objects(
+                        Bucket=batch_bucket_name,
+                        Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True})
+                    measure.retries = get_retries(response)
+            except ClientError as e:
+                error = e.response.get('Error', {})
+                errors.extend({'Key': k, 'Code': error.get('Code'), 'Message': error.get('Message')}
+                              for k in batch)
+                return
+            except Exception as e:  # pylint:disable=broad-except
+                # e.g. connection errors and timeouts, none of the keys of the batch is known to be deleted
+                errors.extend({'Key': k, 'Code': type(e).__name__, 'Message': str(e)} for k in batch)
+                return
+            errors.extend({'Key': e.get('Key'), 'Code': e.get('Code'), 'Message': e.get('Message')}
+                          for e in response.get('Errors', []))
+
+        def get_tasks():
+            batches = {}
+            for k in keys:
+                batch_bucket_name = bucket_name
+                if not batch_bucket_name:
+                    batch_bucket_name, k = self.parse_s3_url(k)
+                batch = batches.setdefault(batch_bucket_name, [])
+                batch.append(k)
+                if len(batch) == self.DELETE_BATCH_SIZE:
+                    yield batch[0], partial(delete_batch, batch_bucket_name, batches.pop(batch_bucket_name))
+
+            for batch_bucket_name, batch in batches.items():
+                yield batch[0], partial(delete_batch, batch_bucket_name, batch)
+
+        TransferExecutor(max_workers=max_workers).run(get_tasks())
+        return errors
+
+    def _sync_upload(self, filename, path):
+        self.upload_file(filename, path, overwrite=True, use_basename=False)
+
+    def _sync_delete(self, paths):
+        errors = self.delete_many(paths)
+        if errors:
+            raise DblueStoresException('Failed to delete {} keys, e.g. {}: {}'.format(
+                len(errors), errors[0]['Key'], errors[0]['Message']))
 
     def delete_file(self, key, bucket_name=None):
         if not bucket_name:
             (bucket_name, key) = self.parse_s3_url(key)
         try:
             obj = self.resource.Object(bucket_name, key)
-            obj.delete()
+            with self.measure(metrics.DELETE, bucket_name):
+                obj.delete()
         except ClientError as e:
             raise DblueStoresException(e)
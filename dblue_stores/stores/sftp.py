@@ -1,32 +1,70 @@
 import errno
 import os
+import queue
+import shutil
+import threading
 
+from contextlib import contextmanager
+from functools import partial
 from stat import S_ISDIR
 
-from ..clients.sftp import SFTPClient
+from .. import metrics, settings
+from ..clients.sftp import SFTPClient, sftp_pool
 from ..exceptions import DblueStoresException
-from ..utils import walk
+from ..listing import CompactListing
+from ..transfer import TransferExecutor, TransferResult
+from ..utils import iter_files
 from .base import BaseStore
 
 # pylint:disable=arguments-differ
 
+# Size of the reads and writes of a transfer, split by paramiko into pipelined 32KB requests
+TRANSFER_BUFFER_SIZE = 1024 * 1024
+
 
 class SFTPStore(BaseStore):
     """
     SFTP Store
+
+    File transfers run on a pool of SFTP channels, opened on demand over one or more SSH connections,
+    so that the files of `upload_dir` and `download_dir` are transferred concurrently,
+    and every transfer pipelines its read or write requests instead of waiting for each reply.
+
+    The SSH connections are shared by the stores of the same host, port and user, see `SFTPConnectionPool`,
+    closed channels and lost connections are reopened transparently.
+
+    Args:
+        client: `paramiko.SFTPClient`. an existing client, channels are then opened over its connection.
+        host: `str`. SFTP host
+        port: `int`. SFTP port
+        username: `str`.  SFTP username
+        password: `str`.  SFTP password
+        channels: `int`. the maximum number of channels, defaults to `settings.SFTP_CHANNELS`.
+        transports: `int`. the number of SSH connections the channels are spread over,
+            defaults to `settings.SFTP_TRANSPORTS`.
     """
     STORE_TYPE = BaseStore.SFTP_STORE
 
     def __init__(self, client=None, **kwargs):
         self._client = client
+        self._client_provided = client is not None
         self._host = kwargs.get('host')
         self._port = kwargs.get('port')
         self._username = kwargs.get('username')
         self._password = kwargs.get('password')
+        self._max_channels = kwargs.get('channels') or settings.SFTP_CHANNELS
+        # The connection of a provided client cannot be replicated
+        self._max_transports = 1 if client else kwargs.get('transports') or settings.SFTP_TRANSPORTS
+        self._channels_lock = threading.Lock()
+        self._channels_semaphore = threading.BoundedSemaphore(self._max_channels)
+        self._idle_channels = queue.LifoQueue()
+        self._channels = []
+        self._transports = []
 
     @property
     def client(self):
-        if self._client is None:
+        # Reconnect transparently if the connection of the client was lost
+        if self._client is None or (not self._client_provided and self._client.get_channel().closed):
             self.set_client(
                 host=self._host,
                 port=self._port,
@@ -59,17 +97,106 @@ class SFTPStore(BaseStore):
 
     def close(self):
         """Close client connection"""
+        with self._channels_lock:
+            channels, self._channels = self._channels, []
+            transports, self._transports = self._transports, []
+            self._idle_channels = queue.LifoQueue()
+
+        for channel in channels:
+            channel.close()
+        # Pooled connections are kept open for the other stores
+        for transport in transports:
+            if not self._client_provided and not sftp_pool.is_pooled(transport):
+                transport.close()
+
         if self._client:
             self._client.close()
 
-    def ls(self, path="/"):
-        return self.list(path=path)
+    def _get_transport(self, index):
+        if index < len(self._transports) and self._transports[index].is_active():
+            return self._transports[index]
+
+        if self._client_provided:
+            transport = self._client.get_channel().get_transport()
+        else:
+            transport = SFTPClient.get_transport(
+                host=self._host,
+                port=self._port,
+                username=self._username,
+                password=self._password,
+                index=index
+            )
+
+        if index < len(self._transports):
+            self._transports[index] = transport
+        else:
+            self._transports.append(transport)
+        return transport
+
+    def _open_channel(self):
+        with self._channels_lock:
+            # Spread the channels over the transports
+            transport = self._get_transport(len(self._channels) % self._max_transports)
+            channel = SFTPClient.open_channel(transport)
+            self._channels.append(channel)
+            return channel
+
+    def _discard_channel(self, channel):
+        with self._channels_lock:
+            if channel in self._channels:
+                self._channels.remove(channel)
+        try:
+            channel.close()
+        except Exception:  # pylint:disable=broad-except
+            pass
 
-    def list(self, path="/"):
+    @contextmanager
+    def channel(self):
+        """
+        Borrows an SFTP channel for a transfer, at most `channels` transfers run at the same time,
+        channels are reused and closed channels are replaced.
+        """
+        with self._channels_semaphore:
+            try:
+                channel = self._idle_channels.get_nowait()
+            except queue.Empty:
+                channel = self._open_channel()
+
+            try:
+                yield channel
+            finally:
+                if channel.get_channel().closed:
+                    self._discard_channel(channel)
+                else:
+                    self._idle_channels.put(channel)
+
+    def ls(self, path="/", compact=False):
+        return self.list(path=path, compact=compact)
+
+    def iter_ls(self, path="/", compact=False):
+        return self.iter_list(path=path, compact=compact)
+
+    def iter_list(self, path="/", page_size=1000, compact=False):
+        """
+        Lists the directories and files under a remote path, one page at a time.
+
+        Args:
+            path: `str`. the remote directory to list.
+            page_size: `int`. maximum number of entries per page.
+            compact: `bool`. if it should return the files in a `CompactListing` of names, sizes
+                and modification times instead of a list of dicts.
+
+        Returns:
+            generator of dicts with the `dirs` and `files` of every page.
+        """
         dirs = []
-        files = []
+        files = CompactListing() if compact else []
+
+        for info in self.client.listdir_iter(path):
+            if compact and not S_ISDIR(info.st_mode):
+                files.append(info.filename, info.st_size, info.st_mtime)
+                continue
 
-        for info in self.client.listdir_attr(path):
             item = {
                 "name": info.filename,
                 "path": os.path.join(path, info.filename),
@@ -83,47 +210,212 @@ class SFTPStore(BaseStore):
             else:
                 files.append(item)
 
+            if len(dirs) + len(files) >= page_size:
+                yield {
+                    'dirs': dirs,
+                    'files': files,
+                }
+                dirs = []
+                files = CompactListing() if compact else []
+
+        if dirs or files:
+            yield {
+                'dirs': dirs,
+                'files': files,
+            }
+
+    def list(self, path="/", compact=False):
+        dirs = []
+        files = CompactListing() if compact else []
+
+        for page in self.iter_list(path=path, compact=compact):
+            dirs.extend(page['dirs'])
+            files.extend(page['files'])
+
         return {
             'dirs': dirs,
             'files': files,
         }
 
-    def delete(self, path):
-        try:
-            if S_ISDIR(self.client.lstat(path).st_mode):
-                self.client.rmdir(path)
+    def iter_metadata(self, path):
+        """
+        Yields `(name, metadata)` for every file under a remote directory, the md5 is not known,
+        the `version` is derived from the size and modification time.
+
+        Args:
+            path: `str`. the remote directory.
+        """
+        if not self.exists(path):
+            return
+
+        with self.measure(metrics.LIST, self._host):
+            infos = self.client.listdir_attr(path)
+
+        for info in infos:
+            if S_ISDIR(info.st_mode):
+                for name, metadata in self.iter_metadata(os.path.join(path, info.filename)):
+                    yield '{}/{}'.format(info.filename, name), metadata
             else:
+                yield info.filename, self._get_metadata(info)
+
+    @staticmethod
+    def _get_metadata(info):
+        return {
+            'size': info.st_size,
+            'mtime': info.st_mtime,
+            'md5': None,
+            'version': '{}-{}'.format(info.st_size, info.st_mtime),
+        }
+
+    def get_metadata(self, path):
+        """Returns the metadata of a remote file, the `version` is derived from its size and modification time."""
+        try:
+            with self.measure(metrics.HEAD, self._host):
+                info = self.client.stat(path)
+            return self._get_metadata(info)
+        except IOError as e:
+            raise DblueStoresException(e)
+
+    def _sync_upload(self, filename, path):
+        self.makedirs(os.path.dirname(path))
+        self.upload_file(filename, path)
+
+    def _sync_download(self, path, filename):
+        self.download_file(path, filename)
+
+    def _sync_delete(self, paths):
+        for path in paths:
+            with self.measure(metrics.DELETE, self._host):
                 self.client.remove(path)
+
+    def sync(self, src, dst, delete=False, dry_run=False, upload=None, max_workers=None, raise_errors=True):
+        """
+        Incrementally syncs a local directory and a remote directory, see `BaseStore.sync`.
+
+        Remote paths are plain paths, so the direction cannot be inferred and `upload` must be provided.
+        """
+        if upload is None:
+            raise DblueStoresException('The direction of an SFTP sync must be provided with `upload`.')
+        return super(SFTPStore, self).sync(src, dst,
+                                           delete=delete,
+                                           dry_run=dry_run,
+                                           upload=upload,
+                                           max_workers=max_workers,
+                                           raise_errors=raise_errors)
+
+    def delete(self, path):
+        try:
+            with self.measure(metrics.DELETE, self._host):
+                if S_ISDIR(self.client.lstat(path).st_mode):
+                    self.client.rmdir(path)
+                else:
+                    self.client.remove(path)
         except OSError:
             raise DblueStoresException("Failed to delete {}" % path)
 
     def download_file(self, remote_path, local_path):
-        self.client.get(remote_path, local_path)
+        """
+        Downloads a remote file, the reads are prefetched so that many requests are in flight.
+
+        Args:
+            remote_path: `str`. the remote file to download.
+            local_path: `str`. the local path to download to.
+        """
+        with self.channel() as channel, self.measure(metrics.GET, self._host) as measure:
+            with channel.open(remote_path, 'rb') as remote_file:
+                size = remote_file.stat().st_size
+                remote_file.prefetch(size)
+                with open(local_path, 'wb') as local_file:
+                    shutil.copyfileobj(remote_file, local_file, TRANSFER_BUFFER_SIZE)
+                    received = local_file.tell()
+            measure.size = received
+
+        if received != size:
+            raise DblueStoresException('Size mismatch downloading {}: {} != {}'.format(remote_path, received, size))
 
     def upload_file(self, local_path, remote_path):
-        self.client.put(local_path, remote_path)
+        """
+        Uploads a local file, the writes are pipelined, i.e. sent without waiting for each acknowledgment.
 
-    def upload_dir(self, local_dir, remote_dir):
+        Args:
+            local_path: `str`. the local file to upload.
+            remote_path: `str`. the remote path to upload to.
+        """
+        with self.channel() as channel, self.measure(metrics.PUT, self._host) as measure:
+            with open(local_path, 'rb') as local_file:
+                with channel.open(remote_path, 'wb') as remote_file:
+                    remote_file.set_pipelined(True)
+                    shutil.copyfileobj(local_file, remote_file, TRANSFER_BUFFER_SIZE)
+                    sent = local_file.tell()
+            measure.size = sent
+
+            size = channel.stat(remote_path).st_size
+
+        if sent != size:
+            raise DblueStoresException('Size mismatch uploading {}: {} != {}'.format(local_path, sent, size))
+
+    def upload_dir(self, local_dir, remote_dir, max_workers=None, raise_errors=True):
+        """
+        Uploads a local directory to the SFTP server.
 
+        Args:
+            local_dir: `str`. the directory to upload.
+            remote_dir: `str`. the remote directory to upload to.
+            max_workers: `int`. number of files to upload concurrently, defaults to the number of channels.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            TransferResult
+        """
         if not os.path.exists(local_dir):
-            return
+            return TransferResult()
 
         if not self.exists(remote_dir):
             self.client.mkdir(remote_dir)
 
-        with walk(local_dir) as files:
-            for f in files:
-                remote_path = os.path.join(remote_dir, f)
+        local_dir = os.path.abspath(local_dir)
+        # The remote directories already created or found, so that every directory is checked only once
+        known_dirs = {remote_dir.rstrip('/') or '/'}
 
-                if not self.exists(os.path.dirname(remote_path)):
-                    self.client.mkdir(os.path.dirname(remote_path))
+        def get_tasks(entries):
+            for entry in entries:
+                f = entry.path
+                remote_path = os.path.join(remote_dir, os.path.relpath(f, local_dir))
+                self.makedirs(os.path.dirname(remote_path), known_dirs=known_dirs)
+                yield f, partial(self.upload_file, f, remote_path)
 
-                self.upload_file(f, remote_path)
+        # The files are uploaded while the directory is traversed
+        executor = TransferExecutor(max_workers=max_workers or self._max_channels)
+        result = executor.run(get_tasks(iter_files(local_dir)))
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
+
+    def makedirs(self, path, known_dirs=None):
+        """
+        Creates a remote directory and all its missing parents.
+
+        Args:
+            path: `str`. the remote directory.
+            known_dirs: `set`. remote directories known to exist, they are not checked again,
+                and the directories checked or created are added to it.
+        """
+        path = path.rstrip('/') or path
+        if not path or (known_dirs is not None and path in known_dirs):
+            return
+        if not self.exists(path):
+            self.makedirs(os.path.dirname(path), known_dirs=known_dirs)
+            self.client.mkdir(path)
+        if known_dirs is not None:
+            known_dirs.add(path)
 
     def exists(self, path):
 
         try:
-            self.client.stat(path)
+            with self.measure(metrics.HEAD, self._host):
+                self.client.stat(path)
         except IOError as e:
             if e.errno == errno.ENOENT:
                 return False
@@ -131,19 +423,43 @@ class SFTPStore(BaseStore):
         else:
             return True
 
-    def download_dir(self, remote_dir, local_dir):
-        if not self.exists(remote_dir):
-            return
-
+    def _get_download_tasks(self, remote_dir, local_dir):
         if not os.path.exists(local_dir):
             os.mkdir(local_dir)
 
-        for info in self.client.listdir_attr(remote_dir):
+        with self.measure(metrics.LIST, self._host):
+            infos = self.client.listdir_attr(remote_dir)
+
+        for info in infos:
             remote_path = os.path.join(remote_dir, info.filename)
             local_path = os.path.join(local_dir, info.filename)
 
             if S_ISDIR(info.st_mode):
-                self.download_dir(remote_path, local_path)
-            else:
-                if not os.path.isfile(os.path.join(local_dir, info.filename)):
-                    self.client.get(remote_path, local_path)
+                for task in self._get_download_tasks(remote_path, local_path):
+                    yield task
+            elif not os.path.isfile(local_path):
+                yield remote_path, partial(self.download_file, remote_path, local_path)
+
+    def download_dir(self, remote_dir, local_dir, max_workers=None, raise_errors=True):
+        """
+        Downloads a remote directory from the SFTP server, existing local files are skipped.
+
+        Args:
+            remote_dir: `str`. the remote directory to download.
+            local_dir: `str`. the local directory to download to.
+            max_workers: `int`. number of files to download concurrently, defaults to the number of channels.
+            raise_errors: `bool`. whether or not to raise once all the files were processed
+                if some of them failed.
+
+        Returns:
+            TransferResult
+        """
+        if not self.exists(remote_dir):
+            return TransferResult()
+
+        tasks = self._get_download_tasks(remote_dir, local_dir)
+        result = TransferExecutor(max_workers=max_workers or self._max_channels).run(tasks)
+
+        if raise_errors:
+            result.raise_for_errors()
+        return result
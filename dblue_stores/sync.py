@@ -0,0 +1,133 @@
+import os
+
+from .utils import FileEntry, get_file_md5, iter_files
+
+# Metadata of a synced entry:
+#   * size: `int`. the size in bytes.
+#   * mtime: `float`. the modification time as a posix timestamp, or None if unknown.
+#   * md5: `str`. the hex md5 digest of the content, or None if unknown.
+#   * version: `str`. an identifier of the content of the entry, e.g. an ETag or a generation, or None if unknown.
+#   * path: `str`. the local path of the file, only set for local files.
+
+
+def get_local_metadata(dirname):
+    """
+    Scans a local directory.
+
+    Args:
+        dirname: `str`. the directory to scan.
+
+    Returns:
+        dict mapping the paths relative to the directory to their metadata,
+        md5 digests are computed lazily when comparing entries.
+    """
+    entries = {}
+    if not os.path.isdir(dirname):
+        return entries
+
+    for entry in iter_files(dirname):
+        name = os.path.relpath(entry.path, dirname).replace(os.sep, '/')
+        entries[name] = _get_metadata(entry)
+    return entries
+
+
+def get_local_file_metadata(filename):
+    """Returns the metadata of a local file, the `version` is derived from its size and modification time."""
+    stat = os.stat(filename)
+    return _get_metadata(FileEntry(filename, stat.st_size, stat.st_mtime, stat.st_mtime_ns))
+
+
+def _get_metadata(entry):
+    return {
+        'size': entry.size,
+        'mtime': entry.mtime,
+        'md5': None,
+        'version': '{}-{}'.format(entry.size, entry.mtime_ns),
+        'path': entry.path,
+    }
+
+
+def _get_md5(metadata):
+    if metadata.get('md5') is None and metadata.get('path'):
+        metadata['md5'] = get_file_md5(metadata['path'])
+    return metadata.get('md5')
+
+
+def is_changed(source, destination):
+    """
+    Checks if a source entry needs to be transferred to replace the destination entry.
+
+    Entries of different sizes are always changed, for entries of the same size the md5 digests
+    are compared if they are known on the remote side, otherwise the source is changed
+    if it was modified after the destination.
+
+    Args:
+        source: `dict`. the metadata of the source entry.
+        destination: `dict`. the metadata of the destination entry, or None if it does not exist.
+    """
+    if destination is None:
+        return True
+
+    if source['size'] != destination['size']:
+        return True
+
+    # Local files are only hashed if the remote side has a digest to compare to
+    if source.get('md5') is not None or destination.get('md5') is not None:
+        source_md5 = _get_md5(source)
+        destination_md5 = _get_md5(destination)
+        if source_md5 is not None and destination_md5 is not None:
+            return source_md5 != destination_md5
+
+    if source.get('mtime') is not None and destination.get('mtime') is not None:
+        return source['mtime'] > destination['mtime']
+
+    return False
+
+
+class SyncPlan(object):
+    """
+    The operations needed to make a destination directory mirror a source directory.
+
+    Attributes:
+        transfers: `list`. names, relative to the synced directories, of the files to transfer.
+        deletes: `list`. names of the destination files to delete.
+        unchanged: `list`. names of the files that are already up to date.
+        result: `TransferResult`. the outcome of the transfers once the plan was executed.
+    """
+
+    def __init__(self, source, destination, upload):
+        self.source = source
+        self.destination = destination
+        self.upload = upload
+        self.transfers = []
+        self.deletes = []
+        self.unchanged = []
+        self.result = None
+
+    def __repr__(self):
+        return '<SyncPlan {} -> {} transfers={} deletes={} unchanged={}>'.format(
+            self.source, self.destination, len(self.transfers), len(self.deletes), len(self.unchanged))
+
+    @classmethod
+    def compute(cls, source, destination, source_entries, destination_entries, upload, delete=False):
+        """
+        Computes the plan by comparing the source and destination entries.
+
+        Args:
+            source: `str`. the source directory.
+            destination: `str`. the destination directory.
+            source_entries: `dict`. the metadata of the source files by relative name.
+            destination_entries: `dict`. the metadata of the destination files by relative name.
+            upload: `bool`. whether the source is the local directory.
+            delete: `bool`. whether or not to delete the destination files missing in the source.
+        """
+        plan = cls(source=source, destination=destination, upload=upload)
+        for name in sorted(source_entries):
+            if is_changed(source_entries[name], destination_entries.get(name)):
+                plan.transfers.append(name)
+            else:
+                plan.unchanged.append(name)
+
+        if delete:
+            plan.deletes = sorted(set(destination_entries) - set(source_entries))
+        return plan
@@ -0,0 +1,292 @@
+import io
+import mmap
+import os
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from . import settings
+from .exceptions import DblueStoresException
+from .logger import logger
+
+
+class TransferResult(object):
+    """
+    Per-file outcome of a batch of transfers.
+
+    Attributes:
+        transferred: `list`. names of the items that were transferred successfully.
+        errors: `dict`. mapping of the names of the failed items to their exception.
+    """
+
+    def __init__(self):
+        self.transferred = []
+        self.errors = {}
+
+    def __len__(self):
+        return len(self.transferred) + len(self.errors)
+
+    def __repr__(self):
+        return '<TransferResult transferred={} errors={}>'.format(len(self.transferred), len(self.errors))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def add_success(self, name):
+        self.transferred.append(name)
+
+    def add_error(self, name, error):
+        self.errors[name] = error
+
+    def update(self, other):
+        self.transferred += other.transferred
+        self.errors.update(other.errors)
+
+    def raise_for_errors(self):
+        """Raises a `DblueStoresException` summarizing the failed items, if any."""
+        if self.ok:
+            return
+
+        names = sorted(self.errors)
+        summary = ', '.join('{}: {}'.format(name, self.errors[name]) for name in names[:5])
+        if len(names) > 5:
+            summary += ', ...'
+        raise DblueStoresException(
+            '{} of {} transfers failed ({})'.format(len(self.errors), len(self), summary))
+
+
+class TransferExecutor(object):
+    """
+    Runs file transfers concurrently on a pool of threads.
+
+    Tasks are consumed lazily from the iterable passed to `run`, with at most
+    `2 * max_workers` of them in flight at any time, so that very large directories
+    do not need to be materialized before the first transfer starts.
+
+    Every task is run to completion, a failing task never aborts the others,
+    the outcome of each one is collected in a `TransferResult`.
+
+    Args:
+        max_workers: `int`. the number of transfers to run concurrently,
+            defaults to `settings.TRANSFER_MAX_WORKERS`.
+    """
+
+    def __init__(self, max_workers=None):
+        max_workers = max_workers or settings.TRANSFER_MAX_WORKERS
+        if max_workers < 1:
+            raise DblueStoresException('`max_workers` must be a positive integer, received `{}`.'.format(
+                max_workers))
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _run_task(result, name, fn):
+        try:
+            fn()
+        except Exception as e:
+            logger.debug('Transfer of %s failed: %s', name, e)
+            result.add_error(name, e)
+        else:
+            result.add_success(name)
+
+    def run(self, tasks):
+        """
+        Runs the tasks and collects their results.
+
+        Args:
+            tasks: `iterable`. `(name, callable)` pairs, the callable performs
+                the transfer of the item identified by name.
+
+        Returns:
+            TransferResult
+        """
+        result = TransferResult()
+
+        if self.max_workers == 1:
+            for name, fn in tasks:
+                self._run_task(result, name, fn)
+            return result
+
+        max_pending = 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            for name, fn in tasks:
+                if len(pending) >= max_pending:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(executor.submit(self._run_task, result, name, fn))
+            wait(pending)
+
+        return result
+
+
+_pwrite_lock = threading.Lock()
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        return os.pwrite(fd, data, offset)
+    with _pwrite_lock:  # Windows
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, data)
+
+
+def _preallocate(fd, size):
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:  # Not supported by the filesystem
+            pass
+    os.ftruncate(fd, size)
+
+
+def download_ranges(fetch, size, filename, part_size=None, max_workers=None):
+    """
+    Downloads an object by fetching byte ranges concurrently and writing them in place with `pwrite`.
+
+    The file is preallocated, then every part is written at its offset as soon as it is received,
+    so that the parts do not need to be reassembled and only `max_workers` parts are in memory at a time.
+    The file is removed if a part fails.
+
+    Args:
+        fetch: `callable`. `fetch(start, end)` returns the bytes of the object from start to end, inclusive.
+        size: `int`. the size of the object.
+        filename: `str`. the file to download to.
+        part_size: `int`. the size of the ranges, defaults to `settings.DOWNLOAD_PART_SIZE`.
+        max_workers: `int`. the number of ranges to fetch concurrently,
+            defaults to `settings.TRANSFER_MAX_WORKERS`.
+    """
+    part_size = part_size or settings.DOWNLOAD_PART_SIZE
+    max_workers = max_workers or settings.TRANSFER_MAX_WORKERS
+    if part_size < 1 or max_workers < 1:
+        raise DblueStoresException('`part_size` and `max_workers` must be positive integers.')
+
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+    def download_part(start, end):
+        data = memoryview(fetch(start, end))
+        if len(data) != end - start + 1:
+            raise DblueStoresException('Received {} bytes instead of {} downloading {} from {}.'.format(
+                len(data), end - start + 1, filename, start))
+        while data:
+            written = _pwrite(fd, data, start)
+            data = data[written:]
+            start += written
+
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        _preallocate(fd, size)
+        if max_workers == 1 or len(ranges) < 2:
+            for start, end in ranges:
+                download_part(start, end)
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(ranges))) as executor:
+                futures = [executor.submit(download_part, start, end) for start, end in ranges]
+                done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in pending:
+                    future.cancel()
+                for future in done:
+                    future.result()
+    except BaseException:
+        os.close(fd)
+        os.remove(filename)
+        raise
+    os.close(fd)
+
+
+class BufferReader(io.RawIOBase):
+    """
+    A seekable, read-only, file-like object over a buffer, e.g. a part of a memory-mapped file,
+    for the clients that only send bytes or streams, the buffer is read in chunks without being copied.
+
+    Args:
+        buffer: a bytes-like object.
+    """
+
+    def __init__(self, buffer):
+        super(BufferReader, self).__init__()
+        self._buffer = memoryview(buffer)
+        self._position = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        size = max(0, min(len(b), len(self._buffer) - self._position))
+        b[:size] = self._buffer[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._buffer)
+        if offset < 0:
+            raise ValueError('Negative seek position {}'.format(offset))
+        self._position = offset
+        return offset
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._buffer.release()
+        super(BufferReader, self).close()
+
+
+def upload_ranges(put, filename, part_size, max_workers=None):
+    """
+    Uploads a file by sending its parts concurrently, e.g. as the blocks of an Azure block blob.
+
+    The file is memory-mapped, and every part is a `memoryview` of the mapping,
+    so that the parts are not copied and are read from the page cache only when they are sent,
+    without sharing a file position between the threads.
+    The views are released once their part was uploaded, `put` must not keep them.
+    Pending parts are cancelled if a part fails.
+
+    Args:
+        put: `callable`. `put(index, data)` uploads the part at index, `data` is a `memoryview`.
+        filename: `str`. the file to upload.
+        part_size: `int`. the size of the parts.
+        max_workers: `int`. the number of parts to upload concurrently,
+            defaults to `settings.TRANSFER_MAX_WORKERS`.
+
+    Returns:
+        int, the number of parts.
+    """
+    max_workers = max_workers or settings.TRANSFER_MAX_WORKERS
+    if part_size < 1 or max_workers < 1:
+        raise DblueStoresException('`part_size` and `max_workers` must be positive integers.')
+
+    size = os.path.getsize(filename)
+    if not size:
+        put(0, memoryview(b''))
+        return 1
+
+    count = (size + part_size - 1) // part_size
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+        def upload_part(index):
+            with memoryview(data) as view, view[index * part_size:(index + 1) * part_size] as part:
+                put(index, part)
+
+        if max_workers == 1 or count < 2:
+            for index in range(count):
+                upload_part(index)
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, count)) as executor:
+                futures = [executor.submit(upload_part, index) for index in range(count)]
+                done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in pending:
+                    future.cancel()
+                for future in done:
+                    future.result()
+    return count
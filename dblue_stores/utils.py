@@ -1,12 +1,33 @@
+import base64
+import binascii
 import datetime
+import errno
+import hashlib
 import os
+import shutil
 
+from collections import namedtuple
 from contextlib import contextmanager
 from decimal import Decimal
 
 from .exceptions import DblueStoresException
 from .logger import logger
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl request cloning a file on copy-on-write filesystems, e.g. btrfs or xfs, see `ioctl_ficlone(2)`
+FICLONE = 0x40049409
+
+# Errors meaning that a kernel copy method is not supported for these files, and that the next one should be tried
+_COPY_FALLBACK_ERRORS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP,
+                         errno.EBADF, errno.ETXTBSY, errno.EPERM}
+
+# Maximum number of bytes copied by one kernel call
+_COPY_CHUNK_SIZE = 1024 * 1024 * 1024
+
 
 def is_protected_type(obj):
     """
@@ -34,6 +55,45 @@ def force_bytes(value, encoding='utf-8', strings_only=False, errors='strict'):
     return value.encode(encoding, errors)
 
 
+def to_timestamp(value):
+    """
+    Converts a datetime to a posix timestamp, returns None if the value is None.
+    """
+    if value is None:
+        return None
+    return value.timestamp()
+
+
+def get_file_md5(filename, chunk_size=1024 * 1024):
+    """
+    Computes the hex md5 digest of a file, reading it by chunks.
+
+    Args:
+        filename: `str`. the file to hash.
+        chunk_size: `int`. the size of the chunks to read.
+
+    Returns:
+         str
+    """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def b64_to_hex(value):
+    """
+    Converts a base64 encoded digest, as returned by GCS and Azure, to hex, returns None if the value is empty.
+    """
+    if not value:
+        return None
+    try:
+        return binascii.hexlify(base64.b64decode(value)).decode('ascii')
+    except (TypeError, ValueError):
+        return None
+
+
 def append_basename(path, filename):
     """
     Adds the basename of the filename to the path.
@@ -55,26 +115,158 @@ def check_dir_exists(path, is_dir=False):
         raise DblueStoresException('The parent path is not a directory {}'.format(path))
 
 
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime', 'mtime_ns'])
+
+
+def iter_files(path, onerror=None):
+    """
+    Lazily walks the files under a path with `os.scandir`, yielding them as soon as their directory is read.
+
+    Like `os.walk`, symlinks to directories are not followed and unreadable directories are skipped,
+    unless `onerror` is provided.
+
+    Args:
+        path: `str`. The path to traverse for collecting files.
+        onerror: `callable`. called with the `OSError` of a directory or a file that could not be read.
+
+    Returns:
+         generator of `FileEntry(path, size, mtime, mtime_ns)`.
+    """
+    stack = [path]
+    while stack:
+        dirname = stack.pop()
+        try:
+            scanner = os.scandir(dirname)
+        except OSError as e:
+            logger.debug("Unable to read %s: %s", dirname, e)
+            if onerror is not None:
+                onerror(e)
+            continue
+
+        dirs = []
+        with scanner:
+            for entry in scanner:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            dirs.append(entry.path)
+                        continue
+                    stat = entry.stat()
+                except OSError as e:
+                    if onerror is not None:
+                        onerror(e)
+                    continue
+                yield FileEntry(entry.path, stat.st_size, stat.st_mtime, stat.st_mtime_ns)
+
+        # Depth first, in the order of the directory entries
+        stack.extend(reversed(dirs))
+
+
 @contextmanager
 def walk(path):
     """
     Gets all the files under a certain path.
 
+    Prefer `iter_files` to start processing the files before the whole tree is traversed.
+
     Args:
         path: `str`. The path to traverse for collecting files.
 
     Returns:
          list of files collected under the path.
     """
-    result_files = []
-
-    for root, dirs, files in os.walk(path):
-        logger.debug("Root:%s, Dirs:%s", root, dirs)
-
-        for file_name in files:
-            result_files.append(os.path.join(root, file_name))
+    result_files = [entry.path for entry in iter_files(path)]
 
     try:
         yield result_files
     except StopIteration:
         yield []
+
+
+def _reflink(src_fd, dst_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except (OSError, IOError):
+        return False
+    return True
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _kernel_copy(copy, src_fd, dst_fd, size):
+    """
+    Copies the file with a kernel copy function, returns False if it is not supported for these files.
+    """
+    offset = 0
+    while offset < size:
+        try:
+            copied = copy(src_fd, dst_fd, offset, min(size - offset, _COPY_CHUNK_SIZE))
+        except OSError as e:
+            if offset == 0 and e.errno in _COPY_FALLBACK_ERRORS:
+                return False
+            raise
+        if not copied:  # The file was truncated while copying
+            break
+        offset += copied
+    return True
+
+
+def copy_file(src, dst, hardlink=False):
+    """
+    Copies a file without going through user space buffers when possible.
+
+    The methods are tried in order:
+        * a hardlink if `hardlink` is True, the files then share their content and metadata.
+        * a reflink, on copy-on-write filesystems, the files share their blocks until modified.
+        * `copy_file_range`, an in-kernel copy which can also be offloaded to the storage.
+        * `sendfile`, an in-kernel copy.
+        * a buffered copy.
+
+    Hardlinks and reflinks require both files to be on the same filesystem, the next method is used otherwise.
+    The permissions and modification time of the file are copied as well.
+
+    Args:
+        src: `str`. the file to copy.
+        dst: `str`. the destination file, replaced if it exists.
+        hardlink: `bool`. whether or not to hardlink the file when possible.
+
+    Returns:
+         str, the method used: `hardlink`, `reflink`, `copy_file_range`, `sendfile` or `copy`.
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError('{} and {} are the same file'.format(src, dst))
+
+    if hardlink:
+        try:
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError as e:
+            logger.debug('Could not hardlink %s to %s: %s', src, dst, e)
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        method = 'copy'
+        if _reflink(fsrc.fileno(), fdst.fileno()):
+            method = 'reflink'
+        elif hasattr(os, 'copy_file_range') and _kernel_copy(
+                _copy_file_range, fsrc.fileno(), fdst.fileno(), size):
+            method = 'copy_file_range'
+        elif hasattr(os, 'sendfile') and _kernel_copy(_sendfile, fsrc.fileno(), fdst.fileno(), size):
+            method = 'sendfile'
+        else:
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst)
+
+    shutil.copystat(src, dst)
+    return method
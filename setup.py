@@ -35,7 +35,7 @@ setup(name='dblue_stores',
       url='https://github.com/dblueai/dblue-stores',
       license='MIT',
       platforms='any',
-      packages=find_packages(),
+      packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
       keywords=[
           'dblue',
           'aws',
@@ -70,6 +70,9 @@ setup(name='dblue_stores',
           "sftp": [
               "paramiko==2.6.0"
           ],
+          "numpy": [
+              "numpy",
+          ],
       },
       classifiers=[
           'Programming Language :: Python',
@@ -0,0 +1,93 @@
+import socket
+import threading
+import time
+
+from unittest import TestCase
+
+from benchmarks.proxy import LatencyProxy
+from benchmarks.run import parse_size
+from benchmarks.suite import BENCHMARKS, BenchmarkConfig, compare, run
+from dblue_stores.stores.faults import Constant
+
+
+class EchoServer(object):
+    def __init__(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(1)
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        conn, _ = self.socket.accept()
+        with conn:
+            while True:
+                data = conn.recv(1024)
+                if not data:
+                    return
+                conn.sendall(data)
+
+
+class TestLatencyProxy(TestCase):
+    def test_proxy(self):
+        server = EchoServer()
+        with LatencyProxy(server.socket.getsockname(), latency=0.1) as proxy:
+            sock = socket.create_connection(proxy.address)
+            start = time.monotonic()
+            sock.sendall(b'ping')
+            data = b''
+            while len(data) < 4:
+                data += sock.recv(1024)
+            duration = time.monotonic() - start
+            sock.close()
+
+        assert data == b'ping'
+        assert 0.1 <= duration < 1
+
+
+class TestSuite(TestCase):
+    def test_run(self):
+        config = BenchmarkConfig(small_files=5, small_size=100, large_files=2, large_size=1024, repeat=2)
+        results = run(['local', 'sftp'], config)
+
+        assert results['config'] == config.to_dict()
+        assert list(results['results']) == ['local', 'sftp']
+        for backend in ['local', 'sftp']:
+            benchmarks = results['results'][backend]
+            assert list(benchmarks) == list(BENCHMARKS)
+            assert len(benchmarks['upload_dir_small']['runs']) == 2
+            assert benchmarks['upload_dir_small']['files'] == 5
+            assert benchmarks['upload_dir_small']['bytes'] == 500
+            assert benchmarks['list_recursive']['files'] == 8
+
+        # The requests of the stores are recorded
+        assert results['results']['sftp']['upload_dir_small']['requests']['put']['count'] == 5
+        assert results['results']['local']['upload_dir_small']['requests']['put']['count'] == 5
+
+    def test_run_with_faults(self):
+        config = BenchmarkConfig(small_files=2, small_size=10, large_files=1, large_size=10, repeat=1,
+                                 faults={'latency': Constant(0.01), 'bandwidth': 1e6})
+        results = run(['local'], config)
+
+        assert results['config']['faults'] == {'bandwidth': 1e6, 'latency': 'Constant(0.01)'}
+        assert results['results']['local']['upload_file']['median'] >= 0.01
+
+    def test_run_skips_unavailable_backends(self):
+        config = BenchmarkConfig(small_files=1, small_size=1, large_files=1, large_size=1, repeat=1)
+        results = run(['sftp'], config, endpoints={'sftp': 'sftp://host'})
+        assert 'skipped' in results['results']['sftp']
+
+    def test_compare(self):
+        baseline = {'results': {'s3': {'ls': {'median': 1.0}, 'delete': {'median': 2.0}},
+                                'gcs': {'skipped': 'unavailable'}}}
+        results = {'results': {'s3': {'ls': {'median': 1.5}, 'delete': {'median': 2.1}},
+                               'gcs': {'ls': {'median': 1.0}}}}
+        rows = compare(baseline, results, threshold=0.1)
+        assert [(row[0], row[1], row[-1]) for row in rows] == [('s3', 'ls', True), ('s3', 'delete', False)]
+
+    def test_parse_size(self):
+        assert parse_size('100') == 100
+        assert parse_size('4K') == 4096
+        assert parse_size('32MB') == 32 * 1024 ** 2
+        assert parse_size('1.5g') == int(1.5 * 1024 ** 3)
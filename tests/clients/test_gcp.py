@@ -41,6 +41,11 @@ class TestGCClient(TestCase):
         assert service_account.call_count == 2
         assert credentials is None
 
+        keyfile_dict = {'private_key': 'line1\\nline2'}
+        GCPClient.get_credentials(keyfile_dict=keyfile_dict)
+        assert service_account.call_args[0][0] == {'private_key': 'line1\nline2'}
+        assert keyfile_dict == {'private_key': 'line1\\nline2'}
+
     @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
     @mock.patch(GCS_MODULE.format('Client'))
     def test_get_client(self, client, gc_credentials):
@@ -0,0 +1,102 @@
+import threading
+
+from unittest import TestCase
+
+import mock
+from moto import mock_s3
+
+from dblue_stores.clients.aws import AWSClient
+from dblue_stores.clients.azure import AzureClient
+from dblue_stores.clients.gcp import GCPClient
+from dblue_stores.clients.pool import ClientPool, client_pool, make_key
+
+
+class TestClientPool(TestCase):
+    def test_make_key(self):
+        assert make_key('foo', None, 1) == ('foo', None, 1)
+        assert make_key({'b': 1, 'a': 2}) == make_key({'a': 2, 'b': 1})
+        assert make_key(['a', 'b']) == make_key(['a', 'b']) == (('a', 'b'),)
+        assert make_key(('a', ['b', {'c': 1}])) == (('a', ('b', '{"c": 1}')),)
+        assert make_key({'b', 'a'}) == make_key(['a', 'b'])
+        assert hash(make_key(['a'], {'a': [1]}, {'a'}))
+        with self.assertRaises(TypeError):
+            make_key(bytearray(b'foo'))
+
+    def test_get(self):
+        pool = ClientPool()
+        factory = mock.MagicMock(side_effect=lambda: object())
+
+        client = pool.get(('foo',), factory)
+        assert pool.get(('foo',), factory) is client
+        assert pool.get(('bar',), factory) is not client
+        assert factory.call_count == 2
+        assert pool.stats == {'hits': 1, 'misses': 2, 'size': 2}
+
+        with mock.patch('dblue_stores.settings.CLIENT_POOL_ENABLED', False):
+            assert pool.get(('foo',), factory) is not client
+
+    def test_get_concurrent(self):
+        pool = ClientPool()
+        clients = []
+
+        def get():
+            clients.append(pool.get(('foo',), object))
+
+        threads = [threading.Thread(target=get) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(id(client) for client in clients)) == 1
+
+    def test_evict_and_clear(self):
+        pool = ClientPool()
+        client = mock.MagicMock()
+        pool.get(('foo',), lambda: client)
+
+        assert pool.evict(client) is True
+        client.close.assert_called_once_with()
+        assert ('foo',) not in pool
+        assert pool.evict(client) is False
+
+        pool.get(('foo',), lambda: client)
+        pool.get(('bar',), lambda: client)
+        pool.clear()
+        assert len(pool) == 0
+        assert client.close.call_count == 2
+
+    @mock_s3
+    def test_aws_clients(self):
+        client = AWSClient.get_client('s3', access_key='p1', secret_key='p2', region_name='us-east-1')
+        assert AWSClient.get_client('s3', access_key='p1', secret_key='p2', region_name='us-east-1') is client
+        assert AWSClient.get_client('s3', access_key='p3', secret_key='p2', region_name='us-east-1') is not client
+        assert AWSClient.get_client('s3', access_key='p1', secret_key='p2', region_name='us-east-1',
+                                    endpoint_url='http://localhost:9000') is not client
+
+        client_pool.evict(client)
+        assert AWSClient.get_client('s3', access_key='p1', secret_key='p2', region_name='us-east-1') is not client
+
+    def test_azure_clients(self):
+        service = AzureClient.get_client(account_name='pool', account_key='bar')
+        assert AzureClient.get_client(account_name='pool', account_key='bar') is service
+        assert AzureClient.get_client(account_name='pool', account_key='baz') is not service
+
+    @mock.patch('dblue_stores.clients.gcp.GCPClient.get_credentials')
+    @mock.patch('dblue_stores.clients.gcp.Client')
+    def test_gcp_clients(self, client, gc_credentials):
+        client.side_effect = lambda **kwargs: object()
+        scopes = ['https://www.googleapis.com/auth/devstorage.read_write']
+        gcs_client = GCPClient.get_client(project_id='pool', scopes=scopes)
+        assert GCPClient.get_client(project_id='pool', scopes=list(scopes)) is gcs_client
+        assert GCPClient.get_client(project_id='pool', scopes=scopes + ['foo']) is not gcs_client
+        assert client.call_count == 2
+
+    @mock.patch('dblue_stores.clients.gcp.Credentials.from_service_account_info')
+    @mock.patch('dblue_stores.clients.gcp.Client')
+    def test_gcp_clients_with_keyfile_dict(self, client, service_account):
+        client.side_effect = lambda **kwargs: object()
+        keyfile_dict = {'private_key': 'line1\\nline2'}
+        gcs_client = GCPClient.get_client(project_id='pool', keyfile_dict=keyfile_dict)
+        assert GCPClient.get_client(project_id='pool', keyfile_dict=keyfile_dict) is gcs_client
+        assert client.call_count == 1
@@ -0,0 +1,98 @@
+import threading
+
+from unittest import TestCase
+
+import mock
+
+from dblue_stores.clients.sftp import SFTPClient, SFTPConnectionPool, sftp_pool
+
+
+class TestSFTPConnectionPool(TestCase):
+    def connect(self):
+        transport = mock.MagicMock()
+        transport.is_active.return_value = True
+        transport.is_authenticated.return_value = True
+        return transport
+
+    def test_get(self):
+        pool = SFTPConnectionPool()
+        connect = mock.MagicMock(side_effect=self.connect)
+
+        transport = pool.get(('foo',), connect)
+        assert pool.get(('foo',), connect) is transport
+        assert pool.get(('bar',), connect) is not transport
+        assert connect.call_count == 2
+        assert pool.is_pooled(transport)
+        assert pool.stats == {'hits': 1, 'connects': 2, 'reconnects': 0, 'size': 2}
+
+        with mock.patch('dblue_stores.settings.CLIENT_POOL_ENABLED', False):
+            other_transport = pool.get(('foo',), connect)
+            assert other_transport is not transport
+            assert not pool.is_pooled(other_transport)
+
+    def test_get_index(self):
+        pool = SFTPConnectionPool()
+        with mock.patch('dblue_stores.settings.SFTP_POOL_SIZE', 2):
+            first = pool.get(('foo',), self.connect, index=0)
+            # Connections are added one at a time
+            second = pool.get(('foo',), self.connect, index=5)
+            assert second is not first
+            assert pool.get(('foo',), self.connect, index=1) is second
+            assert pool.get(('foo',), self.connect, index=2) is first
+            assert pool.get(('foo',), self.connect, index=3) is second
+        assert len(pool) == 2
+
+    def test_reconnect(self):
+        pool = SFTPConnectionPool()
+        transport = pool.get(('foo',), self.connect)
+        transport.is_active.return_value = False
+
+        new_transport = pool.get(('foo',), self.connect)
+        assert new_transport is not transport
+        transport.close.assert_called_once_with()
+        assert not pool.is_pooled(transport)
+        assert pool.is_pooled(new_transport)
+        assert pool.reconnects == 1
+        assert len(pool) == 1
+
+    def test_get_concurrent(self):
+        pool = SFTPConnectionPool()
+        connect = mock.MagicMock(side_effect=self.connect)
+        transports = []
+
+        def get():
+            transports.append(pool.get(('foo',), connect))
+
+        threads = [threading.Thread(target=get) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert connect.call_count == 1
+        assert len(set(id(transport) for transport in transports)) == 1
+
+    def test_clear(self):
+        pool = SFTPConnectionPool()
+        transport = pool.get(('foo',), self.connect)
+        pool.clear()
+        transport.close.assert_called_once_with()
+        assert len(pool) == 0
+
+
+class TestSFTPClient(TestCase):
+    def tearDown(self):
+        sftp_pool.clear()
+
+    @mock.patch('dblue_stores.clients.sftp.paramiko.Transport')
+    def test_get_transport(self, transport_class):
+        transport_class.side_effect = lambda sock: mock.MagicMock()
+
+        transport = SFTPClient.get_transport(host='host', port=22, username='user', password='password')
+        transport.connect.assert_called_once_with(None, 'user', 'password')
+        transport.set_keepalive.assert_called_once_with(30)
+
+        assert SFTPClient.get_transport(host='host', port=22, username='user', password='password') is transport
+        assert SFTPClient.get_transport(host='host', port=22, username='other', password='password') is not transport
+        assert SFTPClient.get_transport(host='host', port=2222, username='user', password='password') is not transport
+        assert transport_class.call_count == 3
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from dblue_stores.stores.async_manager import (
+    AsyncStore,
+    AsyncStoreManager,
+    get_executor,
+    iterate_in_executor
+)
+from dblue_stores.stores.local import LocalStore
+
+
+class TestAsyncStoreManager(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        for i in range(5):
+            with open('{}/test{}.txt'.format(self.dirname, i), 'w') as f:
+                f.write('data{}'.format(i))
+
+    def test_shared_executor(self):
+        assert get_executor() is get_executor()
+        assert AsyncStoreManager().executor is get_executor()
+        assert LocalStore().as_async().executor is get_executor()
+
+    def test_iterate_in_executor(self):
+        threads = []
+
+        def pages():
+            for i in range(3):
+                threads.append(threading.current_thread())
+                yield i
+
+        async def collect():
+            return [page async for page in iterate_in_executor(get_executor(), pages())]
+
+        assert asyncio.run(collect()) == [0, 1, 2]
+        assert threading.main_thread() not in threads
+
+    def test_manager(self):
+        manager = AsyncStoreManager(store=LocalStore())
+        dirname = tempfile.mkdtemp()
+
+        async def run():
+            await asyncio.gather(*[
+                manager.upload_file('{}/test{}.txt'.format(self.dirname, i), dirname)
+                for i in range(5)
+            ])
+            results = await manager.ls(dirname)
+            pages = [page async for page in manager.iter_ls(dirname)]
+            await manager.download_file(dirname + '/test0.txt', dirname + '/foo.txt')
+            await manager.delete(dirname + '/test1.txt')
+            return results, pages
+
+        results, pages = asyncio.run(run())
+        assert results['files'] == [('test{}.txt'.format(i), 5) for i in range(5)]
+        assert len(pages) == 1
+        assert sorted(os.listdir(dirname)) == ['foo.txt', 'test0.txt', 'test2.txt', 'test3.txt', 'test4.txt']
+
+    def test_concurrency(self):
+        class SlowStore(LocalStore):
+            def list(self, path, compact=False):
+                time.sleep(0.1)
+                return super(SlowStore, self).list(path, compact=compact)
+
+        store = AsyncStore(SlowStore(), executor=ThreadPoolExecutor(max_workers=20))
+
+        async def run():
+            return await asyncio.gather(*[store.list(self.dirname) for _ in range(20)])
+
+        start = time.time()
+        results = asyncio.run(run())
+        assert len(results) == 20
+        assert time.time() - start < 1
@@ -1,8 +1,11 @@
+import os
+
 from unittest import TestCase
 
 import mock
 import tempfile
 from azure.storage.blob import Blob, BlobPrefix, BlobProperties
+from azure.storage.common.models import ListGenerator, _list
 
 from dblue_stores.exceptions import DblueStoresException
 from dblue_stores.stores.azure import AzureStore
@@ -81,6 +84,54 @@ class TestAzureStore(TestCase):
         assert results['blobs'][0][0] == 'file'
         assert results['blobs'][0][1] == 42
 
+    @mock.patch(AZURE_MODULE.format('BlockBlobService'))
+    def test_iter_list(self, client):
+        base_path = '/path/'
+        dir_prefix = BlobPrefix()
+        dir_prefix.name = base_path + 'dir'
+
+        blob_props = BlobProperties()
+        blob_props.content_length = 42
+        blob = Blob(base_path + 'file', props=blob_props)
+
+        client.return_value.list_blobs.side_effect = [MockBlobList([dir_prefix], next_marker='marker'),
+                                                      MockBlobList([blob])]
+
+        store = AzureStore()
+        pages = store.iter_list(key=self.wasbs_base + base_path)
+        assert next(pages) == {'blobs': [], 'prefixes': ['dir']}
+        assert next(pages) == {'blobs': [('file', 42)], 'prefixes': []}
+        with self.assertRaises(StopIteration):
+            next(pages)
+        client.return_value.list_blobs.assert_called_with('container',
+                                                          prefix=base_path,
+                                                          delimiter='/',
+                                                          marker='marker')
+
+    @mock.patch(AZURE_MODULE.format('BlockBlobService'))
+    def test_iter_list_one_segment_per_page(self, client):
+        base_path = '/path/'
+        # The generators of the client follow the next markers by themselves
+        fetch_next_segment = mock.MagicMock()
+
+        def list_blobs(container_name, prefix=None, delimiter=None, marker=None):
+            index = int(marker) if marker else 0
+            blob_props = BlobProperties()
+            blob_props.content_length = index
+            segment = _list([Blob(base_path + 'file{}'.format(index), props=blob_props)])
+            segment.next_marker = str(index + 1) if index < 4 else None
+            return ListGenerator(segment, fetch_next_segment, (), {})
+
+        client.return_value.list_blobs.side_effect = list_blobs
+
+        store = AzureStore()
+        pages = list(store.iter_list(key=self.wasbs_base + base_path))
+        assert pages == [{'blobs': [('file{}'.format(i), i)], 'prefixes': []} for i in range(5)]
+        names = [name for name, _ in store.iter_metadata(key=self.wasbs_base + base_path)]
+        assert names == ['file{}'.format(i) for i in range(5)]
+        assert client.return_value.list_blobs.call_count == 10
+        assert fetch_next_segment.call_count == 0
+
     @mock.patch(AZURE_MODULE.format('BlockBlobService'))
     def test_upload_file(self, client):
         dirname = tempfile.mkdtemp()
@@ -103,6 +154,56 @@ class TestAzureStore(TestCase):
         client.return_value.create_blob_from_path.assert_called_with(
             'container', base_path_file, fpath)
 
+    @mock.patch(AZURE_MODULE.format('BlockBlobService'))
+    def test_upload_file_blocks(self, client):
+        data = os.urandom(1000)
+        fpath = tempfile.mkdtemp() + '/test.txt'
+        with open(fpath, 'wb') as f:
+            f.write(data)
+
+        blocks = {}
+
+        def put_block(container, blob, block, block_id):
+            blocks[block_id] = block.read()
+
+        client.return_value.put_block.side_effect = put_block
+        store = AzureStore(block_size=300, max_single_put_size=500, max_connections=4)
+        store.upload_file(filename=fpath, blob=self.wasbs_base + 'path/test.txt', use_basename=False)
+
+        assert client.return_value.create_blob_from_path.call_count == 0
+        assert sorted(blocks) == ['00000000', '00000001', '00000002', '00000003']
+        assert b''.join(blocks[block_id] for block_id in sorted(blocks)) == data
+        container, blob, block_list = client.return_value.put_block_list.call_args[0]
+        assert (container, blob) == ('container', 'path/test.txt')
+        assert [block.id for block in block_list] == sorted(blocks)
+
+        # Per call options
+        blocks.clear()
+        store.upload_file(filename=fpath, blob=self.wasbs_base + 'path/test.txt', use_basename=False,
+                          block_size=600)
+        assert len(blocks) == 2
+
+        store.upload_file(filename=fpath, blob=self.wasbs_base + 'path/test.txt', use_basename=False,
+                          max_single_put_size=1000)
+        client.return_value.create_blob_from_path.assert_called_once_with('container', 'path/test.txt', fpath)
+
+    def test_get_block_size(self):
+        assert AzureStore.get_block_size(1000, 300) == 300
+        assert AzureStore.get_block_size(50000 * 300 + 1, 300) == 301
+
+    @mock.patch(AZURE_MODULE.format('BlockBlobService'))
+    def test_download_file_max_connections(self, client):
+        fpath = tempfile.mkdtemp() + '/test.txt'
+        client.return_value.get_blob_to_path.side_effect = lambda container, blob, fname, **kwargs: open(fname, 'w')
+        store = AzureStore(max_connections=8)
+        store.download_file(self.wasbs_base + 'path/test.txt', fpath, use_basename=False)
+        client.return_value.get_blob_to_path.assert_called_with(
+            'container', 'path/test.txt', fpath, max_connections=8)
+
+        store.download_file(self.wasbs_base + 'path/test.txt', fpath, use_basename=False, max_connections=2)
+        client.return_value.get_blob_to_path.assert_called_with(
+            'container', 'path/test.txt', fpath, max_connections=2)
+
     @mock.patch(AZURE_MODULE.format('BlockBlobService'))
     def test_download_file(self, client):
         client.return_value.list_blobs.return_value = MockBlobList([])
@@ -158,6 +259,8 @@ class TestAzureStore(TestCase):
         with open(fpath3, 'w') as f:
             f.write('data3')
 
+        # The files are uploaded concurrently, the mocks are created before they are shared by the threads
+        client.return_value.create_blob_from_path.return_value = None
         store = AzureStore()
 
         blob_path = 'path/to/'
@@ -208,25 +311,21 @@ class TestAzureStore(TestCase):
         blob_props.content_length = 42
         obj_mock2 = Blob(blob_path + 'test2.txt', props=blob_props)
 
-        subdir_mock = BlobPrefix()
-        subdir_mock.name = blob_path + rel_path2
-
         blob_props = BlobProperties()
         blob_props.content_length = 42
         obj_mock3 = Blob(blob_path + rel_path2 + '/' + 'test3.txt', props=blob_props)
 
         # Create some files to return
-        def list_side_effect(container_name, prefix, delimiter='/', marker=None):
-            if prefix == blob_path:
-                return MockBlobList([subdir_mock, obj_mock1, obj_mock2])
-            return MockBlobList([obj_mock3])
-
-        client.return_value.list_blobs.side_effect = list_side_effect
+        client.return_value.list_blobs.return_value = MockBlobList([obj_mock1, obj_mock2, obj_mock3])
 
         dirname3 = tempfile.mkdtemp()
 
         # Test without basename
         store.download_dir(blob=azure_url, local_path=dirname3, use_basename=False)
+        client.return_value.list_blobs.assert_called_once_with('container',
+                                                               prefix=blob_path,
+                                                               delimiter=None,
+                                                               marker=None)
         client.return_value.get_blob_to_path.assert_has_calls(
             [
                 mock.call('container',
@@ -265,20 +364,12 @@ class TestAzureStore(TestCase):
         blob_props.content_length = 42
         obj_mock2 = Blob(blob_path + 'foo/test2.txt', props=blob_props)
 
-        subdir_mock = BlobPrefix()
-        subdir_mock.name = blob_path + 'foo/' + rel_path2
-
         blob_props = BlobProperties()
         blob_props.content_length = 42
         obj_mock3 = Blob(blob_path + 'foo/' + rel_path2 + '/' + 'test3.txt', props=blob_props)
 
         # Create some files to return
-        def list_side_effect(container_name, prefix, delimiter='/', marker=None):
-            if prefix == blob_path + 'foo/':
-                return MockBlobList([subdir_mock, obj_mock1, obj_mock2])
-            return MockBlobList([obj_mock3])
-
-        client.return_value.list_blobs.side_effect = list_side_effect
+        client.return_value.list_blobs.return_value = MockBlobList([obj_mock1, obj_mock2, obj_mock3])
 
         dirname3 = tempfile.mkdtemp()
 
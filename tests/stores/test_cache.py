@@ -0,0 +1,100 @@
+import os
+import tempfile
+
+from unittest import TestCase
+
+import mock
+from moto import mock_s3
+
+from dblue_stores.cache import DownloadCache, get_download_cache
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.stores.local import LocalStore
+from dblue_stores.stores.manager import StoreManager
+from dblue_stores.stores.s3 import S3Store
+
+
+class TestDownloadCache(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        for name, data in [('test1.txt', 'data1'), ('test2.txt', 'data22'), ('test3.txt', 'data333')]:
+            with open('{}/{}'.format(self.dirname, name), 'w') as f:
+                f.write(data)
+        self.cache_dir = tempfile.mkdtemp()
+
+    def test_get_download_cache(self):
+        assert get_download_cache(None) is None
+        cache = DownloadCache(cache_dir=self.cache_dir)
+        assert get_download_cache(cache) is cache
+        with self.assertRaises(DblueStoresException):
+            get_download_cache('foo')
+
+    def test_download_file(self):
+        store = LocalStore()
+        cache = DownloadCache(cache_dir=self.cache_dir, max_bytes=100)
+        dirname = tempfile.mkdtemp()
+
+        with mock.patch.object(store, '_sync_download', wraps=store._sync_download) as download:
+            assert cache.download_file(store, self.dirname + '/test1.txt', dirname + '/foo.txt') is False
+            assert cache.download_file(store, self.dirname + '/test1.txt', dirname + '/bar.txt') is True
+            assert download.call_count == 1
+
+        for name in ['foo.txt', 'bar.txt']:
+            with open('{}/{}'.format(dirname, name)) as f:
+                assert f.read() == 'data1'
+        assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 5}
+
+        # A new version of the file is downloaded again
+        with open(self.dirname + '/test1.txt', 'w') as f:
+            f.write('data4')
+        os.utime(self.dirname + '/test1.txt', (1000, 1000))
+        assert cache.download_file(store, self.dirname + '/test1.txt', dirname + '/foo.txt') is False
+        assert cache.stats['entries'] == 2
+
+        # The entries are indexed from the cache directory
+        assert DownloadCache(cache_dir=self.cache_dir, max_bytes=100).stats['bytes'] == 10
+
+    def test_eviction(self):
+        store = LocalStore()
+        cache = DownloadCache(cache_dir=self.cache_dir, max_bytes=12)
+        dirname = tempfile.mkdtemp()
+
+        cache.download_file(store, self.dirname + '/test1.txt', dirname + '/test1.txt')
+        cache.download_file(store, self.dirname + '/test2.txt', dirname + '/test2.txt')
+        # Mark test1.txt as recently used
+        assert cache.download_file(store, self.dirname + '/test1.txt', dirname + '/test1.txt') is True
+        cache.download_file(store, self.dirname + '/test3.txt', dirname + '/test3.txt')
+
+        assert cache.stats['evictions'] == 1
+        assert cache.size == 12
+        assert cache.download_file(store, self.dirname + '/test1.txt', dirname + '/test1.txt') is True
+        assert cache.download_file(store, self.dirname + '/test2.txt', dirname + '/test2.txt') is False
+
+        # Files larger than the cache are not cached
+        cache = DownloadCache(cache_dir=tempfile.mkdtemp(), max_bytes=4)
+        assert cache.download_file(store, self.dirname + '/test1.txt', dirname + '/test1.txt') is False
+        assert cache.stats['entries'] == 0
+
+        cache.clear()
+        assert cache.size == 0
+
+    @mock_s3
+    def test_store_manager(self):
+        store = S3Store()
+        store.client.create_bucket(Bucket='bucket')
+        store.upload_dir(self.dirname, 's3://bucket/data', use_basename=False)
+
+        cache = DownloadCache(cache_dir=self.cache_dir, max_bytes=100)
+        store_manager = StoreManager(store=store, cache=cache)
+        assert store_manager.cache is cache
+
+        dirname = tempfile.mkdtemp()
+        store_manager.download_file('s3://bucket/data/test1.txt', dirname, use_basename=True)
+        with open(dirname + '/test1.txt') as f:
+            assert f.read() == 'data1'
+
+        dirname = tempfile.mkdtemp()
+        result = store_manager.download_dir('s3://bucket/data', dirname, use_basename=True)
+        assert sorted(result.transferred) == ['test1.txt', 'test2.txt', 'test3.txt']
+        assert sorted(os.listdir(dirname + '/data')) == ['test1.txt', 'test2.txt', 'test3.txt']
+        assert cache.stats['hits'] == 1
+        assert cache.stats['misses'] == 3
@@ -0,0 +1,176 @@
+import os
+import random
+import tempfile
+import time
+
+from unittest import TestCase
+
+from moto import mock_s3
+
+from dblue_stores import metrics
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.metrics import InMemorySink
+from dblue_stores.stores.faults import (
+    Constant,
+    FaultInjectionStore,
+    LogNormal,
+    ThrottlingFault,
+    TimeoutFault,
+    Uniform
+)
+from dblue_stores.stores.local import LocalStore
+from dblue_stores.stores.manager import StoreManager
+from dblue_stores.stores.s3 import S3Store
+
+
+class TestFaultInjectionStore(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.src = os.path.join(self.dirname, 'src')
+        os.mkdir(self.src)
+        for i in range(4):
+            with open(os.path.join(self.src, 'file{}'.format(i)), 'wb') as f:
+                f.write(b'x' * 10000)
+
+        self.sink = InMemorySink()
+        sinks = metrics.get_sinks()
+        metrics.set_sinks([self.sink])
+        self.addCleanup(metrics.set_sinks, sinks)
+
+    def test_wrapper(self):
+        local_store = LocalStore()
+        store = FaultInjectionStore(local_store)
+        assert store.store is local_store
+        assert store.STORE_TYPE == LocalStore.STORE_TYPE
+        assert store.is_local_store is True
+        # The methods specific to a store are forwarded
+        store.copy_file(os.path.join(self.src, 'file0'), os.path.join(self.dirname, 'copy'), use_basename=False)
+        assert os.path.exists(os.path.join(self.dirname, 'copy'))
+        assert store.stats == {'requests': 1, 'throttled': 0, 'timeouts': 0}
+
+        with self.assertRaises(DblueStoresException):
+            FaultInjectionStore(local_store)
+        with self.assertRaises(DblueStoresException):
+            FaultInjectionStore(store)
+
+        # Once the wrapper is closed, the store does not inject faults anymore and can be wrapped again
+        store.close()
+        local_store.get_metadata(os.path.join(self.src, 'file0'))
+        assert store.stats == {'requests': 1, 'throttled': 0, 'timeouts': 0}
+        with FaultInjectionStore(local_store, error_rate=1) as store:
+            with self.assertRaises(ThrottlingFault):
+                local_store.get_metadata(os.path.join(self.src, 'file0'))
+        local_store.get_metadata(os.path.join(self.src, 'file0'))
+
+    def test_latency(self):
+        store = FaultInjectionStore(LocalStore(), latency={metrics.PUT: 0.05})
+
+        start = time.monotonic()
+        store.upload_dir(self.src, os.path.join(self.dirname, 'dst'), use_basename=False, max_workers=1)
+        assert time.monotonic() - start >= 0.2
+
+        start = time.monotonic()
+        store.ls(self.src)
+        assert time.monotonic() - start < 0.05
+
+        # The injected latency is measured with the requests
+        stats = self.sink.get_stats()[('local', '', metrics.PUT)]
+        assert stats['count'] == 4
+        assert stats['latency_sum'] >= 0.2
+
+    def test_listing_pages(self):
+        # No request is sent once the last page was listed, no fault is injected at the end of the listing
+        store = FaultInjectionStore(LocalStore(), latency={metrics.LIST: 0.05}, error_rate={metrics.LIST: 1})
+        with self.assertRaises(ThrottlingFault):
+            store.ls(self.src)
+        assert store.stats == {'requests': 1, 'throttled': 1, 'timeouts': 0}
+
+        store.close()
+        store = FaultInjectionStore(LocalStore(), latency={metrics.LIST: 0.05})
+        start = time.monotonic()
+        assert len(store.ls(self.src)['files']) == 4
+        assert time.monotonic() - start < 0.1
+        assert store.stats == {'requests': 1, 'throttled': 0, 'timeouts': 0}
+        stats = self.sink.get_stats()[('local', '', metrics.LIST)]
+        assert stats['count'] == 2
+        assert stats['errors'] == 1
+
+    def test_distributions(self):
+        rng = random.Random(0)
+        assert Constant(0.1).sample(rng) == 0.1
+        assert all(0.1 <= Uniform(0.1, 0.2).sample(rng) <= 0.2 for _ in range(100))
+
+        samples = sorted(LogNormal(0.01, 0.1).sample(rng) for _ in range(10000))
+        assert 0.009 < samples[5000] < 0.011
+        assert 0.08 < samples[9900] < 0.12
+
+        with self.assertRaises(DblueStoresException):
+            LogNormal(0.1, 0.01)
+
+    def test_errors(self):
+        store = FaultInjectionStore(LocalStore(), error_rate={metrics.HEAD: 1})
+        with self.assertRaises(ThrottlingFault) as context:
+            store.get_metadata(os.path.join(self.src, 'file0'))
+        assert context.exception.status == 503
+        assert context.exception.operation == metrics.HEAD
+        assert store.stats == {'requests': 1, 'throttled': 1, 'timeouts': 0}
+        assert self.sink.get_stats()[('local', '', metrics.HEAD)]['errors'] == 1
+
+        # The failures of the directory transfers are collected
+        store = FaultInjectionStore(LocalStore(), error_rate=0.5, seed=1)
+        result = store.upload_dir(self.src, os.path.join(self.dirname, 'dst'),
+                                  use_basename=False,
+                                  raise_errors=False)
+        assert len(result) == 4
+        assert result.errors
+        assert all(isinstance(error, ThrottlingFault) for error in result.errors.values())
+
+    def test_timeouts(self):
+        store = FaultInjectionStore(LocalStore(), timeout_rate=1, timeout=0.05)
+        start = time.monotonic()
+        with self.assertRaises(TimeoutFault):
+            store.get_metadata(os.path.join(self.src, 'file0'))
+        assert time.monotonic() - start >= 0.05
+        assert store.stats == {'requests': 1, 'throttled': 0, 'timeouts': 1}
+
+    def test_seed(self):
+        def get_failures(seed):
+            store = FaultInjectionStore(LocalStore(), error_rate=0.5, latency=Uniform(0, 0.001), seed=seed)
+            failures = []
+            for _ in range(20):
+                try:
+                    store.get_metadata(os.path.join(self.src, 'file0'))
+                    failures.append(False)
+                except ThrottlingFault:
+                    failures.append(True)
+            return failures
+
+        assert get_failures(1) == get_failures(1)
+        assert get_failures(1) != get_failures(2)
+
+    def test_bandwidth(self):
+        # The 4 downloads of 10KB share a bandwidth of 200KB/s
+        store = FaultInjectionStore(LocalStore(), bandwidth=200000)
+        start = time.monotonic()
+        store.download_dir(self.src, os.path.join(self.dirname, 'dst'), use_basename=False, max_workers=4)
+        assert time.monotonic() - start >= 0.2
+        assert len(os.listdir(os.path.join(self.dirname, 'dst'))) == 4
+
+    def test_store_manager(self):
+        store = FaultInjectionStore(LocalStore(), latency=0.01)
+        store_manager = StoreManager(store=store)
+        store_manager.upload_file(os.path.join(self.src, 'file0'), self.dirname)
+        assert os.path.exists(os.path.join(self.dirname, 'file0'))
+        assert store.requests == 1
+
+    @mock_s3
+    def test_s3(self):
+        s3_store = S3Store()
+        s3_store.client.create_bucket(Bucket='bucket')
+        store = FaultInjectionStore(s3_store, error_rate={metrics.GET: 1})
+        store.upload_file(os.path.join(self.src, 'file0'), 's3://bucket/file0', use_basename=False)
+        assert store.get_metadata('s3://bucket/file0')['size'] == 10000
+
+        with self.assertRaises(ThrottlingFault):
+            store.download_file('s3://bucket/file0', os.path.join(self.dirname, 'file0'), use_basename=False)
+        assert self.sink.get_stats()[('s3', 'bucket', metrics.GET)]['errors'] == 1
@@ -1,17 +1,43 @@
 
+import json
 import os
+import requests
 import tempfile
 
 from unittest import TestCase
 
 import mock
 
+from google.api_core import page_iterator
+from google.api_core.exceptions import GoogleAPIError, NotFound
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.storage import Client
+from google.cloud.storage.batch import Batch
+
 from dblue_stores.exceptions import DblueStoresException
 from dblue_stores.stores.gcs import GCSStore
 
 GCS_MODULE = 'dblue_stores.clients.gcp.{}'
 
 
+def make_response(status, body, content_type='application/json'):
+    response = requests.Response()
+    response.status_code = status
+    response.headers['content-type'] = content_type
+    response._content = body.encode('utf-8')
+    return response
+
+
+def make_batch_response(statuses):
+    """A multipart response of a batch request, with one sub-response per status."""
+    parts = []
+    for i, status in enumerate(statuses):
+        body = json.dumps({'name': str(i), 'size': '1'} if status < 300 else {'error': {'code': status}})
+        parts.append('--batch\r\nContent-Type: application/http\r\nContent-ID: <response-{}>\r\n\r\n'
+                     'HTTP/1.1 {} Status\r\nContent-Type: application/json\r\n\r\n{}\r\n'.format(i, status, body))
+    return make_response(200, ''.join(parts) + '--batch--\r\n', 'multipart/mixed; boundary=batch')
+
+
 class TestGCSStore(TestCase):
     def test_parse_gcs_url(self):
         # Correct url
@@ -96,6 +122,28 @@ class TestGCSStore(TestCase):
 
         assert response == {}
 
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_bucket_cache(self, client, _):
+        store = GCSStore()
+        for _ in range(3):
+            assert store.get_bucket('bucket') == client.return_value.get_bucket.return_value
+        store.get_bucket('bucket2')
+        assert client.return_value.get_bucket.call_count == 2
+        assert store.bucket_cache_stats == {'hits': 2, 'misses': 2, 'requests_saved': 2}
+
+        store.clear_bucket_cache()
+        store.get_bucket('bucket')
+        assert client.return_value.get_bucket.call_count == 3
+
+        # Lazy bucket handles
+        store = GCSStore(validate_buckets=False)
+        for _ in range(3):
+            assert store.get_bucket('bucket') == client.return_value.bucket.return_value
+        client.return_value.bucket.assert_called_once_with('bucket')
+        assert client.return_value.get_bucket.call_count == 3
+        assert store.bucket_cache_stats == {'hits': 2, 'misses': 1, 'requests_saved': 3}
+
     @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
     @mock.patch(GCS_MODULE.format('Client'))
     def test_get_blob(self, client, _):
@@ -130,6 +178,134 @@ class TestGCSStore(TestCase):
 
         GCSStore().delete(key=test_object, bucket_name=test_bucket)
 
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_delete_many(self, client, _):
+        bucket = mock.MagicMock()
+        client.return_value.get_bucket.return_value = bucket
+
+        keys = ['dir/{}'.format(i) for i in range(GCSStore.BATCH_SIZE + 1)]
+        assert GCSStore().delete_many(keys, bucket_name='bucket') == {}
+        assert client.return_value.batch.call_count == 2
+        assert bucket.delete_blob.call_count == GCSStore.BATCH_SIZE + 1
+
+        # A failed batch is retried blob by blob
+        client.return_value.batch.reset_mock()
+        bucket.delete_blob.reset_mock()
+        client.return_value.batch.return_value.__exit__.side_effect = NotFound('foo')
+        error = GoogleAPIError('bar')
+        bucket.delete_blob.side_effect = [None, None, NotFound('foo'), error]
+
+        errors = GCSStore().delete_many(['gs://bucket/a', 'gs://bucket/b'])
+        assert errors == {'gs://bucket/b': error}
+        assert bucket.delete_blob.call_count == 4
+
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_delete_dir(self, client, _):
+        obj_mock1 = mock.Mock()
+        obj_mock1.configure_mock(name='path/a', size=1)
+        obj_mock2 = mock.Mock()
+        obj_mock2.configure_mock(name='path/dir/b', size=1)
+
+        bucket = client.return_value.get_bucket.return_value
+        page_mock = mock.MagicMock()
+        page_mock.__iter__.return_value = [obj_mock1, obj_mock2]
+        mock_results = mock.MagicMock()
+        mock_results.configure_mock(pages=[page_mock])
+        bucket.list_blobs.return_value = mock_results
+
+        GCSStore().delete('gs://bucket/path')
+        assert client.return_value.batch.call_count == 1
+        bucket.delete_blob.assert_has_calls([mock.call('path/a'), mock.call('path/dir/b')])
+
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_stat_many(self, client, _):
+        bucket = client.return_value.get_bucket.return_value
+        blob_a = mock.Mock()
+        bucket.blob.side_effect = lambda key: blob_a if key == 'a' else mock.Mock()
+
+        results = GCSStore().stat_many(['a', 'b'], bucket_name='bucket')
+        assert client.return_value.batch.call_count == 1
+        assert blob_a.reload.call_count == 1
+        assert set(results) == {'a', 'b'}
+        assert results['a'] is blob_a
+
+        # A failed batch is looked up blob by blob
+        client.return_value.batch.return_value.__exit__.side_effect = NotFound('foo')
+        bucket.get_blob.side_effect = [blob_a, None]
+        results = GCSStore().stat_many(['gs://bucket/a', 'gs://bucket/b'])
+        assert results == {'gs://bucket/a': blob_a, 'gs://bucket/b': None}
+
+    def test_batches_with_missing_blobs(self):
+        client = Client(project='project', credentials=AnonymousCredentials())
+        store = GCSStore(client=client, validate_buckets=False)
+        batch_statuses = []
+        requests_sent = []
+
+        def make_request(method=None, url=None, *args, **kwargs):
+            # Recent clients fetch the metadata of the buckets in the background
+            if '/o' not in url and '/batch/' not in url:
+                return make_response(200, json.dumps({'name': 'bucket'}))
+            requests_sent.append((method, url.split('?')[0]))
+            if '/batch/' in url:
+                return make_batch_response(batch_statuses.pop(0))
+            return make_response(204, '')
+
+        with mock.patch.object(client._base_connection, '_make_request', side_effect=make_request):
+            # A missing blob does not fail the other requests of its batch
+            batch_statuses.append([200, 404, 200])
+            results = store.stat_many(['a', 'b', 'c'], bucket_name='bucket')
+            assert len(requests_sent) == 1
+            assert results['a'].size == 1
+            assert results['b'] is None
+            assert results['c'].size == 1
+
+            del requests_sent[:]
+            batch_statuses.append([204, 404, 204])
+            assert store.delete_many(['a', 'b', 'c'], bucket_name='bucket') == {}
+            assert len(requests_sent) == 1
+
+            # Only the requests that failed for another reason are sent again
+            del requests_sent[:]
+            batch_statuses.append([204, 503, 404])
+            assert store.delete_many(['a', 'b', 'c'], bucket_name='bucket') == {}
+            assert len(requests_sent) == 2
+            assert requests_sent[1] == ('DELETE', 'https://storage.googleapis.com/storage/v1/b/bucket/o/b')
+
+    def test_batches_without_finish_futures(self):
+        client = Client(project='project', credentials=AnonymousCredentials())
+        store = GCSStore(client=client, validate_buckets=False)
+        requests_sent = []
+
+        def make_request(method=None, url=None, *args, **kwargs):
+            if '/o' not in url and '/batch/' not in url:
+                return make_response(200, json.dumps({'name': 'bucket'}))
+            requests_sent.append((method, url.split('?')[0]))
+            if url.split('?')[0].endswith('/o/b'):
+                response = make_response(404, json.dumps({'error': {'code': 404}}))
+                response.request = requests.Request(method, url).prepare()
+                return response
+            return make_response(200, json.dumps({'name': 'a', 'size': '1'}))
+
+        # The real batch of the installed client, without the private method the responses are read from
+        finish_futures = Batch._finish_futures
+        del Batch._finish_futures
+        try:
+            with mock.patch.object(client._base_connection, '_make_request', side_effect=make_request):
+                results = store.stat_many(['a', 'b'], bucket_name='bucket')
+        finally:
+            Batch._finish_futures = finish_futures
+
+        # No batch request is sent, the blobs are looked up one by one
+        assert [url for _, url in requests_sent] == [
+            'https://storage.googleapis.com/storage/v1/b/bucket/o/a',
+            'https://storage.googleapis.com/storage/v1/b/bucket/o/b',
+        ]
+        assert results['a'].size == 1
+        assert results['b'] is None
+
     @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
     @mock.patch(GCS_MODULE.format('Client'))
     def test_list_empty(self, client, _):
@@ -148,13 +324,13 @@ class TestGCSStore(TestCase):
         file_path = 'fileA'
         obj_mock.configure_mock(name=blob_root_path + file_path, size=1)
 
-        dir_mock = mock.Mock()
+        page_mock = mock.MagicMock()
         dirname = 'model1'
-        dir_mock.configure_mock(prefixes=(blob_root_path + dirname + '/',))
+        page_mock.configure_mock(prefixes=(blob_root_path + dirname + '/',))
+        page_mock.__iter__.return_value = [obj_mock]
 
         mock_results = mock.MagicMock()
-        mock_results.configure_mock(pages=[dir_mock])
-        mock_results.__iter__.return_value = [obj_mock]
+        mock_results.configure_mock(pages=[page_mock])
 
         client.return_value.get_bucket.return_value.list_blobs.return_value = mock_results
 
@@ -179,13 +355,13 @@ class TestGCSStore(TestCase):
         file_path = dirname + '/' + 'tf.pb'
         obj_mock.configure_mock(name=blob_root_path + file_path, size=1)
 
-        subdir_mock = mock.Mock()
+        page_mock = mock.MagicMock()
         subdirname = dirname + '/' + 'files'
-        subdir_mock.configure_mock(prefixes=(blob_root_path + subdirname + '/',))
+        page_mock.configure_mock(prefixes=(blob_root_path + subdirname + '/',))
+        page_mock.__iter__.return_value = [obj_mock]
 
         mock_results = mock.MagicMock()
-        mock_results.configure_mock(pages=[subdir_mock])
-        mock_results.__iter__.return_value = [obj_mock]
+        mock_results.configure_mock(pages=[page_mock])
 
         client.return_value.get_bucket.return_value.list_blobs.return_value = mock_results
 
@@ -200,6 +376,94 @@ class TestGCSStore(TestCase):
         assert blobs[0][1] == obj_mock.size
         assert prefixes[0] == subdirname
 
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_iter_list(self, client, _):
+        blob_root_path = 'project_path/experiment_id/'
+        gcs_url = 'gs://bucket/' + blob_root_path
+
+        obj_mock1 = mock.Mock()
+        obj_mock1.configure_mock(name=blob_root_path + 'fileA', size=1)
+        obj_mock2 = mock.Mock()
+        obj_mock2.configure_mock(name=blob_root_path + 'fileB', size=2)
+
+        page_mock1 = mock.MagicMock()
+        page_mock1.configure_mock(prefixes=(blob_root_path + 'model1/',))
+        page_mock1.__iter__.return_value = [obj_mock1]
+        page_mock2 = mock.MagicMock()
+        page_mock2.configure_mock(prefixes=())
+        page_mock2.__iter__.return_value = [obj_mock2]
+
+        mock_results = mock.MagicMock()
+        mock_results.configure_mock(pages=iter([page_mock1, page_mock2]))
+        client.return_value.get_bucket.return_value.list_blobs.return_value = mock_results
+
+        pages = GCSStore().iter_list(gcs_url)
+        assert next(pages) == {'blobs': [('fileA', 1)], 'prefixes': ['model1']}
+        assert next(pages) == {'blobs': [('fileB', 2)], 'prefixes': []}
+        with self.assertRaises(StopIteration):
+            next(pages)
+
+        # The listing is done only once
+        client.return_value.get_bucket.return_value.list_blobs.assert_called_once_with(
+            prefix=blob_root_path, delimiter='/', fields='items(name,size),prefixes,nextPageToken')
+
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_list_page_size_and_fields(self, client, _):
+        list_blobs = client.return_value.get_bucket.return_value.list_blobs
+        list_blobs.return_value = mock.MagicMock(pages=[])
+        store = GCSStore()
+
+        store.list('gs://bucket/path', compact=True, page_size=100)
+        list_blobs.assert_called_with(prefix='path/', delimiter='/', page_size=100,
+                                      fields='items(name,size,updated),prefixes,nextPageToken')
+
+        store.list('gs://bucket/path', blobs=False)
+        list_blobs.assert_called_with(prefix='path/', delimiter='/', fields='prefixes,nextPageToken')
+
+        # The page token is always requested
+        store.list('gs://bucket/path', fields='items(name)')
+        list_blobs.assert_called_with(prefix='path/', delimiter='/', fields='items(name),nextPageToken')
+
+        list(store.iter_metadata('gs://bucket/path', page_size=10))
+        list_blobs.assert_called_with(
+            prefix='path/', delimiter=None, page_size=10,
+            fields='items(name,size,updated,md5Hash,generation),prefixes,nextPageToken')
+
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_list_page_size_without_client_support(self, client, _):
+        responses = [
+            {'items': [{'name': 'path/a', 'size': '1'}, {'name': 'path/b', 'size': '2'}], 'nextPageToken': 't1'},
+            {'items': [{'name': 'path/c', 'size': '3'}], 'prefixes': ['path/d/']},
+        ]
+        api_request = mock.MagicMock(side_effect=lambda **kwargs: responses.pop(0))
+
+        def item_to_value(iterator, item):
+            blob = mock.MagicMock(size=int(item['size']))
+            blob.name = item['name']
+            return blob
+
+        def page_start(iterator, page, response):
+            page.prefixes = tuple(response.get('prefixes', ()))
+
+        # The signature of `Bucket.list_blobs` of google-cloud-storage 1.10
+        def list_blobs(max_results=None, page_token=None, prefix=None, delimiter=None, versions=None,
+                       projection='noAcl', fields=None, client=None):
+            return page_iterator.HTTPIterator(
+                client=None, api_request=api_request, path='/b/bucket/o', item_to_value=item_to_value,
+                page_token=page_token, max_results=max_results, page_start=page_start,
+                extra_params={'projection': projection, 'prefix': prefix, 'delimiter': delimiter})
+
+        client.return_value.get_bucket.return_value.list_blobs = list_blobs
+
+        results = GCSStore().list('gs://bucket/path', page_size=2)
+
+        # The whole listing is returned, 2 blobs at most per request
+        assert results == {'blobs': [('a', 1), ('b', 2), ('c', 3)], 'prefixes': ['d']}
+        assert [call[1]['query_params']['maxResults'] for call in api_request.call_args_list] == [2, 2]
+
     @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
     @mock.patch(GCS_MODULE.format('Client'))
     def test_upload(self, client, _):
@@ -254,17 +518,60 @@ class TestGCSStore(TestCase):
         gcs_url = 'gs://bucket/path/to/blob.txt'
         store.download_file(gcs_url, fpath, use_basename=False)
         client.return_value.get_bucket.assert_called_with('bucket')
-        client.return_value.get_bucket().get_blob.assert_called_with('path/to/blob.txt')
-        client.return_value.get_bucket().get_blob().download_to_filename.assert_called_with(fpath)
+        client.return_value.get_bucket.return_value.get_blob.assert_called_with('path/to/blob.txt')
+        (client.return_value
+         .get_bucket.return_value
+         .get_blob.return_value
+         .download_to_filename.assert_called_with(fpath))
 
         # Test with basename
         gcs_url = 'gs://bucket/path/to/blob.txt'
         store.download_file(gcs_url, dirname, use_basename=True)
-        client.return_value.get_bucket.assert_called_with('bucket')
-        client.return_value.get_bucket().get_blob.assert_called_with('path/to/blob.txt')
-        client.return_value.get_bucket().get_blob().download_to_filename.assert_called_with(
-            dirname + '/blob.txt'
-        )
+        # The bucket handle is cached
+        client.return_value.get_bucket.assert_called_once_with('bucket')
+        client.return_value.get_bucket.return_value.get_blob.assert_called_with('path/to/blob.txt')
+        (client.return_value
+         .get_bucket.return_value
+         .get_blob.return_value
+         .download_to_filename.assert_called_with(dirname + '/blob.txt'))
+
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_open(self, client, _):
+        data = b'0123456789' * 10
+        blob = client.return_value.get_bucket.return_value.get_blob.return_value
+        blob.configure_mock(size=len(data), generation=7)
+        blob.download_as_bytes.side_effect = lambda start, end, **kwargs: data[start:end + 1]
+
+        store = GCSStore()
+        with store.open('gs://bucket/path/to/blob.txt', block_size=30, readahead=0) as f:
+            f.seek(95)
+            assert f.read() == data[95:]
+            assert f.seek(0) == 0
+            assert f.read(10) == data[:10]
+
+        client.return_value.get_bucket.return_value.get_blob.assert_called_with('path/to/blob.txt')
+        assert blob.download_as_bytes.call_args_list == [
+            mock.call(start=90, end=99, if_generation_match=7),
+            mock.call(start=0, end=29, if_generation_match=7),
+        ]
+
+    @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
+    @mock.patch(GCS_MODULE.format('Client'))
+    def test_open_without_download_as_bytes(self, client, _):
+        data = b'0123456789' * 10
+        # The blobs of google-cloud-storage 1.10 only download with `download_as_string`
+        blob = mock.MagicMock(spec=['size', 'generation', 'media_link', 'download_as_string'])
+        blob.configure_mock(size=len(data), generation=7)
+        blob.download_as_string.side_effect = lambda start, end: data[start:end + 1]
+        client.return_value.get_bucket.return_value.get_blob.return_value = blob
+
+        store = GCSStore()
+        with store.open('gs://bucket/path/to/blob.txt', block_size=30, readahead=0) as f:
+            f.seek(95)
+            assert f.read() == data[95:]
+
+        assert blob.download_as_string.call_args_list == [mock.call(start=90, end=99)]
 
     @mock.patch(GCS_MODULE.format('GCPClient.get_credentials'))
     @mock.patch(GCS_MODULE.format('Client'))
@@ -356,32 +663,23 @@ class TestGCSStore(TestCase):
         obj_mock2 = mock.Mock()
         obj_mock2.configure_mock(name=blob_path + 'test2.txt', size=1)
 
-        subdir_mock = mock.Mock()
         subdirname = rel_path2 + '/'
-        subdir_mock.configure_mock(prefixes=(blob_path + subdirname,))
-
         obj_mock3 = mock.Mock()
         obj_mock3.configure_mock(name=blob_path + subdirname + 'test3.txt', size=1)
 
-        mock_results1 = mock.MagicMock()
-        mock_results1.configure_mock(pages=[subdir_mock])
-        mock_results1.__iter__.return_value = [obj_mock1, obj_mock2]
-
-        mock_results2 = mock.MagicMock()
-        mock_results2.configure_mock(pages=[])
-        mock_results2.__iter__.return_value = [obj_mock3]
-
-        def list_side_effect(prefix, delimiter='/'):
-            if prefix == blob_path:
-                return mock_results1
-            return mock_results2
+        page_mock = mock.MagicMock()
+        page_mock.__iter__.return_value = [obj_mock1, obj_mock2, obj_mock3]
+        mock_results = mock.MagicMock()
+        mock_results.configure_mock(pages=[page_mock])
 
-        client.return_value.get_bucket.return_value.list_blobs.side_effect = list_side_effect
+        client.return_value.get_bucket.return_value.list_blobs.return_value = mock_results
 
         dirname3 = tempfile.mkdtemp()
 
         # Test without basename
         store.download_dir(blob=gcs_url, local_path=dirname3, use_basename=False)
+        client.return_value.get_bucket().list_blobs.assert_called_once_with(
+            prefix=blob_path, delimiter=None, fields='items(name,size),prefixes,nextPageToken')
         client.return_value.get_bucket().get_blob.assert_has_calls(
             [
                 mock.call('{}test1.txt'.format(blob_path)),
@@ -425,27 +723,16 @@ class TestGCSStore(TestCase):
         obj_mock2 = mock.Mock()
         obj_mock2.configure_mock(name=blob_path + 'foo/test2.txt', size=1)
 
-        subdir_mock = mock.Mock()
         subdirname = rel_path2 + '/'
-        subdir_mock.configure_mock(prefixes=(blob_path + 'foo/' + subdirname,))
-
         obj_mock3 = mock.Mock()
         obj_mock3.configure_mock(name=blob_path + 'foo/' + subdirname + 'test3.txt', size=1)
 
-        mock_results1 = mock.MagicMock()
-        mock_results1.configure_mock(pages=[subdir_mock])
-        mock_results1.__iter__.return_value = [obj_mock1, obj_mock2]
-
-        mock_results2 = mock.MagicMock()
-        mock_results2.configure_mock(pages=[])
-        mock_results2.__iter__.return_value = [obj_mock3]
-
-        def list_side_effect(prefix, delimiter='/'):
-            if prefix == blob_path + 'foo/':
-                return mock_results1
-            return mock_results2
+        page_mock = mock.MagicMock()
+        page_mock.__iter__.return_value = [obj_mock1, obj_mock2, obj_mock3]
+        mock_results = mock.MagicMock()
+        mock_results.configure_mock(pages=[page_mock])
 
-        client.return_value.get_bucket.return_value.list_blobs.side_effect = list_side_effect
+        client.return_value.get_bucket.return_value.list_blobs.return_value = mock_results
 
         dirname3 = tempfile.mkdtemp()
 
@@ -0,0 +1,78 @@
+import tracemalloc
+
+from unittest import TestCase
+
+import mock
+
+from dblue_stores.listing import CompactListing
+
+LISTING_MODULE = 'dblue_stores.listing.{}'
+
+
+class TestCompactListing(TestCase):
+    def setUp(self):
+        self.listing = CompactListing()
+        self.listing.extend([('b', 2, 20.), ('a/é', 10, 30.), ('c', None), ('ab', 1, 10.)])
+
+    def _test_listing(self):
+        listing = self.listing
+        assert len(listing) == 4
+        assert list(listing) == [('b', 2), ('a/é', 10), ('c', None), ('ab', 1)]
+        assert listing[1] == ('a/é', 10)
+        assert listing[-1] == ('ab', 1)
+        assert listing.mtime(0) == 20.
+        assert listing.mtime(2) is None
+        assert list(listing[1:3]) == [('a/é', 10), ('c', None)]
+        assert listing.total_size() == 13
+
+        assert list(listing.sort()) == [('a/é', 10), ('ab', 1), ('b', 2), ('c', None)]
+        assert list(listing.sort(reverse=True)) == [('c', None), ('b', 2), ('ab', 1), ('a/é', 10)]
+        assert list(listing.sort(by='size')) == [('c', None), ('ab', 1), ('b', 2), ('a/é', 10)]
+        assert list(listing.sort(by='mtime'))[:3] == [('ab', 1), ('b', 2), ('a/é', 10)]
+        with self.assertRaises(ValueError):
+            listing.sort(by='foo')
+
+        assert list(listing.filter([size > 1 for size in listing.sizes])) == [('b', 2), ('a/é', 10)]
+        assert list(listing.filter(listing.startswith('a'))) == [('a/é', 10), ('ab', 1)]
+        assert list(listing.filter(listing.startswith('a/'))) == [('a/é', 10)]
+        assert list(listing.filter(listing.startswith('foo'))) == []
+        assert len(listing.filter([False] * 4)) == 0
+
+        other = CompactListing()
+        other.append('d', 4)
+        other.extend(listing)
+        assert list(other) == [('d', 4)] + list(listing)
+        assert other[1:] == listing
+
+    def test_listing(self):
+        self._test_listing()
+
+    def test_listing_without_numpy(self):
+        with mock.patch(LISTING_MODULE.format('np'), None):
+            self._test_listing()
+
+    def test_empty_listing(self):
+        listing = CompactListing()
+        assert len(listing) == 0
+        assert listing.total_size() == 0
+        assert list(listing.sort()) == []
+        assert len(listing.filter(listing.startswith('a'))) == 0
+
+    def test_sort_memory_with_skewed_name_lengths(self):
+        listing = CompactListing()
+        for i in range(20000):
+            listing.append('dir/file-{:05d}'.format(19999 - i), i)
+        listing.append('dir/' + 'x' * 16 * 1024, 1)
+
+        tracemalloc.start()
+        try:
+            result = listing.sort()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert result[0] == ('dir/file-00000', 19999)
+        assert result[-1] == ('dir/' + 'x' * 16 * 1024, 1)
+        assert [name for name, _ in result] == sorted(name for name, _ in listing)
+        # Padding every name to the longest one would take 20000 * 16KB
+        assert peak < 10 * listing.nbytes
@@ -0,0 +1,113 @@
+import errno
+import os
+import tempfile
+
+from unittest import TestCase
+
+import mock
+
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.listing import CompactListing
+from dblue_stores.stores.base import BaseStore
+from dblue_stores.stores.local import LocalStore
+from dblue_stores.stores.manager import StoreManager
+from dblue_stores.utils import copy_file
+
+
+class TestLocalStore(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        os.mkdir(self.dirname + '/sub')
+        for name, data in [('test1.txt', 'data1'), ('test2.txt', 'data22'), ('sub/test3.txt', 'data3')]:
+            with open('{}/{}'.format(self.dirname, name), 'w') as f:
+                f.write(data)
+
+    def test_get_store(self):
+        assert isinstance(BaseStore.get_store(), LocalStore)
+        assert StoreManager().store.is_local_store is True
+
+    def test_ls(self):
+        store = LocalStore()
+        results = store.ls(self.dirname)
+        assert sorted(results['files']) == [('test1.txt', 5), ('test2.txt', 6)]
+        assert results['dirs'] == ['sub']
+
+        results = store.ls(self.dirname, compact=True)
+        assert isinstance(results['files'], CompactListing)
+        assert results['files'].total_size() == 11
+
+        pages = list(store.iter_list(self.dirname, page_size=2))
+        assert len(pages) == 2
+        assert store.ls(self.dirname + '/missing') == {'files': [], 'dirs': []}
+
+    def test_copy_file(self):
+        src = self.dirname + '/test1.txt'
+        os.utime(src, (1000, 1000))
+        dst = tempfile.mkdtemp() + '/copy.txt'
+
+        method = copy_file(src, dst)
+        assert method in ('reflink', 'copy_file_range', 'sendfile', 'copy')
+        with open(dst) as f:
+            assert f.read() == 'data1'
+        assert os.stat(dst).st_mtime == 1000
+
+        # Fallbacks when kernel copies are not supported
+        with mock.patch('dblue_stores.utils._reflink', return_value=False):
+            with mock.patch('os.copy_file_range', side_effect=OSError(errno.EXDEV, 'foo')):
+                assert copy_file(src, dst) == 'sendfile'
+                with mock.patch('os.sendfile', side_effect=OSError(errno.EINVAL, 'foo')):
+                    assert copy_file(src, dst) == 'copy'
+        with open(dst) as f:
+            assert f.read() == 'data1'
+
+        assert copy_file(src, dst, hardlink=True) == 'hardlink'
+        assert os.path.samefile(src, dst)
+
+        with self.assertRaises(OSError):
+            copy_file(src, src)
+
+    def test_upload_download(self):
+        store = LocalStore()
+        dirname = tempfile.mkdtemp()
+
+        store.upload_file(self.dirname + '/test1.txt', dirname)
+        assert os.listdir(dirname) == ['test1.txt']
+        store.download_file(dirname + '/test1.txt', dirname + '/foo.txt', use_basename=False)
+        with open(dirname + '/foo.txt') as f:
+            assert f.read() == 'data1'
+
+        with self.assertRaises(DblueStoresException):
+            store.download_file(dirname + '/missing.txt', dirname)
+
+    def test_upload_download_dir(self):
+        store = LocalStore(hardlink=True)
+        dirname = tempfile.mkdtemp()
+
+        result = store.upload_dir(self.dirname, dirname, use_basename=False)
+        assert sorted(result.transferred) == sorted(
+            [self.dirname + '/test1.txt', self.dirname + '/test2.txt', self.dirname + '/sub/test3.txt'])
+        assert sorted(os.listdir(dirname)) == ['sub', 'test1.txt', 'test2.txt']
+        assert os.path.samefile(self.dirname + '/sub/test3.txt', dirname + '/sub/test3.txt')
+
+        dirname2 = tempfile.mkdtemp()
+        store.download_dir(dirname, dirname2, use_basename=True)
+        basename = os.path.basename(dirname)
+        assert sorted(os.listdir('{}/{}'.format(dirname2, basename))) == ['sub', 'test1.txt', 'test2.txt']
+
+        store.delete(dirname2 + '/' + basename)
+        assert os.listdir(dirname2) == []
+
+    def test_sync(self):
+        store = LocalStore()
+        dirname = tempfile.mkdtemp()
+        with open(dirname + '/old.txt', 'w') as f:
+            f.write('old')
+
+        plan = store.sync(self.dirname, dirname, delete=True)
+        assert plan.transfers == ['sub/test3.txt', 'test1.txt', 'test2.txt']
+        assert plan.deletes == ['old.txt']
+        assert sorted(os.listdir(dirname)) == ['sub', 'test1.txt', 'test2.txt']
+
+        plan = store.sync(self.dirname, dirname)
+        assert plan.transfers == []
+        assert plan.unchanged == ['sub/test3.txt', 'test1.txt', 'test2.txt']
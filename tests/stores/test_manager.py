@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import time
+
+from unittest import TestCase
+
+import mock
+
+from dblue_stores import settings
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.stores.local import LocalStore
+from dblue_stores.stores.manager import StoreManager
+from dblue_stores.stores.s3 import S3Store
+
+
+class TestStoreManagerDatasets(TestCase):
+    def setUp(self):
+        self.mount_path = tempfile.mkdtemp()
+        patcher = mock.patch.multiple(settings,
+                                      CREDENTIALS_AUTH_MOUNT_PATH=self.mount_path,
+                                      CREDENTIALS_CHECK_INTERVAL=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(StoreManager.clear_dataset_cache)
+        StoreManager.clear_dataset_cache()
+
+    def write_credential(self, dataset_id, credential):
+        # Write and rename, like the kubelet does when a secret is rotated
+        path = os.path.join(self.mount_path, '{}.json'.format(dataset_id))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(credential, f)
+        os.replace(tmp_path, path)
+
+    def test_get_store_for_dataset(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+
+        manager = StoreManager.get_store_for_dataset('dataset')
+        assert isinstance(manager.store, S3Store)
+        assert manager.path == 's3://bucket'
+
+    def test_get_store_for_dataset_cached(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+
+        manager = StoreManager.get_store_for_dataset('dataset')
+        with mock.patch.object(StoreManager, 'get_credential_for_dataset') as get_credential:
+            assert StoreManager.get_store_for_dataset('dataset') is manager
+            assert StoreManager.get_store_for_dataset('dataset') is manager
+        assert get_credential.call_count == 0
+
+        assert StoreManager.get_store_for_dataset('dataset', use_cache=False) is not manager
+
+    def test_get_store_for_dataset_check_interval(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+
+        with mock.patch.object(settings, 'CREDENTIALS_CHECK_INTERVAL', 60):
+            manager = StoreManager.get_store_for_dataset('dataset')
+            with mock.patch('os.stat') as stat:
+                assert StoreManager.get_store_for_dataset('dataset') is manager
+            assert stat.call_count == 0
+
+    def test_get_store_for_dataset_rotated(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+        manager = StoreManager.get_store_for_dataset('dataset')
+
+        self.write_credential('dataset', {'bucket': '/data', 'store': 'local', 'secret': {}})
+        new_manager = StoreManager.get_store_for_dataset('dataset')
+        assert new_manager is not manager
+        assert isinstance(new_manager.store, LocalStore)
+        assert new_manager.path == '/data'
+        assert StoreManager.get_store_for_dataset('dataset') is new_manager
+
+    def test_get_store_for_dataset_modified(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+        manager = StoreManager.get_store_for_dataset('dataset')
+
+        path = os.path.join(self.mount_path, 'dataset.json')
+        with open(path, 'w') as f:
+            json.dump({'bucket': 's3://other-bucket', 'secret': {'access_key': 'key'}}, f)
+        mtime = time.time() + 10
+        os.utime(path, (mtime, mtime))
+
+        new_manager = StoreManager.get_store_for_dataset('dataset')
+        assert new_manager is not manager
+        assert new_manager.path == 's3://other-bucket'
+
+    def test_get_store_for_dataset_removed(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+        StoreManager.get_store_for_dataset('dataset')
+
+        os.remove(os.path.join(self.mount_path, 'dataset.json'))
+        with self.assertRaises(DblueStoresException):
+            StoreManager.get_store_for_dataset('dataset')
+        assert 'dataset' not in StoreManager._datasets
+
+    def test_clear_dataset_cache(self):
+        self.write_credential('dataset', {'bucket': 's3://bucket', 'secret': {'access_key': 'key'}})
+        manager = StoreManager.get_store_for_dataset('dataset')
+
+        StoreManager.clear_dataset_cache('dataset')
+        assert StoreManager.get_store_for_dataset('dataset') is not manager
@@ -0,0 +1,147 @@
+import logging
+import os
+import tempfile
+
+from unittest import TestCase
+
+import mock
+from moto import mock_s3
+
+from dblue_stores import metrics
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.metrics import Histogram, InMemorySink, LoggingSink, PrometheusSink
+from dblue_stores.stores.s3 import S3Store
+
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == 2.65
+        assert histogram.quantile(0.5) == 0.1
+        assert histogram.quantile(0.75) == 1.0
+        assert histogram.quantile(1) is None
+        assert Histogram().quantile(0.5) is None
+
+
+class TestSinks(TestCase):
+    def test_in_memory_sink(self):
+        sink = InMemorySink()
+        sink.record('s3', 'bucket', 'get', 0.02, size=10)
+        sink.record('s3', 'bucket', 'get', 0.2, size=20, retries=2, error=ValueError())
+        sink.record('gcs', 'bucket', 'list', 0.01)
+
+        stats = sink.get_stats()
+        assert set(stats) == {('s3', 'bucket', 'get'), ('gcs', 'bucket', 'list')}
+        get_stats = stats[('s3', 'bucket', 'get')]
+        assert get_stats['count'] == 2
+        assert get_stats['errors'] == 1
+        assert get_stats['retries'] == 2
+        assert get_stats['bytes'] == 30
+        assert get_stats['latency_p50'] == 0.025
+
+        sink.reset()
+        assert sink.get_stats() == {}
+
+    def test_logging_sink(self):
+        sink = LoggingSink(level=logging.INFO)
+        with mock.patch.object(metrics.logger, 'isEnabledFor', return_value=True), \
+                mock.patch.object(metrics.logger, 'log') as log:
+            sink.record('s3', 'bucket', 'get', 0.02, size=10)
+        assert log.call_count == 1
+        assert log.call_args[0][0] == logging.INFO
+
+    def test_prometheus_sink(self):
+        sink = PrometheusSink()
+        sink.record('s3', 'my"bucket', 'get', 0.02, size=10)
+        sink.record('s3', 'my"bucket', 'get', 400, size=5, error=ValueError())
+
+        lines = sink.export().splitlines()
+        labels = 'store="s3",bucket="my\\"bucket",operation="get"'
+        assert '# TYPE dblue_stores_requests_total counter' in lines
+        assert 'dblue_stores_requests_total{%s} 2' % labels in lines
+        assert 'dblue_stores_errors_total{%s} 1' % labels in lines
+        assert 'dblue_stores_bytes_total{%s} 15' % labels in lines
+        assert '# TYPE dblue_stores_request_duration_seconds histogram' in lines
+        assert 'dblue_stores_request_duration_seconds_bucket{%s,le="0.025"} 1' % labels in lines
+        assert 'dblue_stores_request_duration_seconds_bucket{%s,le="300.0"} 1' % labels in lines
+        assert 'dblue_stores_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels in lines
+        assert 'dblue_stores_request_duration_seconds_count{%s} 2' % labels in lines
+
+
+class TestMeasure(TestCase):
+    def setUp(self):
+        self.sink = InMemorySink()
+        sinks = metrics.get_sinks()
+        metrics.set_sinks([self.sink])
+        self.addCleanup(metrics.set_sinks, sinks)
+
+    def test_measure(self):
+        with metrics.measure('s3', 'bucket', metrics.GET) as measure:
+            measure.size = 10
+
+        with self.assertRaises(ValueError):
+            with metrics.measure('s3', 'bucket', metrics.GET):
+                raise ValueError()
+
+        with metrics.measure('s3', 'bucket', metrics.GET) as measure:
+            measure.discard()
+
+        stats = self.sink.get_stats()[('s3', 'bucket', 'get')]
+        assert stats['count'] == 2
+        assert stats['errors'] == 1
+        assert stats['bytes'] == 10
+
+    def test_failing_sink(self):
+        failing_sink = mock.MagicMock()
+        failing_sink.record.side_effect = ValueError()
+        metrics.add_sink(failing_sink)
+
+        with metrics.measure('s3', 'bucket', metrics.GET):
+            pass
+        assert self.sink.get_stats()[('s3', 'bucket', 'get')]['count'] == 1
+
+        metrics.remove_sink(failing_sink)
+        assert metrics.get_sinks() == [self.sink]
+
+    def test_disabled(self):
+        metrics.set_sinks([])
+        with metrics.measure('s3', 'bucket', metrics.GET) as measure:
+            measure.size = 10
+            measure.discard()
+        assert self.sink.get_stats() == {}
+
+    @mock_s3
+    def test_store_operations(self):
+        store = S3Store()
+        store.client.create_bucket(Bucket='bucket')
+
+        dirname = tempfile.mkdtemp()
+        filename = os.path.join(dirname, 'file')
+        with open(filename, 'wb') as f:
+            f.write(b'data' * 100)
+
+        store.upload_file(filename, 's3://bucket/path/file', use_basename=False)
+        store.get_metadata('s3://bucket/path/file')
+        store.list('bucket', prefix='path')
+        store.download_file('s3://bucket/path/file', os.path.join(dirname, 'downloaded'), use_basename=False)
+        with store.open('s3://bucket/path/file', block_size=100, readahead=0) as f:
+            f.read(150)
+        with self.assertRaises(DblueStoresException):
+            store.get_metadata('s3://bucket/missing')
+        store.delete('s3://bucket/path')
+
+        stats = self.sink.get_stats()
+        assert stats[('s3', 'bucket', 'put')]['count'] == 1
+        assert stats[('s3', 'bucket', 'put')]['bytes'] == 400
+        # upload_file checks that the key does not exist yet
+        assert stats[('s3', 'bucket', 'head')]['count'] == 4
+        assert stats[('s3', 'bucket', 'head')]['errors'] == 2
+        assert stats[('s3', 'bucket', 'list')]['count'] == 2
+        assert stats[('s3', 'bucket', 'get')]['count'] == 3
+        assert stats[('s3', 'bucket', 'get')]['bytes'] == 600
+        assert stats[('s3', 'bucket', 'delete')]['count'] == 1
@@ -0,0 +1,74 @@
+import io
+
+from unittest import TestCase
+
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.readers import RangedReader, check_read_mode
+
+
+class TestRangedReader(TestCase):
+    def setUp(self):
+        self.data = bytes(bytearray(range(256))) * 4
+        self.fetches = []
+
+    def fetch(self, start, end):
+        self.fetches.append((start, end))
+        return self.data[start:end + 1]
+
+    def get_reader(self, **kwargs):
+        return RangedReader(self.fetch, size=len(self.data), name='foo', **kwargs)
+
+    def test_read(self):
+        reader = self.get_reader(block_size=100, readahead=0)
+        assert reader.readable() and reader.seekable()
+        assert reader.read(10) == self.data[:10]
+        assert reader.read(200) == self.data[10:210]
+        assert reader.tell() == 210
+        assert reader.read() == self.data[210:]
+        assert reader.read(10) == b''
+        assert self.fetches == [(i * 100, min(i * 100 + 99, 1023)) for i in range(11)]
+
+        reader.seek(0)
+        assert io.BufferedReader(reader).read() == self.data
+        reader.close()
+        with self.assertRaises(ValueError):
+            reader.read(1)
+
+    def test_seek_and_cache(self):
+        reader = self.get_reader(block_size=100, readahead=0, cache_blocks=2)
+        assert reader.seek(-8, io.SEEK_END) == 1016
+        assert reader.read(8) == self.data[-8:]
+        reader.seek(0)
+        assert reader.read(4) == self.data[:4]
+        assert reader.seek(-4, io.SEEK_CUR) == 0
+        # Cached blocks are not fetched again
+        assert reader.read(4) == self.data[:4]
+        reader.seek(1020)
+        assert reader.read(4) == self.data[1020:]
+        assert self.fetches == [(1000, 1023), (0, 99)]
+        assert reader.requests == 2
+
+        with self.assertRaises(ValueError):
+            reader.seek(-1)
+
+    def test_readahead(self):
+        reader = self.get_reader(block_size=100, readahead=3)
+        reader.seek(500)
+        reader.read(10)
+        # Random reads do not prefetch
+        assert self.fetches == [(500, 599)]
+        reader.read(100)
+        assert self.fetches == [(500, 599), (600, 999)]
+        assert reader.read() == self.data[610:]
+        assert self.fetches[-1] == (1000, 1023)
+        assert reader.bytes_fetched == 524
+
+    def test_short_read(self):
+        reader = RangedReader(lambda start, end: b'foo', size=100, block_size=10)
+        with self.assertRaises(DblueStoresException):
+            reader.read(10)
+
+    def test_check_read_mode(self):
+        check_read_mode('rb')
+        with self.assertRaises(DblueStoresException):
+            check_read_mode('wb')
@@ -2,11 +2,16 @@ from unittest import TestCase
 
 import os
 import tempfile
+
+import mock
 from boto3.resources.base import ServiceResource
 from botocore.client import BaseClient
+from botocore.exceptions import EndpointConnectionError
 from moto import mock_s3
 
 from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.listing import CompactListing
+from dblue_stores.stores.manager import StoreManager
 from dblue_stores.stores.s3 import S3Store
 
 
@@ -21,6 +26,52 @@ class TestAwsStore(TestCase):
         assert isinstance(store.client, BaseClient)
         assert isinstance(store.resource, ServiceResource)
 
+    def test_get_part_size(self):
+        mb = 1024 * 1024
+        assert S3Store.get_part_size(0) == 8 * mb
+        assert S3Store.get_part_size(10 * mb) == 8 * mb
+        assert S3Store.get_part_size(10 * mb, chunksize=16 * mb) == 16 * mb
+        # 200GB do not fit in 10000 parts of 8MB
+        assert S3Store.get_part_size(200 * 1024 * mb) == 21 * mb
+        assert S3Store.get_part_size(200 * 1024 * mb) * S3Store.MAX_PARTS >= 200 * 1024 * mb
+        assert S3Store.get_part_size(10 ** 15) == S3Store.MAX_PART_SIZE
+
+    def test_get_transfer_config(self):
+        store = S3Store(max_concurrency=4, use_threads=False, multipart_threshold=None)
+        config = store.get_transfer_config()
+        assert config.max_concurrency == 4
+        assert config.use_threads is False
+        assert config.multipart_threshold == 8 * 1024 * 1024
+
+        config = store.get_transfer_config(size=200 * 1024 ** 3, transfer_config={'max_concurrency': 20})
+        assert config.max_concurrency == 20
+        assert config.multipart_chunksize == 21 * 1024 * 1024
+
+        with self.assertRaises(DblueStoresException):
+            store.get_transfer_config(transfer_config={'foo': 1})
+
+    @mock_s3
+    def test_upload_download_transfer_config(self):
+        store = S3Store(multipart_chunksize=16 * 1024 * 1024)
+        store.client.create_bucket(Bucket='bucket')
+        dirname = tempfile.mkdtemp()
+        fpath = dirname + '/test.txt'
+        with open(fpath, 'w') as f:
+            f.write('data')
+
+        with mock.patch.object(store.client, 'upload_file', wraps=store.client.upload_file) as upload_file:
+            store.upload_file(fpath, 's3://bucket/test.txt', use_basename=False, transfer_config={'max_concurrency': 2})
+            config = upload_file.call_args[1]['Config']
+            assert config.max_concurrency == 2
+            assert config.multipart_chunksize == 16 * 1024 * 1024
+
+        with mock.patch.object(store.client, 'download_file', wraps=store.client.download_file) as download_file:
+            store.download_file('s3://bucket/test.txt', dirname + '/foo.txt', use_basename=False,
+                                transfer_config={'use_threads': False})
+            assert download_file.call_args[1]['Config'].use_threads is False
+        with open(dirname + '/foo.txt') as f:
+            assert f.read() == 'data'
+
     def test_parse_s3_url(self):
         s3_url = 's3://test/this/is/valid/key.txt'
         parsed_url = S3Store.parse_s3_url(s3_url)
@@ -66,6 +117,46 @@ class TestAwsStore(TestCase):
 
         assert len(store.list(bucket_name='bucket', delimiter='/')['keys']) == num_objects
 
+    @mock_s3
+    def test_iter_list(self):
+        store = S3Store()
+        b = store.get_bucket('bucket')
+        b.create()
+        for k in range(5):
+            b.put_object(Key='a' + str(k), Body=b'a')
+        b.put_object(Key='dir/b', Body=b'b')
+
+        pages = list(store.iter_list(bucket_name='bucket', page_size=2))
+        assert len(pages) == 3
+        assert [len(page['keys']) for page in pages] == [2, 2, 1]
+        assert sum([page['prefixes'] for page in pages], []) == ['dir']
+
+        pages = list(store.iter_ls('s3://bucket'))
+        assert sum([page['files'] for page in pages], []) == [('a' + str(k), 1) for k in range(5)]
+
+    @mock_s3
+    def test_list_compact(self):
+        store = S3Store()
+        b = store.get_bucket('bucket')
+        b.create()
+        b.put_object(Key='c', Body=b'ccc')
+        b.put_object(Key='a', Body=b'a')
+        b.put_object(Key='dir/b', Body=b'bb')
+
+        results = store.list(bucket_name='bucket', compact=True, page_size=1)
+        assert isinstance(results['keys'], CompactListing)
+        assert results['keys'] == [('a', 1), ('c', 3)]
+        assert results['keys'].total_size() == 4
+        assert results['keys'].mtime(0) is not None
+        assert results['prefixes'] == ['dir']
+
+        results = store.list(bucket_name='bucket', compact=True, recursive=True)
+        assert results['keys'] == [('a', 1), ('c', 3), ('dir/b', 2)]
+
+        results = StoreManager(store=store).ls('s3://bucket', compact=True)
+        assert isinstance(results['files'], CompactListing)
+        assert results == {'files': [('a', 1), ('c', 3)], 'dirs': ['dir']}
+
     @mock_s3
     def test_list_prefixes(self):
         store = S3Store()
@@ -112,6 +203,74 @@ class TestAwsStore(TestCase):
         assert store.list_keys(bucket_name='bucket', delimiter='/') == []
         assert store.list_keys(bucket_name='bucket', prefix='dir/') == [('b', 1)]
 
+    @mock_s3
+    def test_list_recursive(self):
+        store = S3Store()
+        b = store.get_bucket('bucket')
+        b.create()
+        b.put_object(Key='a', Body=b'a')
+        b.put_object(Key='dir/b', Body=b'b')
+        b.put_object(Key='dir/sub/c', Body=b'c')
+        b.put_object(Key='dir2/d', Body=b'd')
+
+        assert store.list(bucket_name='bucket', recursive=True) == {
+            'keys': [('a', 1), ('dir/b', 1), ('dir/sub/c', 1), ('dir2/d', 1)],
+            'prefixes': []
+        }
+        assert store.list(bucket_name='bucket', prefix='dir', recursive=True) == {
+            'keys': [('b', 1), ('sub/c', 1)],
+            'prefixes': []
+        }
+
+    @mock_s3
+    def test_delete_dir(self):
+        store = S3Store()
+        b = store.get_bucket('bucket')
+        b.create()
+        b.put_object(Key='dir/b', Body=b'b')
+        b.put_object(Key='dir/sub/c', Body=b'c')
+        b.put_object(Key='dir2/d', Body=b'd')
+
+        store.delete(key='dir', bucket_name='bucket')
+        assert store.list_keys(bucket_name='bucket') == [('dir2/d', 1)]
+
+    @mock_s3
+    def test_delete_many(self):
+        store = S3Store()
+        b = store.get_bucket('bucket')
+        b.create()
+        num_objects = 2 * S3Store.DELETE_BATCH_SIZE + 1
+        for k in range(num_objects):
+            b.put_object(Key='dir/' + str(k), Body=b'a')
+        b.put_object(Key='a', Body=b'a')
+
+        with mock.patch.object(store.client, 'delete_objects', wraps=store.client.delete_objects) as delete:
+            assert store.delete_many(['dir/' + str(k) for k in range(num_objects)], 'bucket', max_workers=2) == []
+            assert delete.call_count == 3
+        assert store.list_keys(bucket_name='bucket') == [('a', 1)]
+
+        # Urls
+        assert store.delete_many(['s3://bucket/a']) == []
+        assert store.list_keys(bucket_name='bucket') == []
+
+    @mock_s3
+    def test_delete_many_connection_error(self):
+        store = S3Store()
+        b = store.get_bucket('bucket')
+        b.create()
+        b.put_object(Key='dir/a', Body=b'a')
+        b.put_object(Key='dir/b', Body=b'b')
+
+        error = EndpointConnectionError(endpoint_url='https://s3.amazonaws.com')
+        with mock.patch.object(store.client, 'delete_objects', side_effect=error):
+            errors = store.delete_many(['dir/a', 'dir/b'], 'bucket')
+            assert sorted(e['Key'] for e in errors) == ['dir/a', 'dir/b']
+            assert errors[0]['Code'] == 'EndpointConnectionError'
+
+            with self.assertRaises(DblueStoresException):
+                store.delete('s3://bucket/dir')
+        assert store.list_keys(bucket_name='bucket') == [('dir/a', 1), ('dir/b', 1)]
+
     @mock_s3
     def test_list_prefixes_paged(self):
         store = S3Store()
@@ -190,6 +349,43 @@ class TestAwsStore(TestCase):
 
         self.assertEqual(store.read_key('my_key', 'bucket'), u'Ménar')
 
+    @mock_s3
+    def test_open(self):
+        store = S3Store()
+        store.client.create_bucket(Bucket='bucket')
+        data = b'0123456789' * 100
+        store.client.put_object(Bucket='bucket', Key='my_key', Body=data)
+
+        with store.open('s3://bucket/my_key', block_size=64) as f:
+            f.seek(-10, 2)
+            assert f.read() == data[-10:]
+            f.seek(100)
+            assert f.read(100) == data[100:200]
+            assert f.requests == 3
+
+        with store.open('my_key', bucket_name='bucket') as f:
+            assert f.read() == data
+
+        with self.assertRaises(DblueStoresException):
+            store.open('s3://bucket/my_key', mode='w')
+        with self.assertRaises(DblueStoresException):
+            store.open('s3://bucket/foo')
+
+    @mock_s3
+    def test_download_file_parallel(self):
+        store = S3Store()
+        store.client.create_bucket(Bucket='bucket')
+        data = os.urandom(1000)
+        store.client.put_object(Bucket='bucket', Key='my_key', Body=data)
+
+        dirname = tempfile.mkdtemp()
+        store.download_file('s3://bucket/my_key', dirname, part_size=128, max_workers=4)
+        with open(dirname + '/my_key', 'rb') as f:
+            assert f.read() == data
+
+        with self.assertRaises(DblueStoresException):
+            store.download_file('s3://bucket/foo', dirname, max_workers=4)
+
     @mock_s3
     def test_upload_string(self):
         store = S3Store()
@@ -301,3 +497,100 @@ class TestAwsStore(TestCase):
         assert sorted(os.listdir('{}/{}'.format(dirname3, rel_path1))) == sorted(
             [rel_path2, 'test1.txt', 'test2.txt'])
         assert os.listdir('{}/{}/{}'.format(dirname3, rel_path1, rel_path2)) == ['test3.txt']
+
+    @mock_s3
+    def test_upload_download_directory_collects_errors(self):
+        store = S3Store()
+        store.client.create_bucket(Bucket='bucket')
+
+        dirname1 = tempfile.mkdtemp()
+        for i in range(5):
+            with open('{}/test{}.txt'.format(dirname1, i), 'w') as f:
+                f.write('data{}'.format(i))
+
+        store.upload_file(dirname1 + '/test0.txt', 'mykey/test0.txt', 'bucket', use_basename=False)
+
+        # Existing keys fail without stopping the other uploads,
+        # the keys of a small directory are checked one by one without listing the prefix
+        with mock.patch.object(store.client, 'head_object', wraps=store.client.head_object) as head_object, \
+                mock.patch.object(store, 'list', wraps=store.list) as list_keys:
+            result = store.upload_dir(dirname1, 'mykey', 'bucket', use_basename=False, max_workers=3,
+                                      raise_errors=False)
+            assert list(result.errors) == [dirname1 + '/test0.txt']
+            assert head_object.call_count == 5
+            assert list_keys.call_count == 0
+
+        # The keys of a large directory are checked against a listing of the prefix
+        with mock.patch.object(S3Store, 'UPLOAD_DIR_LISTING_MIN_FILES', 3), \
+                mock.patch.object(store.client, 'head_object') as head_object:
+            with self.assertRaises(DblueStoresException):
+                store.upload_dir(dirname1, 'mykey', 'bucket', use_basename=False, max_workers=3)
+            assert head_object.call_count == 0
+
+            result = store.upload_dir(dirname1, 'mykey', 'bucket', use_basename=False, max_workers=3,
+                                      raise_errors=False)
+            assert len(result.errors) == 5
+
+        # Without the check, nothing is listed nor looked up
+        with mock.patch.object(store.client, 'head_object') as head_object, \
+                mock.patch.object(store, 'list') as list_keys:
+            result = store.upload_dir(dirname1, 'mykey', 'bucket', use_basename=False, overwrite=True)
+            assert len(result.transferred) == 5
+            assert head_object.call_count == 0
+            assert list_keys.call_count == 0
+        assert len(store.list_keys(bucket_name='bucket', prefix='mykey/')) == 5
+
+        dirname2 = tempfile.mkdtemp()
+        result = store.download_dir('mykey', dirname2, 'bucket', use_basename=False, max_workers=3)
+        assert result.ok is True
+        assert len(result.transferred) == 5
+        assert sorted(os.listdir(dirname2)) == ['test{}.txt'.format(i) for i in range(5)]
+
+    @mock_s3
+    def test_sync(self):
+        store = S3Store()
+        store.client.create_bucket(Bucket='bucket')
+
+        dirname1 = tempfile.mkdtemp()
+        os.mkdir(dirname1 + '/sub')
+        for name, data in [('test1.txt', 'data1'), ('test2.txt', 'data2'), ('sub/test3.txt', 'data3')]:
+            with open('{}/{}'.format(dirname1, name), 'w') as f:
+                f.write(data)
+
+        # Dry run
+        plan = store.sync(dirname1, 's3://bucket/mykey', dry_run=True)
+        assert plan.transfers == ['sub/test3.txt', 'test1.txt', 'test2.txt']
+        assert plan.result is None
+        assert store.check_key('mykey/test1.txt', 'bucket') is False
+
+        plan = store.sync(dirname1, 's3://bucket/mykey')
+        assert sorted(plan.result.transferred) == ['sub/test3.txt', 'test1.txt', 'test2.txt']
+        assert store.read_key('mykey/sub/test3.txt', 'bucket') == 'data3'
+
+        # Only the changed files are uploaded
+        with open(dirname1 + '/test1.txt', 'w') as f:
+            f.write('data4')
+        os.remove(dirname1 + '/test2.txt')
+        plan = store.sync(dirname1, 's3://bucket/mykey')
+        assert plan.transfers == ['test1.txt']
+        assert plan.unchanged == ['sub/test3.txt']
+        assert store.read_key('mykey/test1.txt', 'bucket') == 'data4'
+        assert store.check_key('mykey/test2.txt', 'bucket') is True
+
+        # Mirror deletes
+        plan = StoreManager(store=store).sync(dirname1, 's3://bucket/mykey', delete=True)
+        assert plan.transfers == []
+        assert plan.deletes == ['test2.txt']
+        assert store.check_key('mykey/test2.txt', 'bucket') is False
+
+        # Download
+        dirname2 = tempfile.mkdtemp()
+        plan = store.sync('s3://bucket/mykey', dirname2)
+        assert plan.transfers == ['sub/test3.txt', 'test1.txt']
+        with open(dirname2 + '/sub/test3.txt') as f:
+            assert f.read() == 'data3'
+        plan = store.sync('s3://bucket/mykey', dirname2)
+        assert plan.transfers == []
+
+        with self.assertRaises(DblueStoresException):
+            store.sync(dirname1, dirname2)
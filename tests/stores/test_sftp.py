@@ -0,0 +1,220 @@
+import io
+import os
+import tempfile
+import threading
+
+from unittest import TestCase
+
+import mock
+
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.stores.sftp import SFTPStore
+
+SFTP_MODULE = 'dblue_stores.stores.sftp.{}'
+
+
+class FakeRemoteFile(io.BytesIO):
+    def __init__(self, files, path, mode):
+        super(FakeRemoteFile, self).__init__(files.get(path, b'') if 'r' in mode else b'')
+        self.files = files
+        self.path = path
+        self.mode = mode
+        self.prefetched = None
+        self.pipelined = False
+
+    def stat(self):
+        return mock.MagicMock(st_size=len(self.getvalue()))
+
+    def prefetch(self, file_size=None):
+        self.prefetched = file_size
+
+    def set_pipelined(self, pipelined=True):
+        self.pipelined = pipelined
+
+    def close(self):
+        if 'w' in self.mode and not self.closed:
+            self.files[self.path] = self.getvalue()
+        super(FakeRemoteFile, self).close()
+
+
+class FakeChannel(object):
+    """An in-memory paramiko SFTPClient."""
+
+    def __init__(self, transport, files):
+        self.transport = transport
+        self.files = files
+        self.opened = []
+        self._channel = mock.MagicMock(closed=False)
+
+    def get_channel(self):
+        return self._channel
+
+    def open(self, path, mode='r'):
+        remote_file = FakeRemoteFile(self.files, path, mode)
+        self.opened.append(remote_file)
+        return remote_file
+
+    def stat(self, path):
+        if path not in self.files:
+            raise IOError(2, 'No such file')
+        return mock.MagicMock(st_size=len(self.files[path]))
+
+    def close(self):
+        self._channel.closed = True
+
+
+class TestSFTPStore(TestCase):
+    def setUp(self):
+        self.files = {}
+        self.transports = []
+
+        def get_transport(index=0, **kwargs):
+            # Like the connection pool, one connection per index
+            while len(self.transports) <= index:
+                self.transports.append(mock.MagicMock())
+            return self.transports[index]
+
+        patcher = mock.patch(SFTP_MODULE.format('SFTPClient.get_transport'), side_effect=get_transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch(SFTP_MODULE.format('SFTPClient.open_channel'),
+                             side_effect=lambda transport: FakeChannel(transport, self.files))
+        self.open_channel = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = mock.MagicMock()
+        self.client.stat.side_effect = lambda path: FakeChannel(None, self.files).stat(path)
+
+    def test_upload_download_file(self):
+        store = SFTPStore(client=self.client)
+        dirname = tempfile.mkdtemp()
+        filename = os.path.join(dirname, 'file')
+        with open(filename, 'wb') as f:
+            f.write(b'data' * 1000)
+
+        store.upload_file(filename, '/remote/file')
+        assert self.files['/remote/file'] == b'data' * 1000
+
+        local_path = os.path.join(dirname, 'downloaded')
+        store.download_file('/remote/file', local_path)
+        with open(local_path, 'rb') as f:
+            assert f.read() == b'data' * 1000
+
+        # One channel was opened over the connection of the client, and reused
+        assert self.open_channel.call_count == 1
+        channel = self.open_channel.call_args[0][0]
+        assert channel is self.client.get_channel.return_value.get_transport.return_value
+        upload, download = store._channels[0].opened
+        assert upload.pipelined is True
+        assert download.prefetched == 4000
+
+    def test_upload_file_size_mismatch(self):
+        store = SFTPStore(client=self.client)
+        filename = os.path.join(tempfile.mkdtemp(), 'file')
+        with open(filename, 'wb') as f:
+            f.write(b'data')
+
+        with mock.patch.object(FakeChannel, 'stat', return_value=mock.MagicMock(st_size=1)):
+            with self.assertRaises(DblueStoresException):
+                store.upload_file(filename, '/remote/file')
+
+    def test_channels_are_bounded_and_spread_over_transports(self):
+        store = SFTPStore(host='host', channels=4, transports=2)
+        barrier = threading.Barrier(4, timeout=5)
+        channels = []
+
+        def borrow():
+            with store.channel() as channel:
+                channels.append(channel)
+                barrier.wait()
+
+        threads = [threading.Thread(target=borrow) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(id(channel) for channel in channels)) == 4
+        assert len(self.transports) == 2
+        transports = [channel.transport for channel in store._channels]
+        assert transports.count(transports[0]) == 2
+        assert transports.count(transports[1]) == 2
+
+        # Idle channels are reused
+        with store.channel() as channel:
+            assert channel in channels
+        assert self.open_channel.call_count == 4
+
+    def test_closed_channels_are_replaced(self):
+        store = SFTPStore(client=self.client, channels=1)
+        with store.channel() as channel:
+            channel.close()
+
+        with store.channel() as new_channel:
+            assert new_channel is not channel
+        assert store._channels == [new_channel]
+
+    def test_close(self):
+        store = SFTPStore(host='host', channels=2, transports=2)
+        with store.channel():
+            with store.channel():
+                pass
+        channels = list(store._channels)
+
+        store.close()
+        assert all(channel.get_channel().closed for channel in channels)
+        assert store._channels == []
+        # The mocked connections are not pooled
+        self.transports[1].close.assert_called_once_with()
+
+    def test_reconnect_client(self):
+        store = SFTPStore(host='host')
+        client = store.client
+        assert store.client is client
+
+        client.close()
+        assert store.client is not client
+
+        # Provided clients are not replaced
+        store = SFTPStore(client=self.client)
+        self.client.get_channel.return_value.closed = True
+        assert store.client is self.client
+
+    def test_upload_dir_creates_every_directory_once(self):
+        store = SFTPStore(client=self.client, channels=3)
+        remote_dirs = {'/', '/remote'}
+        self.client.mkdir.side_effect = remote_dirs.add
+
+        def stat(path):
+            if path not in remote_dirs:
+                raise IOError(2, 'No such file')
+            return mock.MagicMock()
+
+        self.client.stat.side_effect = stat
+        dirname = tempfile.mkdtemp()
+        os.makedirs(os.path.join(dirname, 'a', 'b'))
+        for i in range(20):
+            for subdir in ['', 'a', 'a/b']:
+                with open(os.path.join(dirname, subdir, 'file{}'.format(i)), 'wb') as f:
+                    f.write(b'data')
+
+        result = store.upload_dir(dirname, '/remote')
+        assert len(result.transferred) == 60
+        assert remote_dirs == {'/', '/remote', '/remote/a', '/remote/a/b'}
+        # One lookup of the remote directory, and of each new directory, instead of one per file
+        assert self.client.stat.call_count == 3
+        assert self.client.mkdir.call_count == 2
+
+    def test_upload_download_dir(self):
+        store = SFTPStore(client=self.client, channels=3)
+        store.makedirs = mock.MagicMock()
+        dirname = tempfile.mkdtemp()
+        for i in range(10):
+            with open(os.path.join(dirname, 'file{}'.format(i)), 'wb') as f:
+                f.write(b'data')
+
+        result = store.upload_dir(dirname, '/remote')
+        assert len(result.transferred) == 10
+        assert len(self.files) == 10
+        assert 1 <= len(store._channels) <= 3
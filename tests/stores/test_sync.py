@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+from unittest import TestCase
+
+from dblue_stores.sync import SyncPlan, get_local_metadata, is_changed
+from dblue_stores.utils import get_file_md5
+
+
+class TestSync(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dirname, 'sub'))
+        with open(os.path.join(self.dirname, 'a.txt'), 'w') as f:
+            f.write('data1')
+        with open(os.path.join(self.dirname, 'sub', 'b.txt'), 'w') as f:
+            f.write('data22')
+
+    def test_get_local_metadata(self):
+        entries = get_local_metadata(self.dirname)
+        assert sorted(entries) == ['a.txt', 'sub/b.txt']
+        assert entries['a.txt']['size'] == 5
+        assert entries['sub/b.txt']['size'] == 6
+        assert entries['a.txt']['md5'] is None
+        assert get_local_metadata(os.path.join(self.dirname, 'missing')) == {}
+
+    def test_is_changed(self):
+        local = get_local_metadata(self.dirname)['a.txt']
+        md5 = get_file_md5(local['path'])
+
+        assert is_changed(local, None) is True
+        assert is_changed(local, {'size': 4, 'mtime': None, 'md5': None}) is True
+        # Same size, digests are compared and the local file is hashed lazily
+        assert is_changed(dict(local), {'size': 5, 'mtime': 0, 'md5': md5}) is False
+        assert is_changed(dict(local), {'size': 5, 'mtime': 0, 'md5': 'foo'}) is True
+        # No digest, modification times are compared
+        assert is_changed(dict(local), {'size': 5, 'mtime': local['mtime'] + 10, 'md5': None}) is False
+        assert is_changed(dict(local), {'size': 5, 'mtime': local['mtime'] - 10, 'md5': None}) is True
+
+    def test_compute_plan(self):
+        source = {
+            'a': {'size': 1, 'mtime': 10, 'md5': None},
+            'b': {'size': 1, 'mtime': 10, 'md5': None},
+        }
+        destination = {
+            'b': {'size': 1, 'mtime': 20, 'md5': None},
+            'c': {'size': 1, 'mtime': 20, 'md5': None},
+        }
+        plan = SyncPlan.compute('src', 'dst', source, destination, upload=True)
+        assert plan.transfers == ['a']
+        assert plan.unchanged == ['b']
+        assert plan.deletes == []
+
+        plan = SyncPlan.compute('src', 'dst', source, destination, upload=True, delete=True)
+        assert plan.deletes == ['c']
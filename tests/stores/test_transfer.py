@@ -0,0 +1,151 @@
+import os
+import tempfile
+import threading
+
+from unittest import TestCase
+
+from dblue_stores.exceptions import DblueStoresException
+from dblue_stores.transfer import (
+    BufferReader,
+    TransferExecutor,
+    TransferResult,
+    download_ranges,
+    upload_ranges
+)
+
+
+class TestTransferExecutor(TestCase):
+    def test_invalid_max_workers(self):
+        with self.assertRaises(DblueStoresException):
+            TransferExecutor(max_workers=-1)
+
+    def test_run_collects_results(self):
+        def fail():
+            raise ValueError('foo')
+
+        for max_workers in [1, 4]:
+            tasks = [('a', lambda: None), ('b', fail), ('c', lambda: None)]
+            result = TransferExecutor(max_workers=max_workers).run(iter(tasks))
+
+            assert len(result) == 3
+            assert result.ok is False
+            assert sorted(result.transferred) == ['a', 'c']
+            assert list(result.errors) == ['b']
+            assert isinstance(result.errors['b'], ValueError)
+
+            with self.assertRaises(DblueStoresException):
+                result.raise_for_errors()
+
+    def test_run_is_concurrent(self):
+        barrier = threading.Barrier(4, timeout=5)
+        tasks = [(str(i), barrier.wait) for i in range(4)]
+
+        result = TransferExecutor(max_workers=4).run(tasks)
+        assert result.ok is True
+        assert len(result.transferred) == 4
+
+    def test_update(self):
+        result1 = TransferResult()
+        result1.add_success('a')
+        result2 = TransferResult()
+        result2.add_error('b', ValueError())
+        result1.update(result2)
+
+        assert result1.transferred == ['a']
+        assert list(result1.errors) == ['b']
+
+
+class TestDownloadRanges(TestCase):
+    def test_download_ranges(self):
+        data = os.urandom(1000)
+        fetches = []
+
+        def fetch(start, end):
+            fetches.append((start, end))
+            return data[start:end + 1]
+
+        filename = tempfile.mkdtemp() + '/foo'
+        for max_workers in [1, 4]:
+            fetches = []
+            download_ranges(fetch, len(data), filename, part_size=300, max_workers=max_workers)
+            with open(filename, 'rb') as f:
+                assert f.read() == data
+            assert sorted(fetches) == [(0, 299), (300, 599), (600, 899), (900, 999)]
+
+        download_ranges(fetch, 0, filename, part_size=300, max_workers=4)
+        assert os.path.getsize(filename) == 0
+
+    def test_download_ranges_failure(self):
+        def fetch(start, end):
+            if start == 300:
+                raise ValueError('foo')
+            return b'0' * (end - start + 1)
+
+        filename = tempfile.mkdtemp() + '/foo'
+        with self.assertRaises(ValueError):
+            download_ranges(fetch, 1000, filename, part_size=100, max_workers=4)
+        assert not os.path.exists(filename)
+
+        with self.assertRaises(DblueStoresException):
+            download_ranges(lambda start, end: b'0', 1000, filename, part_size=100, max_workers=4)
+        assert not os.path.exists(filename)
+
+
+class TestUploadRanges(TestCase):
+    def test_upload_ranges(self):
+        data = os.urandom(1000)
+        filename = tempfile.mkdtemp() + '/foo'
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+        for max_workers in [1, 4]:
+            parts = {}
+            views = []
+
+            def put(index, part):
+                # The parts are views of the file, not copies
+                assert isinstance(part, memoryview)
+                views.append(part)
+                parts[index] = bytes(part)
+
+            assert upload_ranges(put, filename, part_size=300, max_workers=max_workers) == 4
+            assert sorted(parts) == [0, 1, 2, 3]
+            assert b''.join(parts[index] for index in range(4)) == data
+            # The views are released once their part was uploaded
+            with self.assertRaises(ValueError):
+                bytes(views[0])
+
+        with open(filename, 'wb'):
+            pass
+        parts = {}
+        assert upload_ranges(put, filename, part_size=300) == 1
+        assert parts == {0: b''}
+
+    def test_buffer_reader(self):
+        data = memoryview(b'0123456789')
+        with BufferReader(data[2:8]) as reader:
+            assert len(reader) == 6
+            assert reader.read(4) == b'2345'
+            assert reader.tell() == 4
+            assert reader.read() == b'67'
+            assert reader.read(1) == b''
+            assert reader.seek(1) == 1
+            assert reader.read(2) == b'34'
+            assert reader.seek(-1, os.SEEK_END) == 5
+            assert reader.read() == b'7'
+        assert reader.closed
+
+    def test_upload_ranges_failure(self):
+        filename = tempfile.mkdtemp() + '/foo'
+        with open(filename, 'wb') as f:
+            f.write(b'0' * 1000)
+
+        def put(index, part):
+            if index == 3:
+                raise ValueError('foo')
+
+        with self.assertRaises(ValueError):
+            upload_ranges(put, filename, part_size=100, max_workers=4)
+
+        with self.assertRaises(DblueStoresException):
+            upload_ranges(put, filename, part_size=0)
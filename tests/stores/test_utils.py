@@ -1,8 +1,9 @@
+import os
 import tempfile
 
 from unittest import TestCase
 
-from dblue_stores.utils import append_basename, is_protected_type, walk
+from dblue_stores.utils import append_basename, b64_to_hex, get_file_md5, is_protected_type, iter_files, walk
 
 
 class TestUtils(TestCase):
@@ -19,6 +20,16 @@ class TestUtils(TestCase):
         assert append_basename('/foo/moo', 'bar') == '/foo/moo/bar'
         assert append_basename('/foo/moo', 'boo/bar.txt') == '/foo/moo/bar.txt'
 
+    def test_md5(self):
+        dirname = tempfile.mkdtemp()
+        fpath = dirname + '/test.txt'
+        with open(fpath, 'w') as f:
+            f.write('data1')
+
+        assert get_file_md5(fpath) == get_file_md5(fpath, chunk_size=2) == '89d903bc35dede724fd52c51437ff5fd'
+        assert b64_to_hex('idkDvDXe3nJP1SxRQ3/1/Q==') == '89d903bc35dede724fd52c51437ff5fd'
+        assert b64_to_hex(None) is None
+
     def test_get_files_in_current_directory(self):
         dirname = tempfile.mkdtemp()
         fpath1 = dirname + '/test1.txt'
@@ -37,3 +48,38 @@ class TestUtils(TestCase):
         with walk(dirname) as files:
             assert len(files) == 3
             assert set(files) == {fpath1, fpath2, fpath3}
+
+    def test_iter_files(self):
+        dirname = tempfile.mkdtemp()
+        os.makedirs(os.path.join(dirname, 'a', 'b'))
+        os.makedirs(os.path.join(dirname, 'empty'))
+        for name, data in [('f1', 'data1'), ('a/f2', 'data22'), ('a/b/f3', 'data333')]:
+            with open(os.path.join(dirname, name), 'w') as f:
+                f.write(data)
+
+        files = iter_files(dirname)
+        assert not isinstance(files, list)
+        entries = {os.path.relpath(entry.path, dirname): entry for entry in files}
+        assert set(entries) == {'f1', os.path.join('a', 'f2'), os.path.join('a', 'b', 'f3')}
+        assert entries['f1'].size == 5
+        assert entries[os.path.join('a', 'b', 'f3')].size == 7
+        stat = os.stat(os.path.join(dirname, 'f1'))
+        assert entries['f1'].mtime == stat.st_mtime
+        assert entries['f1'].mtime_ns == stat.st_mtime_ns
+
+    def test_iter_files_symlinks(self):
+        dirname = tempfile.mkdtemp()
+        other_dirname = tempfile.mkdtemp()
+        with open(os.path.join(other_dirname, 'f1'), 'w') as f:
+            f.write('data1')
+        os.symlink(other_dirname, os.path.join(dirname, 'linked_dir'))
+        os.symlink(os.path.join(other_dirname, 'f1'), os.path.join(dirname, 'linked_file'))
+
+        # Like os.walk, symlinks to files are listed, symlinks to directories are not followed
+        assert [entry.path for entry in iter_files(dirname)] == [os.path.join(dirname, 'linked_file')]
+
+    def test_iter_files_errors(self):
+        errors = []
+        assert list(iter_files('/does/not/exist', onerror=errors.append)) == []
+        assert len(errors) == 1
+        assert isinstance(errors[0], OSError)